@@ -0,0 +1,190 @@
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from catalog import ASSET_NAME_RE
+
+# Largest atlas page; 2048 is safe for WebGL/canvas on every current browser
+MAX_SIZE = 2048
+
+# Transparent pixels kept around each frame so scaled draws do not bleed
+PADDING = 2
+
+ATLAS_JSON = "atlas.json"
+
+Rect = Tuple[int, int, int, int]  # x, y, w, h
+
+
+class MaxRects:
+    """
+    MaxRects bin packer (best short side fit) for a single page.
+
+    Free space is kept as a list of maximal, possibly overlapping free
+    rectangles. Each placement splits every free rectangle it overlaps
+    and drops the ones contained in another.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.free: List[Rect] = [(0, 0, width, height)]
+
+    def insert(self, w: int, h: int) -> Optional[Tuple[int, int]]:
+        """Place a w x h rectangle. Returns its (x, y), or None when it does not fit."""
+        best = None
+        best_score = None
+        for fx, fy, fw, fh in self.free:
+            if w <= fw and h <= fh:
+                score = (min(fw - w, fh - h), max(fw - w, fh - h))
+                if best_score is None or score < best_score:
+                    best, best_score = (fx, fy), score
+        if best is None:
+            return None
+        self._split((best[0], best[1], w, h))
+        return best
+
+    def _split(self, used: Rect) -> None:
+        ux, uy, uw, uh = used
+        new_free = []
+        for fx, fy, fw, fh in self.free:
+            if ux >= fx + fw or ux + uw <= fx or uy >= fy + fh or uy + uh <= fy:
+                new_free.append((fx, fy, fw, fh))
+                continue
+            if ux > fx:
+                new_free.append((fx, fy, ux - fx, fh))
+            if ux + uw < fx + fw:
+                new_free.append((ux + uw, fy, fx + fw - ux - uw, fh))
+            if uy > fy:
+                new_free.append((fx, fy, fw, uy - fy))
+            if uy + uh < fy + fh:
+                new_free.append((fx, uy + uh, fw, fy + fh - uy - uh))
+        self.free = [r for i, r in enumerate(new_free)
+                     if not any(j != i and _contains(o, r) and (o != r or j < i)
+                                for j, o in enumerate(new_free))]
+
+
+def _contains(outer: Rect, inner: Rect) -> bool:
+    return (inner[0] >= outer[0] and inner[1] >= outer[1]
+            and inner[0] + inner[2] <= outer[0] + outer[2]
+            and inner[1] + inner[3] <= outer[1] + outer[3])
+
+
+def pack(sizes: Sequence[Tuple[int, int]], max_size: int = MAX_SIZE,
+         padding: int = PADDING) -> List[Tuple[int, int, int]]:
+    """
+    Pack rectangles onto as few max_size x max_size pages as possible.
+
+    Rectangles are inserted largest first; a new page is opened when one
+    does not fit on any existing page.
+
+    Returns:
+        (page, x, y) for each size, in input order.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (max(sizes[i]), sizes[i][0] * sizes[i][1]), reverse=True)
+    pages: List[MaxRects] = []
+    placements: List[Optional[Tuple[int, int, int]]] = [None] * len(sizes)
+    for i in order:
+        w, h = sizes[i][0] + 2 * padding, sizes[i][1] + 2 * padding
+        if w > max_size or h > max_size:
+            raise ValueError(f"{sizes[i][0]}x{sizes[i][1]} frame does not fit a {max_size}px atlas")
+        for page_no, page in enumerate(pages):
+            pos = page.insert(w, h)
+            if pos is not None:
+                break
+        else:
+            pages.append(MaxRects(max_size, max_size))
+            page_no, pos = len(pages) - 1, pages[-1].insert(w, h)
+        placements[i] = (page_no, pos[0] + padding, pos[1] + padding)
+    return placements
+
+
+def frame_name(path: Path) -> str:
+    """images/124x212_alchemist.png -> alchemist"""
+    m = ASSET_NAME_RE.match(path.name)
+    return Path(m.group(3) if m else path.name).stem
+
+
+def build_atlas(sprites: Sequence[Path], out_dir: Path, max_size: int = MAX_SIZE,
+                padding: int = PADDING, prefix: str = "atlas") -> Dict:
+    """
+    Pack processed sprites into atlas PNGs plus a JSON frame map.
+
+    Pages are cropped to their used area and written as out_dir/atlas<N>.png;
+    the frame map goes to out_dir/atlas.json:
+
+        {"pages": ["atlas0.png", ...],
+         "frames": {"alchemist": {"page": 0, "x": 2, "y": 2, "w": 124, "h": 212,
+                                  "file": "124x212_alchemist.png"}, ...}}
+
+    The source sprites are left in place (the code prompt and a resumed run
+    still need them); remove_sources() deletes them once the game is done.
+    Returns the frame map.
+    """
+    out_dir = Path(out_dir)
+    images = [Image.open(p) for p in sprites]
+    try:
+        placements = pack([img.size for img in images], max_size, padding)
+        n_pages = max((p[0] for p in placements), default=-1) + 1
+        extents = [[0, 0] for _ in range(n_pages)]
+        for img, (page, x, y) in zip(images, placements):
+            extents[page][0] = max(extents[page][0], x + img.width + padding)
+            extents[page][1] = max(extents[page][1], y + img.height + padding)
+
+        canvases = [Image.new("RGBA", tuple(e), (0, 0, 0, 0)) for e in extents]
+        frames = {}
+        for path, img, (page, x, y) in zip(sprites, images, placements):
+            canvases[page].paste(img.convert("RGBA"), (x, y))
+            name = frame_name(Path(path))
+            if name in frames:
+                name = Path(path).stem
+            frames[name] = {"page": page, "x": x, "y": y, "w": img.width, "h": img.height,
+                            "file": Path(path).name}
+    finally:
+        for img in images:
+            img.close()
+
+    pages = []
+    for n, canvas in enumerate(canvases):
+        page_name = f"{prefix}{n}.png"
+        canvas.save(out_dir / page_name, "PNG", optimize=True)
+        pages.append(page_name)
+    atlas = {"pages": pages, "frames": frames}
+    with open(out_dir / ATLAS_JSON, "w", encoding="utf-8") as f:
+        json.dump(atlas, f, indent=1)
+    return atlas
+
+
+def remove_sources(img_dir: Path) -> List[Path]:
+    """
+    Delete the sprites packed into img_dir's atlas. The game only loads the
+    pages, so the loose copies would just double the bytes committed and
+    served. Returns the removed paths (none when img_dir has no atlas).
+    """
+    atlas = load_atlas(img_dir)
+    removed = []
+    for frame in (atlas or {}).get("frames", {}).values():
+        path = Path(img_dir) / frame["file"]
+        if path.exists():
+            path.unlink()
+            removed.append(path)
+    return removed
+
+
+def load_atlas(img_dir: Path) -> Optional[Dict]:
+    """Frame map written by build_atlas, or None when img_dir has no atlas."""
+    path = Path(img_dir) / ATLAS_JSON
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    # python atlas.py "games/<name>/images": pack an existing game's sprites
+    img_dir = Path(sys.argv[1])
+    sprites = sorted(p for p in img_dir.iterdir() if ASSET_NAME_RE.match(p.name))
+    atlas = build_atlas(sprites, img_dir)
+    print(f"Packed {len(atlas['frames'])} sprites into {len(atlas['pages'])} atlas page(s) in {img_dir}")
@@ -0,0 +1,177 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+import requests
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised when no healthy backend frees a slot in time."""
+
+
+class Backend:
+    """One GPU host: its URL, weight, concurrency limit and live state."""
+
+    def __init__(self, url: str, weight: float = 1.0, max_concurrency: int = 1):
+        self.url = url.rstrip("/")
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.healthy = True
+        self.models: Set[str] = set()  # models believed to be loaded on this host
+        self.served = 0
+        self.failures = 0
+
+    def load(self) -> float:
+        return self.in_flight / self.weight
+
+    def __repr__(self) -> str:
+        state = "up" if self.healthy else "ejected"
+        return f"Backend({self.url}, {self.in_flight}/{self.max_concurrency}, {state})"
+
+
+def is_host_failure(error: BaseException) -> bool:
+    """Connection problems and 5xx answers mean the host is unwell, not the request."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+class BackendPool:
+    """
+    Route requests across several hosts running the same server.
+
+    Each request goes to the least-loaded healthy host (in-flight requests
+    divided by weight) that has a free slot. When a model is given, hosts
+    that already have it loaded are preferred so requests stay sticky and
+    avoid model loads; other hosts are used only when those are full.
+
+    A host whose request fails with a connection error or a 5xx is ejected
+    and probed in the background every probe_interval seconds until it
+    answers again.
+    """
+
+    def __init__(self, backends: List[Backend], probe: Callable[[Backend], Optional[Set[str]]],
+                 probe_interval: float = 5.0, name: str = "backend"):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends = backends
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.name = name
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, entries: List[Dict], probe: Callable[[Backend], Optional[Set[str]]],
+                    **kwargs) -> "BackendPool":
+        """Build a pool from [{"url", "weight", "max_concurrency"}, ...]."""
+        return cls([Backend(e["url"], e.get("weight", 1.0), e.get("max_concurrency", 1)) for e in entries],
+                   probe, **kwargs)
+
+    def _pick(self, model: Optional[str]) -> Optional[Backend]:
+        free = [b for b in self.backends if b.healthy and b.in_flight < b.max_concurrency]
+        if model is not None:
+            warm = [b for b in free if model in b.models]
+            free = warm or free
+        return min(free, key=lambda b: (b.load(), -b.weight), default=None)
+
+    def acquire(self, model: Optional[str] = None, timeout: Optional[float] = None) -> Backend:
+        """Reserve a slot on the best host, waiting up to timeout seconds for one."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                backend = self._pick(model)
+                if backend is not None:
+                    backend.in_flight += 1
+                    return backend
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise BackendUnavailable(f"No healthy {self.name} host with a free slot: {self.backends}")
+                self._cond.wait(remaining)
+
+    def release(self, backend: Backend, error: Optional[BaseException] = None,
+                model: Optional[str] = None) -> None:
+        """Free the slot; a host failure ejects the host, a success marks model as loaded there."""
+        with self._cond:
+            backend.in_flight -= 1
+            if error is None:
+                backend.served += 1
+                if model is not None:
+                    backend.models.add(model)
+            elif is_host_failure(error):
+                backend.failures += 1
+                self._eject(backend, error)
+            self._cond.notify_all()
+
+    @contextmanager
+    def use(self, model: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[Backend]:
+        backend = self.acquire(model, timeout)
+        try:
+            yield backend
+        except BaseException as e:
+            self.release(backend, e, model)
+            raise
+        self.release(backend, None, model)
+
+    def _eject(self, backend: Backend, error: BaseException) -> None:
+        """Take a host out of rotation and probe it until it recovers. Call with the lock held."""
+        if not backend.healthy:
+            return
+        backend.healthy = False
+        backend.models.clear()
+        print(f"Ejected {self.name} host {backend.url}: {error}")
+        threading.Thread(target=self._probe_until_healthy, args=(backend,),
+                         name=f"probe-{backend.url}", daemon=True).start()
+
+    def _probe_until_healthy(self, backend: Backend) -> None:
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                models = self.probe(backend)
+            except Exception:
+                continue
+            with self._cond:
+                backend.healthy = True
+                backend.models = set(models or ())
+                self._cond.notify_all()
+            print(f"Re-admitted {self.name} host {backend.url}")
+            return
+
+    def stats(self) -> List[Dict]:
+        with self._cond:
+            return [{"url": b.url, "healthy": b.healthy, "in_flight": b.in_flight, "served": b.served,
+                     "failures": b.failures, "models": sorted(b.models)} for b in self.backends]
+
+
+def probe_ollama(backend: Backend) -> Set[str]:
+    """Ollama is up if /api/ps answers; it also lists the models currently loaded."""
+    resp = requests.get(backend.url + "/api/ps", timeout=5)
+    resp.raise_for_status()
+    return {m.get("name") or m.get("model") for m in resp.json().get("models", [])}
+
+
+def probe_image_server(backend: Backend) -> Set[str]:
+    """The image server is up if it hands out a session."""
+    resp = requests.post(backend.url + "/API/GetNewSession", json={}, timeout=5)
+    resp.raise_for_status()
+    return set()
+
+
+def configure(config: dict) -> None:
+    """
+    Route ollamagen and genimg through pools built from config["ollama_backends"]
+    and config["image_backends"]. Without those keys the single default hosts are used.
+    """
+    import genimg
+    import ollamagen
+
+    interval = config.get("backend_probe_interval", 5.0)
+    if config.get("ollama_backends"):
+        ollamagen.set_backend_pool(BackendPool.from_config(
+            config["ollama_backends"], probe_ollama, probe_interval=interval, name="Ollama"))
+    if config.get("image_backends"):
+        genimg.set_backend_pool(BackendPool.from_config(
+            config["image_backends"], probe_image_server, probe_interval=interval, name="image"))
@@ -0,0 +1,259 @@
+"""
+End-to-end benchmarks against the local stand-in servers in fakeservers.py.
+
+    python bench.py                     run every benchmark and print the results
+    python bench.py --save-baseline     ... and store them in bench_baseline.json
+    python bench.py --compare           ... and exit 1 if a metric regressed
+
+Each benchmark runs in its own process (fresh module state and a peak RSS
+of its own) inside a scratch directory, so the checkout's games/,
+catalog.db and image cache are never touched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = REPO_DIR / "bench_baseline.json"
+RESULT_PREFIX = "BENCH_RESULT "
+
+# Files a scratch directory needs for gamegen to run
+SCRATCH_FILES = ("config.json", "index.template.html", "thumbnail.png")
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB on Linux
+
+
+@contextlib.contextmanager
+def _fake_backends(args):
+    """Start both fake servers and point ollamagen/genimg at them."""
+    import fakeservers
+    import genimg
+    import ollamagen
+
+    llm = fakeservers.FakeConfig(args.llm_latency, args.jitter, args.error_rate,
+                                 args.chunk_size, args.token_delay, seed=1)
+    image = fakeservers.FakeConfig(args.image_latency, args.jitter, args.error_rate, seed=2)
+    with fakeservers.FakeServer(fakeservers.FakeOllamaHandler, llm) as ollama, \
+            fakeservers.FakeServer(fakeservers.FakeImageHandler, image) as images:
+        ollamagen.GENERATE_URL = ollama.url + "/api/generate"
+        genimg.BASE_URL = images.url
+        yield
+
+
+def _config(args):
+    import gamegen
+
+    config = gamegen.load_config()
+    if not args.cache:
+        config["imgcache"] = None
+    return config
+
+
+def _stage_latencies(path):
+    import metrics
+
+    walls = {}
+    for e in metrics.load(path):
+        if e["event"] == "stage":
+            name = "image" if e["stage"].startswith("image ") else e["stage"]
+            walls.setdefault(name, []).append(e["wall"])
+    return {f"stage_{name}_p50_s": round(metrics.percentile(v, 50), 4) for name, v in walls.items()}
+
+
+def bench_serial(args):
+    """generate_game() back to back, like gamegen.py --worker."""
+    import gamegen
+    import metrics
+
+    config = _config(args)
+    metrics.configure("metrics.jsonl")
+    with _fake_backends(args):
+        start = time.perf_counter()
+        for _ in range(args.games):
+            gamegen.generate_game(config)
+        elapsed = time.perf_counter() - start
+    result = {"games_per_hour": round(args.games * 3600 / elapsed, 1)}
+    result.update(_stage_latencies("metrics.jsonl"))
+    return result
+
+
+def bench_pipeline(args):
+    """GamePipeline, like gamegen.py --pipeline."""
+    import metrics
+    from pipeline import GamePipeline
+
+    config = _config(args)
+    metrics.configure("metrics.jsonl")
+    with _fake_backends(args):
+        stats = GamePipeline(config).run(args.games)
+    if stats["failed"]:
+        raise RuntimeError(f"{stats['failed']} games failed")
+    return {"games_per_hour": round(stats["games_per_hour"], 1)}
+
+
+def bench_backends(args):
+    """GamePipeline spread over --hosts fake Ollama and image hosts through backends.py."""
+    import backends
+    import fakeservers
+    import metrics
+    from pipeline import GamePipeline
+
+    config = _config(args)
+    metrics.configure("metrics.jsonl")
+    with contextlib.ExitStack() as stack:
+        llm_urls, image_urls = [], []
+        for n in range(args.hosts):
+            llm = fakeservers.FakeConfig(args.llm_latency, args.jitter, args.error_rate,
+                                         args.chunk_size, args.token_delay, seed=10 + n)
+            image = fakeservers.FakeConfig(args.image_latency, args.jitter, args.error_rate, seed=20 + n)
+            llm_urls.append(stack.enter_context(fakeservers.FakeServer(fakeservers.FakeOllamaHandler, llm)).url)
+            image_urls.append(stack.enter_context(fakeservers.FakeServer(fakeservers.FakeImageHandler, image)).url)
+        config["ollama_backends"] = [{"url": u, "max_concurrency": 2} for u in llm_urls]
+        config["image_backends"] = [{"url": u, "max_concurrency": 4} for u in image_urls]
+        backends.configure(config)
+        stats = GamePipeline(config).run(args.games)
+    if stats["failed"]:
+        raise RuntimeError(f"{stats['failed']} games failed")
+    return {"games_per_hour": round(stats["games_per_hour"], 1), "hosts": args.hosts}
+
+
+def bench_imgprocessor(args):
+    """Background removal + trim + PNG write of synthetic 512x512 sprites."""
+    import benchimg
+    import imgprocessor
+
+    images = benchimg.synthetic_images(args.images, seed=1)
+    start = time.perf_counter()
+    for n, img in enumerate(images):
+        imgprocessor.process_in_memory(img, Path("out"), f"sprite{n}.png")
+    elapsed = time.perf_counter() - start
+    return {"images_per_sec": round(len(images) / elapsed, 2),
+            "ms_per_image": round(elapsed * 1000 / len(images), 2)}
+
+
+BENCHMARKS = {
+    "serial": bench_serial,
+    "pipeline": bench_pipeline,
+    "backends": bench_backends,
+    "imgprocessor": bench_imgprocessor,
+}
+
+
+def higher_is_better(metric):
+    return metric.endswith(("_per_hour", "_per_sec"))
+
+
+def run_one(name, args):
+    """Run one benchmark in this process, in a scratch directory. Prints its result line."""
+    sys.path.insert(0, str(REPO_DIR))
+    scratch = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        for f in SCRATCH_FILES:
+            shutil.copy(REPO_DIR / f, scratch)
+        os.chdir(scratch)
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            result = BENCHMARKS[name](args)
+        result["peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(scratch, ignore_errors=True)
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def run(name, argv):
+    """Run one benchmark in a child process and return its result dict."""
+    proc = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--one", name] + argv,
+                          capture_output=True, text=True, encoding="utf-8", errors="replace")
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Benchmark '{name}' failed:\n{proc.stderr[-2000:]}")
+
+
+def compare(results, baseline, tolerance):
+    """Return a line per metric that is worse than baseline by more than tolerance."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if value is None or not base or metric == "hosts":
+                continue
+            change = (value - base) / base
+            worse = -change if higher_is_better(metric) else change
+            if worse > tolerance:
+                regressions.append(f"{name}.{metric}: {value} vs baseline {base} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--games", type=int, default=3, help="games per gamegen benchmark")
+    parser.add_argument("--hosts", type=int, default=3, help="fake hosts of each kind for the backends benchmark")
+    parser.add_argument("--images", type=int, default=20, help="sprites for the imgprocessor benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds before each LLM answer")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--image-latency", type=float, default=0.2, help="seconds per generated image")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--cache", action="store_true", help="keep the image cache from config.json on")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    parser.add_argument("--compare", action="store_true", help="fail if worse than the saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--one", choices=list(BENCHMARKS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        run_one(args.one, args)
+        return
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    # Forward the workload options to each child process
+    argv = [a for a in sys.argv[1:] if a not in ("--save-baseline", "--compare") and a not in BENCHMARKS]
+    results = {}
+    for name in args.benchmarks or list(BENCHMARKS):
+        results[name] = run(name, argv)
+        print(f"{name}:")
+        for metric, value in results[name].items():
+            print(f"  {metric:<26} {value}")
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        if not args.baseline.exists():
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        print("No regressions." if not regressions else f"{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Regression check and benchmark for imgprocessor.
+
+Compares remove_white_bg / trim_to_content against the original float32
+implementation (kept below as the reference) on synthetic sprites and on
+PNGs from games/, then times both and reports peak numpy memory.
+test_imgprocessor.py runs the synthetic comparison under pytest.
+
+Usage:
+    python benchimg.py [--count 20] [--repeat 3]
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+import imgprocessor
+
+
+def reference_remove_white_bg(img, rgb_min=240, v_min=0.95, s_max=0.20, feather=1):
+    """The original float32 implementation, used as the expected output."""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    arr = np.array(img)
+    rgb = arr[..., :3]
+    alpha = arr[..., 3].astype(np.float32) / 255.0
+
+    keep_transparent = alpha < 0.01
+    rule_rgb = (rgb[..., 0] >= rgb_min) & (rgb[..., 1] >= rgb_min) & (rgb[..., 2] >= rgb_min)
+    s, v = imgprocessor.rgb_to_hsv_sv(rgb)
+    rule_hsv = (v >= v_min) & (s <= s_max)
+    whiteish = (rule_rgb | rule_hsv) & (~keep_transparent)
+
+    if np.all(alpha >= 0.99):
+        new_alpha = np.where(whiteish, 0.0, 1.0)
+    else:
+        new_alpha = np.where(whiteish, 0.0, alpha)
+
+    if feather > 0:
+        mask = Image.fromarray((new_alpha * 255).astype(np.uint8))
+        mask = mask.filter(ImageFilter.GaussianBlur(radius=feather))
+        new_alpha = np.array(mask).astype(np.float32) / 255.0
+
+    out = arr.copy()
+    out[..., 3] = (new_alpha * 255.0).clip(0, 255).astype(np.uint8)
+    return Image.fromarray(out)
+
+
+def reference_trim_to_content(img, pad=1):
+    """The original np.where based bounding box."""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    alpha = np.array(img.split()[-1])
+    nz = np.where(alpha > 5)
+    if nz[0].size == 0:
+        return img
+
+    top, bottom = int(nz[0].min()), int(nz[0].max())
+    left, right = int(nz[1].min()), int(nz[1].max())
+    left = max(left - pad, 0)
+    top = max(top - pad, 0)
+    right = min(right + pad, img.width - 1)
+    bottom = min(bottom + pad, img.height - 1)
+    return img.crop((left, top, right + 1, bottom + 1))
+
+
+def synthetic_images(count, size=512, seed=0):
+    """Sprites on a noisy near-white background, with and without alpha."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        base = np_rng.integers(225, 256, size=(size, size, 3), dtype=np.uint8)
+        img = Image.fromarray(base)
+        draw = ImageDraw.Draw(img)
+        for _ in range(6):
+            x0, y0 = rng.randint(0, size - 60), rng.randint(0, size - 60)
+            box = (x0, y0, x0 + rng.randint(20, 200), y0 + rng.randint(20, 200))
+            color = tuple(rng.randint(0, 255) for _ in range(3))
+            draw.ellipse(box, fill=color, outline=(250, 250, 250))
+        if i % 3 == 2:  # some inputs already carry a partial alpha channel
+            img = img.convert("RGBA")
+            img.putalpha(Image.fromarray(np_rng.integers(0, 256, size=(size, size), dtype=np.uint8)))
+        images.append(img)
+    return images
+
+
+def repo_images(limit):
+    paths = sorted(Path("games").glob("*/images/*.png"))[:limit]
+    images = []
+    for p in paths:
+        with Image.open(p) as img:
+            images.append(img.convert("RGBA"))
+    return images
+
+
+def check(images):
+    """Return the number of images whose output differs from the reference."""
+    failures = 0
+    batch = imgprocessor.remove_white_bg_batch(images)
+    for i, img in enumerate(images):
+        for feather in (0, 1, 2):
+            expected = np.asarray(reference_remove_white_bg(img, feather=feather))
+            got = np.asarray(imgprocessor.remove_white_bg(img, feather=feather))
+            if not np.array_equal(expected, got):
+                failures += 1
+                print(f"  mismatch: image {i} feather={feather}")
+        expected = reference_remove_white_bg(img)
+        if not np.array_equal(np.asarray(expected), np.asarray(batch[i])):
+            failures += 1
+            print(f"  mismatch: image {i} (batch)")
+        if reference_trim_to_content(expected).getbbox() != imgprocessor.trim_to_content(expected).getbbox() \
+                or reference_trim_to_content(expected).size != imgprocessor.trim_to_content(expected).size:
+            failures += 1
+            print(f"  mismatch: image {i} (trim)")
+    return failures
+
+
+def measure(fn, images, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(images)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(images)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20, help="number of synthetic 512x512 images")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is kept)")
+    args = parser.parse_args()
+
+    images = synthetic_images(args.count) + repo_images(args.count)
+    print(f"Checking {len(images)} images against the reference implementation...")
+    failures = check(images)
+    print("Regression check:", "OK" if failures == 0 else f"{failures} mismatches")
+
+    bench_images = synthetic_images(args.count, seed=1)
+    cases = [
+        ("reference (float32)", lambda imgs: [reference_trim_to_content(reference_remove_white_bg(i)) for i in imgs]),
+        ("integer", lambda imgs: [imgprocessor.trim_to_content(imgprocessor.remove_white_bg(i)) for i in imgs]),
+        ("integer batch", lambda imgs: [imgprocessor.trim_to_content(i) for i in imgprocessor.remove_white_bg_batch(imgs)]),
+    ]
+    print(f"\nBenchmark: remove_white_bg + trim_to_content on {len(bench_images)} 512x512 images")
+    results = []
+    for name, fn in cases:
+        seconds, peak = measure(fn, bench_images, args.repeat)
+        results.append((name, seconds, peak))
+    ref_seconds, ref_peak = results[0][1], results[0][2]
+    for name, seconds, peak in results:
+        print(f"  {name:<20} {seconds * 1000 / len(bench_images):7.2f} ms/image "
+              f"(speed-up {ref_seconds / seconds:4.1f}x)  peak numpy memory {peak / 1024**2:6.1f} MB "
+              f"({peak / max(ref_peak, 1):4.2f}x reference)")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import checkpoint
+
+DB_PATH = "catalog.db"
+BASE_DIR = "games"
+
+# Processed sprites are named WxH_<file> by imgprocessor
+ASSET_NAME_RE = re.compile(r"^(\d+)x(\d+)_(.+)$")
+
+# Theme/genre lines in game_info.txt; longer values are sentences, not labels
+INFO_FIELD_MAX_LEN = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    slug           TEXT PRIMARY KEY,
+    name           TEXT NOT NULL,
+    dir            TEXT NOT NULL,
+    theme          TEXT,
+    genre          TEXT,
+    description    TEXT,
+    idea           TEXT,
+    html_size      INTEGER,
+    thumbnail_size INTEGER,
+    timings        TEXT,
+    created_at     REAL NOT NULL,
+    updated_at     REAL NOT NULL,
+    deleted        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS games_updated_at ON games (updated_at);
+CREATE TABLE IF NOT EXISTS assets (
+    slug     TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    file     TEXT NOT NULL,
+    width    INTEGER,
+    height   INTEGER,
+    size     INTEGER,
+    prompt   TEXT,
+    PRIMARY KEY (slug, position)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def slugify(name: str) -> str:
+    """Lowercase, dash-separated identifier for a game name."""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def _file_size(path: str) -> Optional[int]:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def asset_records(img_dir: str, images: List[dict] = ()) -> List[dict]:
+    """
+    Describe the processed sprites of a game, in the spec's images order.
+    Prompts are matched from the spec's images entries by file name.
+    """
+    prompts = {i.get("file"): i.get("shortgenerationprompt") for i in images}
+    order = {i.get("file"): n for n, i in enumerate(images)}
+    if not os.path.isdir(img_dir):
+        return []
+    matches = [m for m in map(ASSET_NAME_RE.match, os.listdir(img_dir)) if m]
+    matches.sort(key=lambda m: (order.get(m.group(3), len(order)), m.group(0)))
+    return [{
+        "file": m.group(0),
+        "width": int(m.group(1)),
+        "height": int(m.group(2)),
+        "size": _file_size(os.path.join(img_dir, m.group(0))),
+        "prompt": prompts.get(m.group(3)),
+    } for m in matches]
+
+
+def parse_game_info(path: str) -> Dict:
+    """Recover the idea and JSON spec from a game_info.txt written by gamegen."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    idea, _, spec_text = text.partition("\nJSON Data:\n")
+    idea = re.sub(r"^Game Idea:\n", "", idea).strip()
+    try:
+        spec = json.loads(spec_text)
+    except json.JSONDecodeError:
+        spec = {}
+    info = {"idea": idea, "spec": spec}
+    for field in ("theme", "genre"):
+        m = re.search(rf"\*\*{field}:\*\*[ \t]*(\S.*)", idea, flags=re.IGNORECASE)
+        info[field] = _info_label(m.group(1)) if m else None
+    return info
+
+
+def _info_label(value: str) -> Optional[str]:
+    """A theme/genre value without markdown emphasis, or None when it is a description rather than a label."""
+    value = value.replace("*", "").replace("`", "").strip()
+    if not value or len(value) > INFO_FIELD_MAX_LEN or value.endswith("."):
+        return None
+    return value
+
+
+class Catalog:
+    """
+    SQLite-backed record of every generated game.
+
+    The generator writes one row per game (plus its assets); the index
+    builder reads only rows changed since its last build. Safe to share
+    between threads.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def record_game(self, name: str, game_dir: str, theme: str = None, genre: str = None,
+                    description: str = None, idea: str = None, assets: List[dict] = (),
+                    timings: Dict[str, float] = None, html_size: int = None,
+                    thumbnail_size: int = None, created_at: float = None) -> str:
+        """Insert or update a game and its asset list. Returns the slug."""
+        slug = slugify(os.path.basename(game_dir))
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                INSERT INTO games (slug, name, dir, theme, genre, description, idea, html_size,
+                                   thumbnail_size, timings, created_at, updated_at, deleted)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT (slug) DO UPDATE SET
+                    name = excluded.name, dir = excluded.dir,
+                    theme = COALESCE(excluded.theme, games.theme),
+                    genre = COALESCE(excluded.genre, games.genre),
+                    description = excluded.description, idea = excluded.idea,
+                    html_size = excluded.html_size, thumbnail_size = excluded.thumbnail_size,
+                    timings = COALESCE(excluded.timings, games.timings),
+                    updated_at = excluded.updated_at, deleted = 0
+                """,
+                (slug, name, game_dir.replace(os.sep, "/"), theme, genre, description, idea, html_size,
+                 thumbnail_size, json.dumps(timings) if timings else None, created_at or now, now),
+            )
+            self._db.execute("DELETE FROM assets WHERE slug = ?", (slug,))
+            self._db.executemany(
+                "INSERT INTO assets (slug, position, file, width, height, size, prompt) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(slug, i, a["file"], a.get("width"), a.get("height"), a.get("size"), a.get("prompt"))
+                 for i, a in enumerate(assets)],
+            )
+        return slug
+
+    def mark_deleted(self, slug: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("UPDATE games SET deleted = 1, updated_at = ? WHERE slug = ?", (time.time(), slug))
+
+    def changed_since(self, timestamp: float) -> List[sqlite3.Row]:
+        """Rows (including deleted ones) updated after timestamp."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM games WHERE updated_at > ? ORDER BY updated_at", (timestamp,)).fetchall()
+
+    def games(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM games WHERE deleted = 0 ORDER BY name").fetchall()
+
+    def assets(self, slug: str) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM assets WHERE slug = ? ORDER BY position", (slug,)).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM games WHERE deleted = 0").fetchone()[0]
+
+    def get_meta(self, key: str, default: str = None) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def record_game_dir(self, game_dir: str, **fields) -> Optional[str]:
+        """
+        Record a game from what is on disk in game_dir (game_info.txt,
+        game.html, thumbnail.png and images/). Extra fields override the
+        parsed values. Returns the slug, or None when there is no game.html.
+        """
+        html_path = os.path.join(game_dir, "game.html")
+        if not os.path.exists(html_path):
+            return None
+        info_path = os.path.join(game_dir, "game_info.txt")
+        info = parse_game_info(info_path) if os.path.exists(info_path) else {"spec": {}}
+        spec = info.get("spec") or {}
+        record = {
+            "name": os.path.basename(game_dir),
+            "game_dir": game_dir,
+            "theme": info.get("theme"),
+            "genre": info.get("genre"),
+            "description": spec.get("description"),
+            "idea": info.get("idea"),
+            "assets": asset_records(os.path.join(game_dir, "images"), spec.get("images", [])),
+            "html_size": _file_size(html_path),
+            "thumbnail_size": _file_size(os.path.join(game_dir, "thumbnail.png")),
+            "created_at": os.path.getmtime(html_path),
+        }
+        record.update({k: v for k, v in fields.items() if v is not None})
+        return self.record_game(**record)
+
+    def import_tree(self, base_dir: str = BASE_DIR) -> int:
+        """
+        One-time import of an existing games/ tree. Games whose folder is gone
+        are marked deleted; unfinished games (see checkpoint.py) are skipped.
+        Returns the number of games recorded.
+        """
+        seen = set()
+        for game_name in sorted(os.listdir(base_dir)):
+            game_dir = os.path.join(base_dir, game_name)
+            if game_name.startswith(".") or not os.path.isdir(game_dir) or checkpoint.is_in_progress(game_dir):
+                continue
+            slug = self.record_game_dir(game_dir)
+            if slug:
+                seen.add(slug)
+        for row in self.games():
+            if row["slug"] not in seen:
+                self.mark_deleted(row["slug"])
+        return len(seen)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "import":
+        with Catalog() as catalog:
+            n = catalog.import_tree(sys.argv[2] if len(sys.argv) > 2 else BASE_DIR)
+        print(f"Imported {n} games into {Path(DB_PATH).resolve()}")
+    else:
+        print("Usage: python catalog.py import [games_dir]")
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST = "manifest.json"
+QUARANTINE_DIR = "quarantine"
+
+# Stages recorded in the manifest, in the order a game goes through them
+STAGES = ("spec", "assets", "atlas", "thumbnail", "files")
+
+# Folders without a manifest or game.html this old are left over from killed runs
+ORPHAN_AGE = 3600
+
+
+def write_atomic(path, data, mode: str = "w") -> None:
+    """Write a file so readers (and a killed process) see either the old or the new content."""
+    path = str(path)
+    tmp = path + ".tmp"
+    with open(tmp, mode, **({"encoding": "utf-8"} if "b" not in mode else {})) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Manifest:
+    """
+    Progress record of one game, kept as games/<name>/manifest.json.
+
+    Holds everything needed to finish the game after the process is
+    killed: theme, genre, idea, spec and which stages are done. Every
+    update rewrites the file atomically.
+    """
+
+    def __init__(self, game_dir: str, data: Dict):
+        self.game_dir = game_dir
+        self.data = data
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.game_dir, MANIFEST)
+
+    @classmethod
+    def create(cls, game_dir: str, **fields) -> "Manifest":
+        now = time.time()
+        data = {"status": "in_progress", "created_at": now, "updated_at": now,
+                "resumes": 0, "stages": {"spec": {"done_at": now}}}
+        data.update(fields)
+        manifest = cls(game_dir, data)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, game_dir: str) -> Optional["Manifest"]:
+        try:
+            with open(os.path.join(game_dir, MANIFEST), "r", encoding="utf-8") as f:
+                return cls(game_dir, json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def save(self) -> None:
+        with self._lock:
+            self.data["updated_at"] = time.time()
+            write_atomic(self.path, json.dumps(self.data, indent=1, ensure_ascii=False))
+
+    def done(self, stage: str) -> bool:
+        return stage in self.data["stages"]
+
+    def mark(self, stage: str, **info) -> None:
+        """Record a finished stage."""
+        with self._lock:
+            self.data["stages"][stage] = dict(info, done_at=time.time())
+        self.save()
+
+    def next_stage(self) -> Optional[str]:
+        return next((s for s in STAGES if not self.done(s)), None)
+
+    def complete(self) -> None:
+        self.data["status"] = "complete"
+        self.save()
+
+    @property
+    def in_progress(self) -> bool:
+        return self.data.get("status") == "in_progress"
+
+
+def is_in_progress(game_dir: str) -> bool:
+    """True if game_dir holds a game that has not finished (it must not be published)."""
+    manifest = Manifest.load(game_dir)
+    return manifest is not None and manifest.get("status") != "complete"
+
+
+def find_asset(img_dir: str, file: str) -> Optional[Path]:
+    """The processed WxH_<file> for a sprite, if it was written."""
+    if not os.path.isdir(img_dir):
+        return None
+    pattern = re.compile(r"\d+x\d+_" + re.escape(file))
+    return next((Path(img_dir) / n for n in os.listdir(img_dir) if pattern.fullmatch(n)), None)
+
+
+def quarantine(game_dir: str, reason: str, root: str = QUARANTINE_DIR) -> str:
+    """Move a game folder out of games/ so it is never indexed or published. Returns the new path."""
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, os.path.basename(game_dir))
+    if os.path.exists(target):
+        target += time.strftime("-%Y%m%d-%H%M%S")
+    manifest = Manifest.load(game_dir)
+    if manifest is not None:
+        manifest.data.update(status="quarantined", quarantine_reason=reason)
+        manifest.save()
+    shutil.move(game_dir, target)
+    print(f"Quarantined {game_dir} -> {target}: {reason}")
+    return target
+
+
+def incomplete_games(base_dir: str = "games") -> List[Manifest]:
+    """Manifests of games that were started but never finished, oldest first."""
+    found = []
+    for name in sorted(os.listdir(base_dir)):
+        manifest = Manifest.load(os.path.join(base_dir, name))
+        if manifest is not None and manifest.in_progress:
+            found.append(manifest)
+    return sorted(found, key=lambda m: m.get("created_at", 0))
+
+
+def orphan_dirs(base_dir: str = "games", min_age: float = ORPHAN_AGE) -> List[str]:
+    """
+    Folders with neither a manifest nor a game.html that have not changed
+    for min_age seconds: written by a run killed before manifests existed,
+    and impossible to finish. Folders git tracks are left out: moving them
+    would leave a deletion in the working tree that nothing commits.
+    """
+    now = time.time()
+    orphans = []
+    for name in sorted(os.listdir(base_dir)):
+        game_dir = os.path.join(base_dir, name)
+        if (os.path.isdir(game_dir) and not name.startswith(".")
+                and not os.path.exists(os.path.join(game_dir, MANIFEST))
+                and not os.path.exists(os.path.join(game_dir, "game.html"))
+                and now - os.path.getmtime(game_dir) > min_age
+                and not git_tracked(game_dir)):
+            orphans.append(game_dir)
+    return orphans
+
+
+def git_tracked(path: str) -> bool:
+    """True if git tracks any file under path (False outside a repository or without git)."""
+    try:
+        out = subprocess.run(["git", "--literal-pathspecs", "ls-files", "-z", "--", path],
+                             capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return bool(out)
@@ -0,0 +1,250 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog import BASE_DIR, DB_PATH, Catalog, parse_game_info, slugify
+
+INDEX_PATH = "dedup.jsonl"
+
+# 128 hash permutations split into bands of 3 rows: a pair with Jaccard
+# 0.5 shares a band with probability > 0.99, a pair at 0.2 about 0.3 of
+# the time. Candidates are then checked against the real threshold.
+NUM_PERM = 128
+ROWS_PER_BAND = 3
+
+# Mersenne prime 2^31 - 1: a * crc32 + b stays below 2^63, so numpy uint64 never overflows
+_PRIME = (1 << 31) - 1
+_rng = random.Random(1)
+_A = np.array([_rng.randrange(1, _PRIME) for _ in range(NUM_PERM)], dtype=np.uint64)
+_B = np.array([_rng.randrange(0, _PRIME) for _ in range(NUM_PERM)], dtype=np.uint64)
+
+# Words every idea shares because the prompt asks for them
+STOP_WORDS = set("""
+a an and are as at be by can each for from game games gameplay has have in into is it its more of on or
+player players should that the their them they this to up use uses using when which while will with you your
+""".split())
+
+TITLE_RE = re.compile(r"\*\*\s*(?:game\s+)?title\s*:?\s*\**\s*:?\s*[\"*]*([^\"*\n]+)", re.IGNORECASE)
+
+DEFAULT_IDEA_THRESHOLD = 0.5
+DEFAULT_NAME_THRESHOLD = 0.6
+
+
+def idea_title(idea: str) -> Optional[str]:
+    """'**Game Title:** *Ghost Drift*' -> 'Ghost Drift'"""
+    m = TITLE_RE.search(idea)
+    return m.group(1).strip(" .:-") or None if m else None
+
+
+def word_shingles(text: str) -> set:
+    """Content words of an idea, without markdown and filler."""
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    return {w for w in words if len(w) > 1 and w not in STOP_WORDS}
+
+
+def name_shingles(name: str) -> set:
+    """Character trigrams of a name, so 'DreamDash' and 'Dream Dash 2' still match."""
+    s = re.sub(r"[^a-z0-9]+", "", name.lower())
+    return {s[i:i + 3] for i in range(max(1, len(s) - 2))} if s else set()
+
+
+def minhash(shingles: set) -> Optional[np.ndarray]:
+    """MinHash signature of a shingle set (None for an empty set)."""
+    if not shingles:
+        return None
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class LSH:
+    """Banded locality-sensitive hash over MinHash signatures."""
+
+    def __init__(self):
+        self.bands: List[Dict[bytes, List[str]]] = [{} for _ in range(NUM_PERM // ROWS_PER_BAND)]
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def _keys(self, sig: np.ndarray):
+        for n, band in enumerate(self.bands):
+            yield band, sig[n * ROWS_PER_BAND:(n + 1) * ROWS_PER_BAND].tobytes()
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        self.signatures[key] = sig
+        for band, k in self._keys(sig):
+            band.setdefault(k, []).append(key)
+
+    def best_match(self, sig: np.ndarray, threshold: float) -> Optional[Tuple[str, float]]:
+        """Most similar indexed key at or above threshold, as (key, similarity)."""
+        candidates = {key for band, k in self._keys(sig) for key in band.get(k, ())}
+        scored = [(key, similarity(sig, self.signatures[key])) for key in candidates]
+        best = max(scored, key=lambda s: s[1], default=None)
+        return best if best is not None and best[1] >= threshold else None
+
+
+class DedupIndex:
+    """
+    Near-duplicate detector for game ideas and names, plus theme/genre coverage.
+
+    Signatures of finished games are appended to dedup.jsonl, so loading
+    never re-hashes old games; sync() only hashes games that are on disk or
+    in the catalog but not in the file yet. Ideas accepted by the running
+    process are kept in memory too, so parallel pipeline slots do not
+    produce the same game twice. Safe to share between threads.
+    """
+
+    def __init__(self, path: Optional[str] = INDEX_PATH, idea_threshold: float = DEFAULT_IDEA_THRESHOLD,
+                 name_threshold: float = DEFAULT_NAME_THRESHOLD):
+        self.path = path
+        self.idea_threshold = idea_threshold
+        self.name_threshold = name_threshold
+        self.ideas = LSH()
+        self.names = LSH()
+        self.names_by_key: Dict[str, str] = {}
+        self.pairs: Counter = Counter()
+        self.themes: Counter = Counter()
+        self.genres: Counter = Counter()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["DedupIndex"]:
+        """Load and sync the index described by config["dedup"], or None when it is off."""
+        settings = config.get("dedup")
+        if not settings:
+            return None
+        index = cls(settings.get("path", INDEX_PATH),
+                    settings.get("idea_threshold", DEFAULT_IDEA_THRESHOLD),
+                    settings.get("name_threshold", DEFAULT_NAME_THRESHOLD))
+        index.load()
+        added = index.sync()
+        if added:
+            print(f"Dedup index: hashed {added} new games ({len(index.ideas.signatures)} total)")
+        return index
+
+    def _insert(self, key: str, name: Optional[str], idea_sig, name_sig, theme: str, genre: str) -> None:
+        if idea_sig is not None:
+            self.ideas.add(key, idea_sig)
+        if name_sig is not None:
+            self.names.add(key, name_sig)
+        self.names_by_key[key] = name or key
+        if theme and genre:
+            self.pairs[(theme, genre)] += 1
+            self.themes[theme] += 1
+            self.genres[genre] += 1
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                sig = lambda k: np.array(e[k], dtype=np.uint64) if e.get(k) else None
+                self._insert(e["key"], e.get("name"), sig("idea"), sig("name_sig"), e.get("theme"), e.get("genre"))
+
+    def add(self, key: str, name: str, idea: str, theme: str = None, genre: str = None) -> None:
+        """Index a finished game and append it to the index file."""
+        key = slugify(key)
+        with self._lock:
+            if key in self.names_by_key and key in self.ideas.signatures:
+                return
+            idea_sig, name_sig = minhash(word_shingles(idea or "")), minhash(name_shingles(name or ""))
+            self._insert(key, name, idea_sig, name_sig, theme, genre)
+            if self.path:
+                line = {"key": key, "name": name, "theme": theme, "genre": genre,
+                        "idea": idea_sig.tolist() if idea_sig is not None else None,
+                        "name_sig": name_sig.tolist() if name_sig is not None else None}
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def sync(self, base_dir: str = BASE_DIR, db_path: str = DB_PATH) -> int:
+        """Index games in the catalog and in base_dir that are not indexed yet. Returns how many."""
+        known = set(self.names_by_key)
+        found = {}
+        if os.path.exists(db_path):
+            with Catalog(db_path) as catalog:
+                for row in catalog.games():
+                    if row["slug"] not in known and row["idea"]:
+                        found[row["slug"]] = (row["name"], row["idea"], row["theme"], row["genre"])
+        if os.path.isdir(base_dir):
+            for game_name in os.listdir(base_dir):
+                info_path = os.path.join(base_dir, game_name, "game_info.txt")
+                slug = slugify(game_name)
+                if slug in known or slug in found or not os.path.exists(info_path):
+                    continue
+                info = parse_game_info(info_path)
+                found[slug] = (game_name, info["idea"], info.get("theme"), info.get("genre"))
+        for slug, (name, idea, theme, genre) in sorted(found.items()):
+            self.add(slug, name, idea, theme, genre)
+        return len(found)
+
+    def find_similar(self, idea: str) -> Optional[Tuple[str, float, str]]:
+        """
+        The indexed game an idea is too close to, as (name, similarity, "idea" | "name"),
+        or None when the idea is new enough.
+        """
+        idea_sig = minhash(word_shingles(idea))
+        title = idea_title(idea)
+        name_sig = minhash(name_shingles(title)) if title else None
+        with self._lock:
+            match = self.ideas.best_match(idea_sig, self.idea_threshold) if idea_sig is not None else None
+            if match:
+                return self.names_by_key[match[0]], match[1], "idea"
+            match = self.names.best_match(name_sig, self.name_threshold) if name_sig is not None else None
+            if match:
+                return self.names_by_key[match[0]], match[1], "name"
+        return None
+
+    def accept(self, idea: str, theme: str = None, genre: str = None) -> None:
+        """Keep an accepted idea in memory until its game is recorded with add()."""
+        with self._lock:
+            self._pending += 1
+            title = idea_title(idea)
+            self._insert(f"pending-{self._pending}", title, minhash(word_shingles(idea)),
+                         minhash(name_shingles(title)) if title else None, None, None)
+
+    def pick_theme_genre(self, themes: Sequence[str], genres: Sequence[str], samples: int = 32,
+                         rng: random.Random = random) -> Tuple[str, str]:
+        """
+        Draw a theme/genre pair, preferring pairs never produced, then themes
+        and genres that have been used least. Looks at `samples` random pairs
+        rather than all of themes x genres, so each pick stays cheap.
+        """
+        with self._lock:
+            candidates = [(rng.choice(themes), rng.choice(genres)) for _ in range(samples)]
+            return min(candidates, key=lambda p: (self.pairs[p], self.themes[p[0]] + self.genres[p[1]]))
+
+    def coverage(self, themes: Sequence[str], genres: Sequence[str]) -> Dict:
+        with self._lock:
+            return {"games": len(self.ideas.signatures), "pairs_used": len(self.pairs),
+                    "pairs_total": len(themes) * len(genres),
+                    "themes_used": len(set(themes) & set(self.themes)), "themes_total": len(themes),
+                    "genres_used": len(set(genres) & set(self.genres)), "genres_total": len(genres)}
+
+
+if __name__ == "__main__":
+    # python dedup.py: build/update dedup.jsonl and list the closest existing pairs
+    index = DedupIndex()
+    index.load()
+    print(f"Hashed {index.sync()} new games, {len(index.ideas.signatures)} indexed")
+    pairs = []
+    keys = sorted(index.ideas.signatures)
+    for i, a in enumerate(keys):
+        for b in keys[i + 1:]:
+            pairs.append((similarity(index.ideas.signatures[a], index.ideas.signatures[b]), a, b))
+    for score, a, b in sorted(pairs, reverse=True)[:int(sys.argv[1]) if len(sys.argv) > 1 else 10]:
+        print(f"  {score:.2f}  {index.names_by_key[a]}  ~  {index.names_by_key[b]}")
@@ -0,0 +1,370 @@
+"""
+Local stand-ins for Ollama and the image server, for benchmarks and tests.
+
+    python fakeservers.py [--llm-port 11434] [--image-port 7801] [--image-latency 1.0] ...
+
+serves both on their usual ports so gamegen.py runs unchanged without a GPU.
+"""
+import argparse
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from PIL import Image, ImageDraw
+
+# Fake ideas are built from made-up words so each one is different (dedup.py rejects repeats)
+FAKE_SYLLABLES = "ba ko ri zu fe lo mi da ne tu sha gor vim pel quo rax yin"
+
+FAKE_GAME_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="UTF-8"><title>Fake Runner</title>
+<style>body{{margin:0;background:#111}}canvas{{display:block;margin:auto}}</style>
+</head>
+<body>
+<canvas id="game" width="1024" height="720"></canvas>
+<script>
+const canvas = document.getElementById('game');
+const ctx = canvas.getContext('2d');
+const sprites = {{}};
+const files = {files};
+files.forEach(f => {{ const img = new Image(); img.src = f; sprites[f] = img; }});
+let score = 0;
+function loop() {{
+  ctx.clearRect(0, 0, 1024, 720);
+  score += 1;
+  ctx.fillStyle = 'white';
+  ctx.fillText('Score: ' + score, 10, 20);
+  requestAnimationFrame(loop);
+}}
+loop();
+</script>
+</body>
+</html>"""
+
+
+class FakeConfig:
+    """Behaviour knobs shared by the fake servers."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 chunk_size: int = 16, token_delay: float = 0.0, seed: Optional[int] = None,
+                 broken_code_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self.token_delay = token_delay
+        self.broken_code_rate = broken_code_rate  # share of games with a JS error or a missing image
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self) -> None:
+        with self.lock:
+            d = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if d > 0:
+            time.sleep(d)
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def broken_code(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.broken_code_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeConfig = None
+
+    def log_message(self, format, *args):  # keep benchmark output quiet
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body or b"{}")
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, obj, status: int = 200) -> None:
+        self._send(status, json.dumps(obj).encode("utf-8"))
+
+    def _maybe_fail(self) -> bool:
+        if self.fake.should_fail():
+            self._send_json({"error": "injected failure"}, status=500)
+            return True
+        return False
+
+
+# Numbers the fake games so concurrent games never share a folder
+_game_numbers = itertools.count(1)
+
+
+def _fake_spec(n_images: int = 20) -> dict:
+    kinds = ["player", "enemy", "coin", "crate", "background", "button", "heart", "star", "bat", "tree"]
+    return {
+        "name": f"Fake Runner {next(_game_numbers)}",
+        "description": "A fake game used for benchmarking.",
+        "images": [
+            {"file": f"{kinds[i % len(kinds)]}{i}.png", "shortgenerationprompt": f"a {kinds[i % len(kinds)]}"}
+            for i in range(n_images)
+        ],
+    }
+
+
+def _fake_idea() -> str:
+    rng = random.Random(uuid.uuid4().int)  # differs across restarts too, like a real model
+    syllables = FAKE_SYLLABLES.split()
+    words = ["".join(rng.choice(syllables) for _ in range(3)) for _ in range(16)]
+    return (f"**Game Title:** *{words[0].title()} {words[1].title()}*\n\n"
+            f"A side-scrolling runner with {', '.join(words[2:9])}. "
+            f"The player must dodge {', '.join(words[9:])}. Score rises with distance.")
+
+
+def _break_game(html: str, rng: random.Random) -> str:
+    """The ways generated games break: a bracket too many, or an image the model made up."""
+    if rng.random() < 0.5:
+        return html.replace("score += 1;", "score += 1);", 1)
+    return html.replace("const files = [", 'const files = ["images/512x512_made_up.png", ', 1)
+
+
+def _fake_answer(model: str, prompt: str, fmt, broken: bool = False) -> str:
+    if isinstance(fmt, dict) and "ideas" in fmt.get("properties", {}):
+        pairs = re.findall(r"^\d+\. theme: (.*), genre: (.*)$", prompt, flags=re.MULTILINE)
+        return json.dumps({"ideas": [{"theme": t, "genre": g, "idea": _fake_idea()} for t, g in pairs]})
+    if fmt is not None or "json template" in prompt.lower():
+        return json.dumps(_fake_spec(), indent=2)
+    if "coder" in model:
+        files = [f"images/{m}" for m in re.findall(r"path: images/(\S+)", prompt)]
+        html = FAKE_GAME_HTML.format(files=json.dumps(files))
+        return "Here is the game:\n```html\n" + (_break_game(html, random.Random()) if broken else html) + "\n```\n"
+    return _fake_idea()
+
+
+class FakeOllamaHandler(_Handler):
+    """
+    Implements /api/generate and /api/chat in streaming and non-streaming NDJSON modes,
+    plus /api/ps and /api/tags listing the models requested so far.
+    A "format" asking for "ideas" gets a batch of ideas, other requests with a
+    "format" (or mentioning the JSON template) get a spec, the coder
+    model gets a small canvas game, anything else gets a game idea.
+    """
+
+    loaded = set()
+
+    def do_GET(self):
+        if self.path in ("/api/ps", "/api/tags"):
+            self._send_json({"models": [{"name": m, "model": m} for m in sorted(self.loaded)]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        self.fake.delay()
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        if self._maybe_fail():
+            return
+
+        model = payload.get("model", "")
+        self.loaded.add(model)
+        if self.path == "/api/chat":
+            messages = payload.get("messages", [])
+            prompt = messages[-1]["content"] if messages else ""
+            prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+        else:
+            prompt = payload.get("prompt", "")
+            prompt_tokens = len(prompt.split())
+        answer = _fake_answer(model, prompt, payload.get("format"), "coder" in model and self.fake.broken_code())
+        stats = {
+            "total_duration": 1_000_000,
+            "load_duration": 1000,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": 1000,
+            "eval_count": max(1, len(answer) // 4),
+            "eval_duration": 1_000_000,
+        }
+
+        def piece(text, done):
+            obj = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+            if self.path == "/api/chat":
+                obj["message"] = {"role": "assistant", "content": text}
+            else:
+                obj["response"] = text
+            if done:
+                obj.update(stats)
+                obj["done_reason"] = "stop"
+            return obj
+
+        if not payload.get("stream", True):
+            self._send_json(piece(answer, True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, self.fake.chunk_size)
+        try:
+            for i in range(0, len(answer), size):
+                self._write_chunk(json.dumps(piece(answer[i:i + size], False)) + "\n")
+                if self.fake.token_delay:
+                    time.sleep(self.fake.token_delay)
+            self._write_chunk(json.dumps(piece("", True)) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled the stream
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def synthetic_sprite(width: int = 512, height: int = 512, seed: int = 0) -> Image.Image:
+    """A coloured shape on a pure white background, like the sprites the real server returns."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    color = tuple(rng.randint(0, 200) for _ in range(3))
+    x0, y0 = rng.randint(20, width // 3), rng.randint(20, height // 3)
+    x1, y1 = rng.randint(2 * width // 3, width - 20), rng.randint(2 * height // 3, height - 20)
+    if rng.random() < 0.5:
+        draw.ellipse((x0, y0, x1, y1), fill=color, outline=(0, 0, 0), width=3)
+    else:
+        draw.rectangle((x0, y0, x1, y1), fill=color, outline=(0, 0, 0), width=3)
+    return img
+
+
+def synthetic_sheet(width: int, height: int, count: int, rows: int, cols: int, seed: int = 0) -> Image.Image:
+    """count synthetic sprites on a rows x cols grid, like a sprite sheet render."""
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    cw, ch = width // cols, height // rows
+    for n in range(count):
+        img.paste(synthetic_sprite(cw, ch, seed=seed + n), ((n % cols) * cw, (n // cols) * ch))
+    return img
+
+
+class FakeImageHandler(_Handler):
+    """Implements /API/GetNewSession, /API/GenerateText2Image and image download."""
+
+    images = {}
+    sessions = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == "/API/GetNewSession":
+            sid = uuid.uuid4().hex
+            with self.lock:
+                self.sessions.add(sid)
+            self._send_json({"session_id": sid})
+            return
+        if self.path != "/API/GenerateText2Image":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        self.fake.delay()
+        if self._maybe_fail():
+            return
+        with self.lock:
+            known = payload.get("session_id") in self.sessions
+        if not known:
+            self._send_json({"error_id": "invalid_session_id", "error": "Invalid session ID."})
+            return
+
+        width, height = int(payload.get("width", 512)), int(payload.get("height", 512))
+        prompt = payload.get("prompt", "")
+        buf = io.BytesIO()
+        sheet = re.match(r"sprite sheet, (\d+) .*?(\d+)x(\d+) grid", prompt)
+        if sheet:
+            synthetic_sheet(width, height, *map(int, sheet.groups()), seed=zlib.crc32(prompt.encode("utf-8"))).save(buf, "PNG")
+        else:
+            synthetic_sprite(width, height, seed=zlib.crc32(prompt.encode("utf-8"))).save(buf, "PNG")
+        image_id = uuid.uuid4().hex
+        with self.lock:
+            self.images[image_id] = buf.getvalue()
+        self._send_json({"images": [f"View/local/raw/{image_id}.png"]})
+
+    def do_GET(self):
+        image_id = self.path.rsplit("/", 1)[-1].split(".")[0]
+        with self.lock:
+            data = self.images.pop(image_id, None)
+        if data is None:
+            self._send_json({"error": "not found"}, status=404)
+            return
+        self._send(200, data, content_type="image/png")
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients that cancel streams reset the connection; that is expected
+
+
+class FakeServer:
+    """Run one fake server on a background thread (port 0 picks a free port)."""
+
+    def __init__(self, handler, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        handler_cls = type(handler.__name__, (handler,), {"fake": config or FakeConfig()})
+        if handler is FakeImageHandler:
+            handler_cls.images, handler_cls.sessions = {}, set()
+        if handler is FakeOllamaHandler:
+            handler_cls.loaded = set()
+        self.httpd = _QuietHTTPServer((host, port), handler_cls)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Ollama and image servers.")
+    parser.add_argument("--llm-port", type=int, default=11434)
+    parser.add_argument("--image-port", type=int, default=7801)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds before each LLM answer")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="seconds per generated image")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--broken-code-rate", type=float, default=0.0,
+                        help="fraction of generated games with a JavaScript error or a missing image")
+    args = parser.parse_args()
+
+    llm = FakeConfig(args.llm_latency, args.jitter, args.error_rate, args.chunk_size, args.token_delay,
+                     broken_code_rate=args.broken_code_rate)
+    image = FakeConfig(args.image_latency, args.jitter, args.error_rate)
+    with FakeServer(FakeOllamaHandler, llm, port=args.llm_port) as a, \
+            FakeServer(FakeImageHandler, image, port=args.image_port) as b:
+        print(f"Fake Ollama on {a.url}, fake image server on {b.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -1,47 +1,34 @@
+import argparse
+import math
 import os
 from pathlib import Path
 import re
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Optional, Sequence
 import genimg
 import ollamagen
 import json
 import random
 import util
 import imgprocessor
+import atlas
+from imgcache import ImageCache
+from catalog import Catalog
+from stages import StageGraph, StageTimeout, run_with_deadline
+import updateindex
+import validate
+import metrics
+import backends
+import checkpoint
+from dedup import DedupIndex
+import ideabacklog
+from ideabacklog import IdeaBacklog
+from gitpublish import GitPublisher
 
-sys.stdout.reconfigure(encoding="utf-8", errors="replace")  # avoids crashes on fancy chars
-
-with open("config.json", "r") as f:
-    config = json.load(f)
-
-theme = random.choice(config["themes"])
-genre = random.choice(config["genres"])
-imgprompt = config["imgprompt"]
-imgnegativeprompt = config["imgnegativeprompt"]
-prompt = config["prompt"].format(themes=theme, genres=genre)
-
-
-print(f"Selected Theme: {theme}")
-print(f"Selected Genre: {genre}")
-
-res = ollamagen.ollama_generate(
-    model="qwen3:8b",
-    prompt=prompt,
-    options={
-        "temperature": 0.8,
-        "num_ctx": 8192,
-    },
-    think= False,
-)
-
-
-cleaned_text = re.sub(r"<think>.*?</think>", "", res["response"], flags=re.DOTALL)
-gameidea = cleaned_text.strip()
-
-print("Game Idea:", gameidea)
-
-
-jsontemplate = """
+JSON_TEMPLATE = """
 {
   "name": "",
   "description": "",
@@ -65,75 +52,36 @@ jsontemplate = """
     { "file": "", "shortgenerationprompt": "" },
     { "file": "", "shortgenerationprompt": "" },
     { "file": "", "shortgenerationprompt": "" },
-    { "file": "", "shortgenerationprompt": "" },
+    { "file": "", "shortgenerationprompt": "" }
   ]
 }
 """
 
-res = ollamagen.ollama_generate(
-    model="qwen3:8b",
-    prompt="Here is my game idea \n" + gameidea + "\n" + "Fill this json template"  + "\n"+ jsontemplate,
-    options={
-        "temperature": 0.5,
-        "num_ctx": 8192,
+# Ollama "format" schema for the spec; properties are generated in this order,
+# so name arrives before the first image
+SPEC_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+        "images": {
+            "type": "array",
+            "minItems": 20,
+            "maxItems": 20,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "file": {"type": "string"},
+                    "shortgenerationprompt": {"type": "string"},
+                },
+                "required": ["file", "shortgenerationprompt"],
+            },
+        },
     },
-    think= False,
-)
-
-print("Ollama response:", res)
-json_data_raw = res["response"]
-print("JSON Data:", json_data_raw)
-
-# Extract JSON data from the response
-json_data = util.extract_json_from_llm_answer(json_data_raw)
-print("Extracted JSON Data:", json_data)
-
-# create the directory if it doesn't exist
-os.makedirs("games", exist_ok=True)
-# create the game directory
-
-game_dir = os.path.join("games", json_data["name"])
-
-if not os.path.exists(game_dir):
-    game_dir = game_dir.replace(":", "-")  # Replace ':' with '-' to avoid invalid directory name
-
-os.makedirs(game_dir, exist_ok=True)
-
-
-for i in json_data["images"]:
-    promparg = i["shortgenerationprompt"] + ", " + imgprompt
-    negparg = imgnegativeprompt
-
-    path = genimg.generate_image(
-        outfile="games/"+ json_data["name"].replace(":", "-") + "/images/" + i["file"],
-        prompt=promparg,
-        negativeprompt=negparg,
-        model="OfficialStableDiffusion/dreamshaper_8LCM",
-        seed=-1,
-        steps=5,
-        cfgscale=2.0,
-        aspectratio="1:1",
-        width=512,
-        height=512,
-        sampler="lcm",
-        automaticvae=True,
-        images=1
-    )
-    print(f"Generated image saved to: {path}")
-
-# Process the images in the game directory
-img_dir = os.path.join(game_dir, "images")
-imglist = imgprocessor.process_images(Path(img_dir))
-
-imagelistwithdescription = []
-for i in range(len(imglist)):
-    filename = os.path.basename(imglist[i])
-    parent = os.path.basename(os.path.dirname(imglist[i]))
-    imagelistwithdescription.append(f"path: {parent}/{filename} description: {json_data['images'][i]['shortgenerationprompt']}")
-
-imgliststr = "\n".join(imagelistwithdescription)
+    "required": ["name", "description", "images"],
+}
 
-gamegenprompt = f"""
+GAME_PROMPT_TEMPLATE = """
 Task
 
 Create an HTML5 canvas game based on the game description provided below.
@@ -147,12 +95,11 @@ Constraints
 
     Canvas size: 1024 × 720.
 
-    Images: Image dimensions are indicated in each asset’s name. You may resize images at runtime to fit gameplay.
+    {imagerule}
 
     Offline-ready: The file must run locally in a browser with no additional setup.
 
 Assets
-    List of available images :
     {imgliststr}
 
 Output Requirements
@@ -181,71 +128,21 @@ Game Description
 {gameidea}
 """
 
+# Appended to the game prompt when a generated game.html is regenerated after failing validation
+REPAIR_PROMPT = """
 
-accumulated = []
-chunk_count = 0  # keep track of how many chunks we've seen
-
-def on_chunk(piece: str) -> None:
-    """Append each chunk and print only every 150th chunk received."""
-    global chunk_count
-    chunk_count += 1
-    accumulated.append(piece)
-
-    if chunk_count % 150 == 0:
-        full_so_far = "".join(accumulated)
-        print(f"\n--- streaming update after {chunk_count} chunks ---\n")
-        print(full_so_far, flush=True)
-
-
-
-res = ollamagen.ollama_generate(
-    model="qwen3-coder:latest",
-    prompt=gamegenprompt,
-    options={
-        "temperature": 0.6,
-        "num_ctx": 8192,
-    },
-    stream=True,
-    on_chunk=on_chunk,
-)
-
-
-try:
-    while True:
-        next(res)
-except StopIteration as fin:
-    res = fin.value
+An earlier version of this game was rejected by automatic checks:
+{problems}
+Write the complete file again and make sure none of these problems remain."""
 
-print("\n=== FINAL RESULT ===\n")
+IMAGE_FILES_RULE = "Images: Image dimensions are indicated in each asset’s name. You may resize images at runtime to fit gameplay."
+ATLAS_RULE = "Images: All sprites are packed into atlas image(s). Load each atlas page once and draw sprites with ctx.drawImage(page, x, y, w, h, dx, dy, dw, dh) using the frame rectangles below. You may resize sprites at runtime to fit gameplay."
 
+THUMBNAIL_PROMPT = "Vibrant, colorful abstract digital art with swirling gradients of orange, red, blue, purple, and teal, energetic brushstrokes and geometric accents, high contrast, modern style, featuring a clean, minimalist symbolic logo representing the game {name} at the center, surrounded by a segmented circular border, sharp focus, high detail, bold and striking composition, text-free, modern graphic design aesthetic"
+THUMBNAIL_NEGATIVE_PROMPT = "text, watermark, low resolution, blurry, photorealistic, muted colors, monochrome, 3D render, realistic shading, people, animals"
 
-# save the generated HTML file
-html_content = res["response"]
-print("Generated HTML content:", html_content)
-# get inner html content
-html_content = util.extract_html_block(html_content)
-
-
-html_file_path = os.path.join(game_dir, "game.html")
-with open(html_file_path, "w", encoding="utf-8") as f:
-    f.write(html_content)
-# Save the game idea and JSON data to a text file
-game_info_path = os.path.join(game_dir, "game_info.txt")
-with open(game_info_path, "w", encoding="utf-8") as f:
-    f.write(f"Game Idea:\n{gameidea}\n\n")
-    f.write("JSON Data:\n")
-    json.dump(json_data, f, indent=2)
-
-prompt_path = os.path.join(game_dir, "prompt.txt")
-with open(prompt_path, "w", encoding="utf-8") as f:
-    f.write(gamegenprompt)
-
-#generate thumbnail
-thumbnail_path = os.path.join(game_dir, "thumbnail.png")
-genimg.generate_image(
-    outfile=thumbnail_path,
-    prompt=f"Vibrant, colorful abstract digital art with swirling gradients of orange, red, blue, purple, and teal, energetic brushstrokes and geometric accents, high contrast, modern style, featuring a clean, minimalist symbolic logo representing the game {json_data["name"]} at the center, surrounded by a segmented circular border, sharp focus, high detail, bold and striking composition, text-free, modern graphic design aesthetic",
-    negativeprompt="text, watermark, low resolution, blurry, photorealistic, muted colors, monochrome, 3D render, realistic shading, people, animals",
+# Shared image server parameters for sprites and thumbnail
+IMAGE_PARAMS = dict(
     model="OfficialStableDiffusion/dreamshaper_8LCM",
     seed=-1,
     steps=5,
@@ -257,3 +154,986 @@ genimg.generate_image(
     automaticvae=True,
     images=1
 )
+
+
+def load_config(path: str = "config.json") -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def game_dir_for(name: str) -> str:
+    """Return the games/ sub-directory used for a game name."""
+    return os.path.join("games", name.replace(":", "-"))  # Replace ':' with '-' to avoid invalid directory name
+
+
+def image_concurrency(config: dict) -> int:
+    """Sprites in flight: every image host slot when image_backends is set, else imgconcurrency."""
+    if config.get("image_backends"):
+        return sum(b.get("max_concurrency", 1) for b in config["image_backends"])
+    return config.get("imgconcurrency", 4)
+
+
+def stage_deadline(config: dict, name: str) -> float:
+    """Deadline in seconds for a stage, from config["deadlines"]."""
+    return config.get("deadlines", {}).get(name, 300)
+
+
+def run_stage(config: dict, name: str, fn, deadline_name: str = None, measure=None):
+    """
+    Run fn(cancel) under its stage deadline, retrying it on its own if it gets stuck.
+    measure(result), if given, is the number of bytes the stage produced ("bytes" of its stage event).
+    """
+    with metrics.timed("stage", stage=name) as m:
+        result = run_with_deadline(name, fn, stage_deadline(config, deadline_name or name),
+                                   config.get("stage_retries", 0))
+        if measure is not None:
+            m["bytes"] = measure(result)
+        return result
+
+
+def file_bytes(paths) -> int:
+    """Total size of a file or a list of files (None and missing entries count as 0)."""
+    paths = paths if isinstance(paths, (list, tuple)) else [paths]
+    return sum(os.path.getsize(p) for p in paths if p is not None and os.path.exists(p))
+
+
+def text_bytes(text: str) -> int:
+    return len(text.encode("utf-8")) if text else 0
+
+
+def new_conversation(config: dict) -> ollamagen.OllamaConversation:
+    """Conversation shared by the idea and spec calls so the spec reuses the idea's tokens."""
+    return ollamagen.OllamaConversation(
+        "qwen3:8b",
+        keep_alive=config.get("ollama_keep_alive", ollamagen.KEEP_ALIVE),
+        think=False,
+    )
+
+
+def generate_idea(config: dict, theme: str, genre: str, timeout: float = 300,
+                  conversation: ollamagen.OllamaConversation = None) -> str:
+    prompt = config["prompt"].format(themes=theme, genres=genre)
+    conversation = conversation or new_conversation(config)
+    conversation.reset()  # a retried idea starts a fresh conversation
+    res = conversation.generate(
+        prompt=prompt,
+        timeout=timeout,
+        options={
+            "temperature": 0.8,
+            "num_ctx": ollamagen.IDEA_NUM_CTX,
+        },
+    )
+
+    cleaned_text = re.sub(r"<think>.*?</think>", "", res["response"], flags=re.DOTALL)
+    gameidea = cleaned_text.strip()
+
+    print("Game Idea:", gameidea)
+    return gameidea
+
+
+def generate_spec(gameidea: str, timeout: float = 300,
+                  conversation: ollamagen.OllamaConversation = None,
+                  cancel: threading.Event = None, on_image=None) -> dict:
+    """
+    Stream the JSON spec, constrained to SPEC_SCHEMA.
+
+    on_image(name, image) is called for each images[] entry as soon as its
+    object closes, so sprite jobs can start before the spec is finished.
+    """
+    if conversation is not None and conversation.context:
+        # The idea is already in the model's context; only the template is new
+        prompt = "For the game idea above, fill this json template" + "\n" + JSON_TEMPLATE
+    else:
+        conversation = conversation or ollamagen.OllamaConversation("qwen3:8b", think=False)
+        prompt = "Here is my game idea \n" + gameidea + "\n" + "Fill this json template"  + "\n"+ JSON_TEMPLATE
+    res = conversation.generate(
+        prompt=prompt,
+        timeout=timeout,
+        stream=True,
+        format=SPEC_SCHEMA,
+        options={
+            "temperature": 0.5,
+            "num_ctx": ollamagen.IDEA_NUM_CTX,  # must match the idea call or Ollama reloads the model
+        },
+    )
+
+    images = util.JsonArrayStream("images")
+    try:
+        while True:
+            for image in images.feed(next(res)):
+                name = images.head().get("name")
+                if on_image is not None and name:
+                    on_image(name, image)
+            if cancel is not None and cancel.is_set():
+                res.close()
+                raise StageTimeout("Spec generation cancelled")
+    except StopIteration as fin:
+        res = fin.value
+
+    json_data_raw = res["response"]
+    print("JSON Data:", json_data_raw)
+    print(f"Spec streamed {images.count} images")
+
+    try:
+        json_data = json.loads(json_data_raw)
+    except json.JSONDecodeError:
+        # Older Ollama versions ignore the schema; recover the JSON from free text
+        json_data = util.extract_json_from_llm_answer(json_data_raw)
+    print("Extracted JSON Data:", json_data)
+    return json_data
+
+
+def check_cancelled(cancel: Optional[threading.Event], what: str) -> None:
+    """Raise StageTimeout once a stage attempt has been abandoned for a retry."""
+    if cancel is not None and cancel.is_set():
+        raise StageTimeout(f"{what}: attempt abandoned after its deadline")
+
+
+def generate_asset(config: dict, img_dir: str, image: dict, cache: ImageCache = None,
+                   timeout: float = 300, cancel: threading.Event = None) -> Path:
+    """
+    Generate one sprite, then remove its background and trim it right away.
+    The image stays in memory until the final WxH_<file> is written; an
+    attempt cancelled in the meantime (its retry is already running) writes
+    nothing, so a sprite never ends up on disk twice.
+    """
+    img = genimg.generate_image(
+        output="image",
+        cache=cache,
+        timeout=timeout,
+        prompt=image["shortgenerationprompt"] + ", " + config["imgprompt"],
+        negativeprompt=config["imgnegativeprompt"],
+        **IMAGE_PARAMS
+    )
+    check_cancelled(cancel, f"image {image['file']}")
+    path = imgprocessor.process_in_memory(img, Path(img_dir), image["file"])
+    print(f"Generated image saved to: {path}")
+    return path
+
+
+SHEET_PROMPT = ("sprite sheet, {count} separate game sprites on a plain white background, "
+                "laid out in a {rows}x{cols} grid with wide white gaps, nothing touching, one item per cell, "
+                "in this order: {items}, ")
+
+
+def sheet_settings(config: dict) -> dict:
+    """config["sprite_sheets"] when the mode is on, else an empty dict."""
+    settings = config.get("sprite_sheets") or {}
+    return settings if settings.get("enabled", False) else {}
+
+
+def sheet_eligible(config: dict, image: dict) -> bool:
+    """Backgrounds and other full-frame images keep their own 512x512 render."""
+    text = (image["file"] + " " + image["shortgenerationprompt"]).lower()
+    return not any(word in text for word in sheet_settings(config).get("exclude", ()))
+
+
+def generate_sheet(config: dict, img_dir: str, images: list, cache: ImageCache = None,
+                   timeout: float = 300, cancel: threading.Event = None) -> list:
+    """
+    Render several sprites in one diffusion call and cut them apart
+    (imgprocessor.split_sheet). Returns one path per image, None for a
+    sprite that could not be found on the sheet. Like generate_asset, a
+    cancelled attempt writes nothing.
+    """
+    settings = sheet_settings(config)
+    cols = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / cols)
+    cell = settings.get("cell", 384)
+    items = "; ".join(f"{n}) {image['shortgenerationprompt']}" for n, image in enumerate(images, 1))
+    img = genimg.generate_image(
+        output="image",
+        cache=cache,
+        timeout=timeout,
+        prompt=SHEET_PROMPT.format(count=len(images), rows=rows, cols=cols, items=items) + config["imgprompt"],
+        negativeprompt=config["imgnegativeprompt"],
+        **dict(IMAGE_PARAMS, aspectratio="Custom", width=cols * cell, height=rows * cell)
+    )
+    check_cancelled(cancel, f"image sheet {images[0]['file']}")
+    paths = imgprocessor.split_sheet(img, Path(img_dir), [image["file"] for image in images], rows, cols,
+                                     gap=settings.get("gap", 6))
+    print(f"Sprite sheet: {sum(p is not None for p in paths)}/{len(images)} sprites cut from one render")
+    return paths
+
+
+class AssetJobs:
+    """
+    Sprite jobs for one game, started while the spec is still streaming.
+
+    start() is called for each images[] entry as soon as it is parsed;
+    results() starts whatever is still missing once the whole spec is known
+    and returns the processed paths in spec order. Jobs run on their own
+    pool of image_concurrency() workers, or on a pool shared between
+    games (pipeline) so the image hosts see the same concurrency.
+    Each image has its own deadline and is retried on its own.
+
+    With config["sprite_sheets"] on, small sprites are grouped per_sheet at
+    a time and rendered as one sheet; a sprite missing from its sheet falls
+    back to a render of its own.
+    """
+
+    def __init__(self, config: dict, cache: ImageCache = None, pool: ThreadPoolExecutor = None,
+                 reuse_existing: bool = False):
+        self.config = config
+        self.cache = cache
+        self.reuse_existing = reuse_existing  # resuming: keep sprites a killed run already wrote
+        self._own_pool = pool is None
+        self.pool = pool or ThreadPoolExecutor(max_workers=image_concurrency(config))
+        self._jobs = {}  # (game name, file, prompt) -> Future
+        self._sheet_group = []  # (img_dir, image, Future) waiting for a full sheet
+        self._sheet_jobs = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, image: dict) -> tuple:
+        return name, image["file"], image["shortgenerationprompt"]
+
+    def start(self, name: str, image: dict) -> None:
+        """Queue one sprite unless the same one is already queued."""
+        key = self._key(name, image)
+        with self._lock:
+            if key not in self._jobs:
+                img_dir = os.path.join(game_dir_for(name), "images")
+                if sheet_settings(self.config) and sheet_eligible(self.config, image):
+                    self._jobs[key] = Future()
+                    self._sheet_group.append((img_dir, image, self._jobs[key]))
+                    if len(self._sheet_group) >= sheet_settings(self.config).get("per_sheet", 4):
+                        self._submit_sheet()
+                else:
+                    self._jobs[key] = self.pool.submit(self._generate, img_dir, image)
+
+    def _submit_sheet(self) -> None:
+        """Start a sheet for the grouped sprites. Call with the lock held."""
+        if self._sheet_group:
+            self._sheet_jobs.append(self.pool.submit(self._generate_sheet, self._sheet_group))
+            self._sheet_group = []
+
+    def _generate(self, img_dir: str, image: dict) -> Path:
+        if self.reuse_existing:
+            existing = checkpoint.find_asset(img_dir, image["file"])
+            if existing is not None:
+                return existing
+        os.makedirs(img_dir, exist_ok=True)
+        timeout = stage_deadline(self.config, "image")
+        return run_stage(self.config, f"image {image['file']}",
+                         lambda cancel: generate_asset(self.config, img_dir, image, self.cache, timeout, cancel),
+                         deadline_name="image", measure=file_bytes)
+
+    def _generate_sheet(self, group: list) -> None:
+        group = [(img_dir, image, f) for img_dir, image, f in group if f.set_running_or_notify_cancel()]
+        if self.reuse_existing:
+            for img_dir, image, f in list(group):
+                existing = checkpoint.find_asset(img_dir, image["file"])
+                if existing is not None:
+                    f.set_result(existing)
+                    group.remove((img_dir, image, f))
+        paths = [None] * len(group)
+        if len(group) > 1:
+            img_dir = group[0][0]
+            images = [image for _, image, _ in group]
+            os.makedirs(img_dir, exist_ok=True)
+            timeout = stage_deadline(self.config, "image")
+            try:
+                paths = run_stage(self.config, f"image sheet {images[0]['file']}+{len(images) - 1}",
+                                  lambda cancel: generate_sheet(self.config, img_dir, images, self.cache, timeout,
+                                                                cancel),
+                                  deadline_name="image", measure=file_bytes)
+            except Exception as e:
+                print(f"Sprite sheet failed, rendering its sprites one by one: {e}")
+        for (img_dir, image, f), path in zip(group, paths):
+            try:
+                f.set_result(path if path is not None else self._generate(img_dir, image))
+            except Exception as e:
+                f.set_exception(e)
+
+    def cancel_pending(self) -> None:
+        """Drop queued jobs that have not started (the spec is being retried)."""
+        with self._lock:
+            for future in self._sheet_jobs:
+                future.cancel()
+            self._sheet_jobs = []
+            self._sheet_group = []
+            for key, future in list(self._jobs.items()):
+                if future.cancel():
+                    del self._jobs[key]
+
+    def drop_other_games(self, name: str) -> None:
+        """
+        Release jobs started for a spec attempt that named the game differently
+        (the spec was retried): queued ones are cancelled, and running ones have
+        their sprite, and the folders left empty by it, removed when they finish.
+        """
+        with self._lock:
+            stale = [(key, future) for key, future in self._jobs.items() if key[0] != name]
+            for key, _ in stale:
+                del self._jobs[key]
+        for key, future in stale:
+            if not future.cancel():
+                future.add_done_callback(lambda f, old=key[0]: _discard_sprite(f, old))
+
+    def abort(self) -> None:
+        """Give up on this game's sprites: drop queued jobs and release the pool if it is our own."""
+        self.cancel_pending()
+        if self._own_pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def results(self, json_data: dict) -> list:
+        keys = [self._key(json_data["name"], image) for image in json_data["images"]]
+        for image in json_data["images"]:
+            self.start(json_data["name"], image)
+        with self._lock:
+            self._submit_sheet()  # the last, partly filled sheet
+        try:
+            with self._lock:
+                futures = [self._jobs[key] for key in keys]
+            return [f.result() for f in futures]
+        finally:
+            if self._own_pool:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _discard_sprite(future: Future, name: str) -> None:
+    """Delete the sprite a dropped job wrote, then its images/ and game folder if that left them empty."""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        Path(future.result()).unlink(missing_ok=True)
+    game_dir = game_dir_for(name)
+    for folder in (os.path.join(game_dir, "images"), game_dir):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break  # not empty (or already gone): leave it
+
+
+def generate_assets(config: dict, json_data: dict, cache: ImageCache = None,
+                    jobs: AssetJobs = None) -> list:
+    """
+    Generate every sprite of the spec with at most image_concurrency(config)
+    requests in flight, reusing jobs already started while the spec streamed.
+    Returns the processed image paths in json_data["images"] order.
+    """
+    return (jobs or AssetJobs(config, cache)).results(json_data)
+
+
+def atlas_stage(config: dict, spec: dict, assets: list):
+    """
+    Pack the processed sprites into atlas pages (config["atlas"]).
+    Returns the frame map, or None when atlases are disabled.
+    """
+    if not config.get("atlas", False) or not assets:
+        return None
+    img_dir = Path(assets[0]).parent
+    frames = atlas.build_atlas(assets, img_dir)
+    print(f"Packed {len(assets)} sprites into {len(frames['pages'])} atlas page(s)")
+    return frames
+
+
+def describe_atlas(json_data: dict, imglist: list, frames: dict) -> str:
+    """Assets section of the game prompt listing atlas pages and frame rectangles."""
+    parent = os.path.basename(os.path.dirname(imglist[0]))
+    lines = ["Atlas pages :"]
+    lines += [f"    page {n}: {parent}/{page}" for n, page in enumerate(frames["pages"])]
+    lines.append("    Sprite frames (name: page, x, y, w, h) :")
+    by_file = {f["file"]: (name, f) for name, f in frames["frames"].items()}
+    for i in range(len(imglist)):
+        name, f = by_file[os.path.basename(imglist[i])]
+        lines.append(f"    {name}: page {f['page']}, x {f['x']}, y {f['y']}, w {f['w']}, h {f['h']}"
+                     f" description: {json_data['images'][i]['shortgenerationprompt']}")
+    return "\n".join(lines)
+
+
+def build_game_prompt(gameidea: str, json_data: dict, imglist: list, frames: dict = None) -> str:
+    if frames:
+        return GAME_PROMPT_TEMPLATE.format(imagerule=ATLAS_RULE, gameidea=gameidea,
+                                           imgliststr=describe_atlas(json_data, imglist, frames))
+
+    imagelistwithdescription = []
+    for i in range(len(imglist)):
+        filename = os.path.basename(imglist[i])
+        parent = os.path.basename(os.path.dirname(imglist[i]))
+        imagelistwithdescription.append(f"path: {parent}/{filename} description: {json_data['images'][i]['shortgenerationprompt']}")
+
+    imgliststr = "List of available images :\n    " + "\n".join(imagelistwithdescription)
+    return GAME_PROMPT_TEMPLATE.format(imagerule=IMAGE_FILES_RULE, imgliststr=imgliststr, gameidea=gameidea)
+
+
+class CodeRejected(RuntimeError):
+    """A code candidate failed static validation while it streamed."""
+
+
+class GameRejected(RuntimeError):
+    """A game whose game.html failed validation on every attempt; it has been quarantined."""
+
+
+def generate_code(gamegenprompt: str, cancel: threading.Event = None, timeout: float = 300,
+                  partial_path: str = None, temperature: float = 0.6, seed: int = None,
+                  validator: validate.StreamValidator = None) -> str:
+    """
+    Stream game.html from the coder model.
+
+    The stream is closed as soon as </html> arrives. While it runs the
+    document is mirrored to partial_path, which is left behind if the
+    stage times out and removed once the document is complete. With a
+    validator, the stream is closed (CodeRejected) at the first problem.
+    """
+    if cancel is not None and cancel.is_set():
+        raise StageTimeout("Code generation cancelled")  # e.g. another candidate already won
+    collector = util.HtmlStreamCollector(partial_path)
+    options = {"temperature": temperature, "num_ctx": 8192}
+    if seed is not None:
+        options["seed"] = seed
+    res = ollamagen.ollama_generate(
+        model="qwen3-coder:latest",
+        prompt=gamegenprompt,
+        options=options,
+        stream=True,
+        timeout=timeout,
+    )
+
+    try:
+        for piece in res:
+            parts = len(collector.parts)
+            done = collector.feed(piece)
+            if validator is not None:
+                problem = None
+                for part in collector.parts[parts:]:
+                    problem = validator.feed(part)
+                if problem:
+                    raise CodeRejected(f"{problem} after {collector.size} characters")
+            if done:
+                break  # the rest is chatter after </html>
+            if cancel is not None and cancel.is_set():
+                raise StageTimeout("Code generation cancelled")
+    finally:
+        res.close()  # closes the HTTP stream so Ollama stops generating
+        collector.close()
+
+    print("\n=== FINAL RESULT ===\n")
+    print(f"Generated HTML content: {collector.size} characters")
+    return collector.html()
+
+
+def generate_thumbnail(game_dir: str, name: str, cache: ImageCache = None, timeout: float = 300) -> str:
+    return genimg.generate_image(
+        outfile=os.path.join(game_dir, "thumbnail.png"),
+        cache=cache,
+        timeout=timeout,
+        prompt=THUMBNAIL_PROMPT.format(name=name),
+        negativeprompt=THUMBNAIL_NEGATIVE_PROMPT,
+        **IMAGE_PARAMS
+    )
+
+
+def write_game_files(game_dir: str, gameidea: str, json_data: dict, gamegenprompt: str, html_content: str) -> None:
+    # save the generated HTML file (each file is written atomically, see checkpoint.write_atomic)
+    checkpoint.write_atomic(os.path.join(game_dir, "game.html"), html_content)
+    # Save the game idea and JSON data to a text file
+    checkpoint.write_atomic(os.path.join(game_dir, "game_info.txt"),
+                            f"Game Idea:\n{gameidea}\n\n" + "JSON Data:\n" + json.dumps(json_data, indent=2))
+    checkpoint.write_atomic(os.path.join(game_dir, "prompt.txt"), gamegenprompt)
+
+
+def pick_theme_genre(config: dict, dedup: DedupIndex = None) -> tuple:
+    if dedup is not None:
+        theme, genre = dedup.pick_theme_genre(config["themes"], config["genres"])
+    else:
+        theme = random.choice(config["themes"])
+        genre = random.choice(config["genres"])
+    print(f"Selected Theme: {theme}")
+    print(f"Selected Genre: {genre}")
+    return theme, genre
+
+
+def idea_stage(config: dict, theme: str, genre: str,
+               conversation: ollamagen.OllamaConversation = None, dedup: DedupIndex = None) -> str:
+    """
+    Generate the idea; with a dedup index, an idea too close to an existing
+    game is regenerated (up to config["dedup"]["attempts"] times) before
+    any image or code work is spent on it.
+    """
+    attempts = (config.get("dedup") or {}).get("attempts", 3) if dedup is not None else 1
+    for attempt in range(1, attempts + 1):
+        idea = run_stage(config, "idea",
+                         lambda cancel: generate_idea(config, theme, genre, stage_deadline(config, "idea"),
+                                                      conversation))
+        if dedup is None:
+            return idea
+        match = dedup.find_similar(idea)
+        if match is None:
+            dedup.accept(idea)
+            return idea
+        name, score, kind = match
+        metrics.record("duplicate", theme=theme, genre=genre, match=name, similarity=round(score, 3), kind=kind)
+        print(f"Idea rejected ({attempt}/{attempts}): {kind} {score:.0%} similar to '{name}'")
+    raise RuntimeError(f"Every idea was a near-duplicate after {attempts} attempts")
+
+
+# One backlog refill at a time; threads that find the backlog empty wait for it
+_refill_lock = threading.Lock()
+
+
+def backlog_idea(config: dict, backlog: IdeaBacklog, dedup: DedupIndex = None) -> Optional[dict]:
+    """
+    Next {"theme", "genre", "idea"} from the backlog. When it is empty, one
+    round of parallel batch calls refills it first (see ideabacklog.fill).
+    Batch ideas are checked against the dedup index as they are queued.
+    Returns None if the refill produced nothing.
+    """
+    entry = backlog.take()
+    if entry is not None:
+        return entry
+    with _refill_lock:
+        entry = backlog.take()
+        if entry is not None:
+            return entry
+
+        def pick_pair():
+            if dedup is not None:
+                return dedup.pick_theme_genre(config["themes"], config["genres"])
+            return random.choice(config["themes"]), random.choice(config["genres"])
+
+        def check(idea):
+            match = dedup.find_similar(idea)
+            if match is None:
+                dedup.accept(idea)
+            return match
+
+        with metrics.timed("stage", stage="idea batch") as info:
+            info["ideas"] = ideabacklog.fill(config, backlog, pick_pair, check if dedup is not None else None)
+        print(f"Idea backlog refilled with {info['ideas']} ideas")
+        return backlog.take()
+
+
+def spec_stage(config: dict, idea: str, conversation: ollamagen.OllamaConversation = None,
+               jobs: AssetJobs = None) -> dict:
+    """
+    Stream the spec, starting sprite jobs on `jobs` as images are parsed.
+    An abandoned attempt stops starting jobs, and jobs of an attempt that
+    named the game differently are dropped once the spec is final.
+    """
+    def attempt(cancel):
+        if jobs is None:
+            return generate_spec(idea, stage_deadline(config, "spec"), conversation, cancel)
+        jobs.cancel_pending()
+
+        def on_image(name, image):
+            if not cancel.is_set():
+                jobs.start(name, image)
+
+        return generate_spec(idea, stage_deadline(config, "spec"), conversation, cancel, on_image=on_image)
+
+    json_data = run_stage(config, "spec", attempt)
+    if jobs is not None:
+        jobs.drop_other_games(json_data["name"])
+    # create the game directory
+    os.makedirs(game_dir_for(json_data["name"]), exist_ok=True)
+    return json_data
+
+
+def thumbnail_stage(config: dict, spec: dict, cache: ImageCache = None) -> str:
+    return run_stage(config, "thumbnail",
+                     lambda cancel: generate_thumbnail(game_dir_for(spec["name"]), spec["name"], cache,
+                                                       stage_deadline(config, "thumbnail")),
+                     measure=file_bytes)
+
+
+def candidate_settings(config: dict) -> dict:
+    """config["code_candidates"] when best-of-N code generation is on, else an empty dict."""
+    settings = config.get("code_candidates") or {}
+    return settings if settings.get("enabled", False) and candidate_count(config) > 1 else {}
+
+
+def candidate_count(config: dict) -> int:
+    """
+    Number of code candidates to stream: config["code_candidates"]["count"], capped
+    at the Ollama slots of config["ollama_backends"], since a candidate waiting for
+    a slot would only start once another one is done.
+    """
+    count = (config.get("code_candidates") or {}).get("count", 1)
+    backends = config.get("ollama_backends")
+    if backends:
+        count = min(count, sum(b.get("max_concurrency", 1) for b in backends))
+    return count
+
+
+def generate_code_candidates(config: dict, gamegenprompt: str, img_dir: str, cancel: threading.Event = None,
+                             timeout: float = 300) -> str:
+    """
+    Stream config["code_candidates"]["count"] versions of game.html at once,
+    each with its own temperature and seed, so they fill Ollama's parallel
+    slots. Every stream is validated while it arrives and dropped at its
+    first problem; the first complete document that passes wins and the
+    other streams are closed right away. If none passes, the complete
+    candidate with the fewest problems is used. Candidates do not mirror
+    a game.html.partial.
+    """
+    settings = candidate_settings(config)
+    count = candidate_count(config)
+    temperatures = settings.get("temperatures", [0.6])
+    stop = threading.Event()  # set once a winner exists, or when the stage is cancelled
+    fallbacks = []
+
+    def candidate(n: int) -> Optional[str]:
+        temperature = temperatures[n % len(temperatures)]
+        validator = new_validator(config, img_dir)
+        start = time.perf_counter()
+        outcome, problems, html = "rejected", [], None
+        try:
+            html = generate_code(gamegenprompt, stop, timeout, temperature=temperature,
+                                 seed=random.randrange(1 << 31), validator=validator)
+            problems = validator.finish()
+            outcome = "valid" if not problems else "rejected"
+            if problems:
+                fallbacks.append((len(problems), n, html))
+        except StageTimeout:
+            outcome = "cancelled"
+        except CodeRejected as e:
+            problems = [str(e)]
+        finally:
+            metrics.record("code_candidate", candidate=n, temperature=temperature, outcome=outcome,
+                           problems=problems[:3] or None, chars=len(html) if html else None,
+                           wall=round(time.perf_counter() - start, 3))
+        if problems:
+            print(f"Code candidate {n} rejected: {problems[0]}")
+        return html if outcome == "valid" else None
+
+    pool = ThreadPoolExecutor(max_workers=count, thread_name_prefix="code")
+    try:
+        futures = [pool.submit(candidate, n) for n in range(count)]
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                raise StageTimeout("Code generation cancelled")
+            for future in done:
+                try:
+                    html = future.result()
+                except Exception as e:  # a failed request only loses one candidate
+                    print(f"Code candidate failed: {e}")
+                    continue
+                if html is not None:
+                    print(f"Code candidate {futures.index(future)} passed validation; closing the others")
+                    return html
+        if fallbacks:
+            problems, n, html = min(fallbacks)
+            print(f"No code candidate passed validation; using candidate {n} ({problems} problems)")
+            return html
+        raise RuntimeError(f"All {count} code candidates were rejected")
+    finally:
+        stop.set()  # the other streams stop at their next chunk
+        pool.shutdown(wait=False)
+
+
+def stream_code(config: dict, gamegenprompt: str, game_dir: str) -> str:
+    """game.html for a prompt: one stream, or the best of several with config["code_candidates"]."""
+    if candidate_settings(config):
+        return run_stage(config, "code", lambda cancel: generate_code_candidates(
+            config, gamegenprompt, os.path.join(game_dir, "images"), cancel, stage_deadline(config, "code")),
+            measure=text_bytes)
+    partial_path = os.path.join(game_dir, "game.html.partial")
+    return run_stage(config, "code",
+                     lambda cancel: generate_code(gamegenprompt, cancel, stage_deadline(config, "code"), partial_path),
+                     measure=text_bytes)
+
+
+def code_stage(config: dict, idea: str, spec: dict, assets: list, frames: dict = None) -> tuple:
+    """Return (prompt, html) for the game."""
+    gamegenprompt = build_game_prompt(idea, spec, assets, frames)
+    return gamegenprompt, stream_code(config, gamegenprompt, game_dir_for(spec["name"]))
+
+
+def validation_settings(config: dict) -> dict:
+    """config["validation"] when the gate is on, else an empty dict."""
+    settings = config.get("validation") or {}
+    return settings if settings.get("enabled", False) else {}
+
+
+def new_validator(config: dict, img_dir: str) -> validate.StreamValidator:
+    """Validator for a game's HTML against its processed images and the size limits of config["validation"]."""
+    settings = validation_settings(config)
+    return validate.StreamValidator(os.listdir(img_dir) if os.path.isdir(img_dir) else [],
+                                    settings.get("max_lines"), settings.get("max_bytes"))
+
+
+def validate_stage(config: dict, spec: dict, code: tuple) -> tuple:
+    """
+    Check game.html before it is written and before a thumbnail is rendered
+    for it. A failing game gets its code regenerated with the problems
+    listed in the prompt, up to config["validation"]["regenerate"] times;
+    if it still fails, the game folder is quarantined (GameRejected).
+    Returns (prompt, html) of the version that passed.
+    """
+    if not validation_settings(config):
+        return code
+    gamegenprompt, html = code
+    game_dir = game_dir_for(spec["name"])
+    attempts = validation_settings(config).get("regenerate", 1)
+    for attempt in range(attempts + 1):
+        validator = new_validator(config, os.path.join(game_dir, "images"))
+        validator.feed(html or "")
+        problems = validator.finish()
+        metrics.record("validation", game=spec["name"], attempt=attempt, ok=not problems, problems=problems[:5] or None)
+        if not problems:
+            return gamegenprompt, html
+        print(f"game.html failed validation: {'; '.join(problems[:3])}")
+        if attempt < attempts:
+            gamegenprompt = code[0] + REPAIR_PROMPT.format(problems="\n".join(f"    - {p}" for p in problems[:10]))
+            html = stream_code(config, gamegenprompt, game_dir)
+    checkpoint.quarantine(game_dir, f"game.html failed validation: {'; '.join(problems[:3])}")
+    raise GameRejected(f"{spec['name']} failed validation {attempts + 1} times: {problems[0]}")
+
+
+def files_stage(idea: str, spec: dict, code: tuple) -> str:
+    gamegenprompt, html_content = code
+    game_dir = game_dir_for(spec["name"])
+    write_game_files(game_dir, idea, spec, gamegenprompt, html_content)
+    return game_dir
+
+
+def start_manifest(idea: str, spec: dict, theme: str, genre: str) -> checkpoint.Manifest:
+    """Checkpoint a game as soon as its spec exists, so a killed run can resume it."""
+    return checkpoint.Manifest.create(game_dir_for(spec["name"]), theme=theme, genre=genre, idea=idea, spec=spec)
+
+
+def checkpointed(manifest: checkpoint.Manifest, stage: str, result):
+    """Mark stage done in the manifest and pass its result through."""
+    manifest.mark(stage)
+    return result
+
+
+def finish_game(manifest: checkpoint.Manifest, timings: dict = None, dedup: DedupIndex = None) -> str:
+    """Record a game whose files are written and close its manifest. Returns the game directory."""
+    record_game(manifest.game_dir, manifest.get("theme"), manifest.get("genre"), timings)
+    atlas.remove_sources(Path(manifest.game_dir) / "images")  # only the atlas pages are published
+    if dedup is not None:
+        dedup.add(os.path.basename(manifest.game_dir), manifest["spec"]["name"], manifest["idea"],
+                  manifest.get("theme"), manifest.get("genre"))
+    manifest.complete()
+    return manifest.game_dir
+
+
+def record_game(game_dir: str, theme: str, genre: str, timings: dict = None) -> None:
+    """Add the finished game to the catalog read by updateindex."""
+    timings = {k: round(v, 3) for k, v in (timings or {}).items()}
+    metrics.record("game", game=os.path.basename(game_dir), theme=theme, genre=genre, timings=timings)
+    with Catalog() as catalog:
+        catalog.record_game_dir(game_dir, theme=theme, genre=genre, timings=timings)
+
+
+def generate_game(config: dict, cache: ImageCache = None, dedup: DedupIndex = None,
+                  backlog: IdeaBacklog = None) -> str:
+    """
+    Generate one complete game and return its directory.
+
+    Stages run as a DAG so that independent work overlaps:
+
+        idea -> spec -> assets -> atlas -> code -> validation -> files
+                  |                                    :
+                  +--> thumbnail <.....................:
+
+    Sprite jobs start while the spec streams, as soon as each images[]
+    entry is parsed; the assets stage waits for the rest. The thumbnail
+    only needs the game name, so it renders while the code model is still
+    streaming, unless config["validation"] is on: then it waits for
+    game.html to pass, so no diffusion call is spent on a rejected game.
+    Every stage runs under its own deadline from config["deadlines"] and
+    is retried on its own when it gets stuck.
+    With a dedup index, theme/genre pairs not produced yet are preferred
+    and near-duplicate ideas are regenerated. With a backlog, the idea is
+    taken from it instead of costing its own LLM call.
+    """
+    entry = backlog_idea(config, backlog, dedup) if backlog is not None else None
+    conversation = new_conversation(config)
+    jobs = AssetJobs(config, cache)
+
+    graph = StageGraph(max_workers=3)
+    if entry is not None:
+        theme, genre = entry["theme"], entry["genre"]
+        print(f"Idea from the backlog ({len(backlog)} left): {theme} / {genre}")
+        graph.add("idea", lambda: entry["idea"])
+    else:
+        theme, genre = pick_theme_genre(config, dedup)
+        graph.add("idea", lambda: idea_stage(config, theme, genre, conversation, dedup))
+    graph.add("spec", lambda idea: spec_stage(config, idea, conversation, jobs), deps=["idea"])
+    graph.add("manifest", lambda idea, spec: start_manifest(idea, spec, theme, genre), deps=["idea", "spec"])
+    graph.add("assets", lambda spec, manifest: checkpointed(manifest, "assets", generate_assets(config, spec, cache, jobs)),
+              deps=["spec", "manifest"])
+    graph.add("atlas", lambda spec, assets, manifest: checkpointed(manifest, "atlas", atlas_stage(config, spec, assets)),
+              deps=["spec", "assets", "manifest"])
+    graph.add("code", lambda idea, spec, assets, atlas: code_stage(config, idea, spec, assets, atlas),
+              deps=["idea", "spec", "assets", "atlas"])
+    graph.add("validation", lambda spec, code: validate_stage(config, spec, code), deps=["spec", "code"])
+    graph.add("files", lambda idea, spec, validation, manifest: checkpointed(manifest, "files",
+                                                                             files_stage(idea, spec, validation)),
+              deps=["idea", "spec", "validation", "manifest"])
+    graph.add("thumbnail", lambda spec, manifest, **_: checkpointed(manifest, "thumbnail",
+                                                                    thumbnail_stage(config, spec, cache)),
+              deps=["spec", "manifest"] + (["validation"] if validation_settings(config) else []))
+    try:
+        results = graph.run()
+    except BaseException:
+        jobs.abort()  # spec or a later stage failed: sprites queued while the spec streamed are not needed
+        raise
+    return finish_game(results["manifest"], graph.timings, dedup)
+
+
+def resume_game(config: dict, manifest: checkpoint.Manifest, cache: ImageCache = None,
+                dedup: DedupIndex = None) -> str:
+    """
+    Finish a game left behind by a killed run, starting from its first
+    missing stage. Sprites already on disk are kept, so only the ones that
+    never arrived are rendered. Returns the game directory.
+    """
+    idea, spec = manifest["idea"], manifest["spec"]
+    print(f"Resuming {manifest.game_dir} at stage '{manifest.next_stage()}'")
+    timings = {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    if not manifest.done("files"):
+        assets = timed("assets", lambda: generate_assets(config, spec, cache,
+                                                         AssetJobs(config, cache, reuse_existing=True)))
+        manifest.mark("assets")
+        if manifest.done("atlas"):
+            frames = atlas.load_atlas(Path(assets[0]).parent) if config.get("atlas", False) and assets else None
+        else:
+            frames = checkpointed(manifest, "atlas", timed("atlas", lambda: atlas_stage(config, spec, assets)))
+        code = timed("code", lambda: code_stage(config, idea, spec, assets, frames))
+        code = timed("validation", lambda: validate_stage(config, spec, code))
+        checkpointed(manifest, "files", files_stage(idea, spec, code))
+    if not manifest.done("thumbnail") or not os.path.exists(os.path.join(manifest.game_dir, "thumbnail.png")):
+        checkpointed(manifest, "thumbnail", timed("thumbnail", lambda: thumbnail_stage(config, spec, cache)))
+    return finish_game(manifest, timings, dedup)
+
+
+def resume_incomplete(config: dict, cache: ImageCache = None, limit: int = None,
+                      dedup: DedupIndex = None) -> list:
+    """
+    Resume up to `limit` unfinished games (all when None), oldest first.
+
+    A game that still has not finished after config["resume_attempts"]
+    resumes is quarantined, as are folders from killed runs that have
+    nothing to resume from, so updateindex never publishes them.
+    Returns the directories of the games finished.
+    """
+    for game_dir in checkpoint.orphan_dirs():
+        checkpoint.quarantine(game_dir, "no manifest and no game.html")
+    finished = []
+    for manifest in checkpoint.incomplete_games():
+        if limit is not None and len(finished) >= limit:
+            break
+        if manifest["resumes"] >= config.get("resume_attempts", 2):
+            checkpoint.quarantine(manifest.game_dir, f"still unfinished after {manifest['resumes']} resumes")
+            continue
+        manifest.data["resumes"] += 1
+        manifest.save()
+        try:
+            finished.append(resume_game(config, manifest, cache, dedup))
+        except Exception as e:
+            print(f"Resuming {manifest.game_dir} failed: {e}")
+    return finished
+
+
+def publish_game(publisher: Optional[GitPublisher], game_dir: str, index_paths: Sequence[str] = ()) -> None:
+    """
+    Queue a finished game, and the files the index rebuild wrote for it, for
+    the next batch commit and commit if a batch is due.
+    """
+    if publisher is None:
+        return
+    try:
+        publisher.add(game_dir)
+        publisher.add_paths(index_paths)
+        publisher.publish()
+    except Exception as e:  # a failed commit must not stop generation; the game stays queued
+        print(f"Publish failed: {e}")
+
+
+def run_worker(config: dict, count: int = None, update_index: bool = False, resume: bool = False) -> None:
+    """
+    Generate games in a loop inside this process.
+
+    Config, imports and HTTP connections stay warm between games. A failed
+    game is logged and the loop moves on to the next one.
+    """
+    cache = ImageCache.from_config(config)
+    dedup = DedupIndex.from_config(config)
+    backlog = IdeaBacklog.from_config(config)
+    publisher = GitPublisher.from_config(config)
+    done = 0
+    if resume:
+        done += len(resume_incomplete(config, cache, limit=count, dedup=dedup))
+    while count is None or done < count:
+        done += 1
+        print(f"\n=== Worker: game {done} ===\n")
+        try:
+            game_dir = generate_game(config, cache, dedup, backlog)
+        except Exception as e:
+            print(f"Game failed: {e}")
+            continue
+        print(f"Game generated in: {game_dir}")
+        index_paths = updateindex.build_index() if update_index else []
+        publish_game(publisher, game_dir, index_paths)
+        if cache is not None:
+            cache.flush()
+            print(f"Image cache hit rate: {cache.stats()['hit_rate']:.1%}")
+
+
+def main() -> None:
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace")  # avoids crashes on fancy chars
+    parser = argparse.ArgumentParser(description="Generate an HTML5 game with local LLM and image servers.")
+    parser.add_argument("--worker", action="store_true", help="keep generating games in this process")
+    parser.add_argument("--pipeline", action="store_true", help="keep generating games, overlapping stages across games")
+    parser.add_argument("--count", type=int, default=None, help="number of games the worker generates (default: forever)")
+    parser.add_argument("--update-index", action="store_true", help="rebuild index.html after each game")
+    parser.add_argument("--resume", action="store_true",
+                        help="finish games left incomplete by a killed run before starting new ones")
+    args = parser.parse_args()
+
+    config = load_config()
+    metrics.configure(config.get("metrics_log"))
+    backends.configure(config)
+    if args.pipeline:
+        from pipeline import GamePipeline  # imports gamegen itself
+
+        publisher = GitPublisher.from_config(config)
+
+        def on_game_done(game_dir: str) -> None:
+            index_paths = updateindex.build_index() if args.update_index else []
+            publish_game(publisher, game_dir, index_paths)
+
+        pipeline = GamePipeline(config, ImageCache.from_config(config), on_game_done=on_game_done)
+        if args.resume:
+            resume_incomplete(config, pipeline.cache, dedup=pipeline.dedup)
+        stats = pipeline.run(args.count)
+        if pipeline.cache is not None:
+            pipeline.cache.close()
+        print(f"Pipeline finished: {stats['completed']} games, {stats['failed']} failed, "
+              f"{stats['games_per_hour']:.1f} games/hour over {stats['elapsed']:.0f}s")
+        return
+    if args.worker:
+        run_worker(config, count=args.count, update_index=args.update_index, resume=args.resume)
+        return
+
+    cache = ImageCache.from_config(config)
+    dedup = DedupIndex.from_config(config)
+    # With --resume, a run finishes one leftover game instead of starting a new one
+    resumed = resume_incomplete(config, cache, limit=1, dedup=dedup) if args.resume else []
+    game_dir = resumed[0] if resumed else generate_game(config, cache, dedup, IdeaBacklog.from_config(config))
+    print(f"Game generated in: {game_dir}")
+    index_paths = updateindex.build_index() if args.update_index else []
+    publisher = GitPublisher.from_config(config)
+    if publisher is not None:
+        publisher.add(game_dir)  # runloop.ps1 updates the index and commits the batch with gitpublish.py
+        publisher.add_paths(index_paths)
+    if cache is not None:
+        cache.close()
+        print(f"Image cache hit rate: {cache.stats()['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
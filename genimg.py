@@ -1,18 +1,247 @@
+import io
 import os
+import threading
+import time
 import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional
 from urllib.parse import urljoin
+from imgcache import ImageCache
+import metrics
+
+
+# Default image server; bench.py points it at a local stand-in server
+BASE_URL = "http://localhost:7801"
+
+# Return types supported by generate_image(output=...)
+OUTPUTS = ("path", "bytes", "image")
+
+
+class InvalidSessionError(RuntimeError):
+    pass
+
+
+class ImageClient:
+    """
+    Reusable, thread-safe client for the local text-to-image server.
+
+    Keeps a pooled keep-alive requests.Session and caches the server
+    session_id, renewing it only when the server rejects it. Concurrent
+    callers share one client (and one connection pool).
+    """
+
+    def __init__(self, base_url: str = "http://localhost:7801", pool_size: int = 8,
+                 chunk_size: int = 64 * 1024):
+        self.base_url = base_url
+        self.chunk_size = chunk_size
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self._session_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> str:
+        session_url = urljoin(self.base_url, "/API/GetNewSession")
+        sid_resp = self.http.post(session_url, json={}, timeout=60)
+        sid_resp.raise_for_status()
+        session_id = sid_resp.json().get("session_id")
+        if not session_id:
+            raise RuntimeError(f"No session_id in response: {sid_resp.text}")
+        return session_id
+
+    def session_id(self, stale: Optional[str] = None) -> str:
+        """
+        Return the cached session_id, creating one if needed.
+        Pass the rejected id as `stale` to force a renewal; concurrent callers
+        that saw the same stale id only trigger a single renewal.
+        """
+        with self._lock:
+            if self._session_id is None or self._session_id == stale:
+                self._session_id = self._new_session()
+            return self._session_id
+
+    def _generate(self, session_id: str, params: Dict, timeout: float) -> Dict:
+        payload = {"session_id": session_id}
+        payload.update(params)  # add all user-specified API params
+
+        gen_url = urljoin(self.base_url, "/API/GenerateText2Image")
+        gen_resp = self.http.post(gen_url, json=payload, timeout=timeout)
+        if gen_resp.status_code == 401:
+            raise InvalidSessionError(gen_resp.text)
+        gen_resp.raise_for_status()
+        data = gen_resp.json()
+        if data.get("error_id") == "invalid_session_id":
+            raise InvalidSessionError(data.get("error", data))
+        return data
+
+    def _download(self, url: str, outfile: str, timeout: float) -> None:
+        """Stream the image to disk in chunks, then move it into place."""
+        os.makedirs(os.path.dirname(os.path.abspath(outfile)) or ".", exist_ok=True)
+        tmpfile = outfile + ".part"
+        with self.http.get(url, timeout=timeout, stream=True) as img_resp:
+            img_resp.raise_for_status()
+            with open(tmpfile, "wb") as f:
+                for chunk in img_resp.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+        os.replace(tmpfile, outfile)
+
+    def _download_bytes(self, url: str, timeout: float) -> bytes:
+        with self.http.get(url, timeout=timeout, stream=True) as img_resp:
+            img_resp.raise_for_status()
+            buf = io.BytesIO()
+            for chunk in img_resp.iter_content(chunk_size=self.chunk_size):
+                buf.write(chunk)
+        return buf.getvalue()
+
+    def _image_url(self, params: Dict, timeout: float) -> str:
+        """Run the generation and return the URL of the first image."""
+        session_id = self.session_id()
+        try:
+            data = self._generate(session_id, params, timeout)
+        except InvalidSessionError:
+            data = self._generate(self.session_id(stale=session_id), params, timeout)
+
+        image_paths = data.get("images")
+        if not image_paths:
+            raise RuntimeError(f"No images returned: {data}")
+
+        first_image_path = image_paths[0]
+        if not first_image_path.startswith("http"):
+            first_image_path = urljoin(self.base_url + "/", first_image_path.lstrip("/"))
+        return first_image_path
+
+    def _render_file(self, params: Dict, outfile: str, timeout: float) -> None:
+        """Generate on the server and download the image to outfile."""
+        started = time.perf_counter()
+        url = self._image_url(params, timeout)
+        generated = time.perf_counter()
+        self._download(url, outfile, timeout)
+        metrics.record("image", model=params.get("model"), cache_hit=False, host=self.base_url,
+                       server=round(generated - started, 4),
+                       download=round(time.perf_counter() - generated, 4),
+                       bytes=os.path.getsize(outfile))
+
+    def _render_bytes(self, params: Dict, timeout: float) -> bytes:
+        """Generate on the server and return the encoded image."""
+        started = time.perf_counter()
+        url = self._image_url(params, timeout)
+        generated = time.perf_counter()
+        data = self._download_bytes(url, timeout)
+        metrics.record("image", model=params.get("model"), cache_hit=False, host=self.base_url,
+                       server=round(generated - started, 4),
+                       download=round(time.perf_counter() - generated, 4), bytes=len(data))
+        return data
+
+    def generate_image(self, outfile: Optional[str] = None, cache: Optional[ImageCache] = None,
+                       timeout: float = 300, output: str = "path", **params):
+        """
+        Generate an image. See genimg.generate_image for params.
+
+        Returns:
+            output="path":  the absolute path to the image saved at outfile.
+            output="bytes": the raw encoded image bytes (nothing is written).
+            output="image": the decoded PIL image (nothing is written).
+        """
+        if output not in OUTPUTS:
+            raise ValueError(f"output must be one of {OUTPUTS}, got {output!r}")
+
+        if output == "path":
+            if outfile is None:
+                raise ValueError("outfile is required when output='path'")
+            if cache is not None and cache.get(params, outfile):
+                metrics.record("image", model=params.get("model"), cache_hit=True,
+                               bytes=os.path.getsize(outfile))
+                return os.path.abspath(outfile)
+            self._render_file(params, outfile, timeout)
+            if cache is not None:
+                cache.put(params, outfile)
+            return os.path.abspath(outfile)
+
+        data = cache.get_bytes(params) if cache is not None else None
+        if data is not None:
+            metrics.record("image", model=params.get("model"), cache_hit=True, bytes=len(data))
+        else:
+            data = self._render_bytes(params, timeout)
+            if cache is not None:
+                cache.put_bytes(params, data)
+        if output == "bytes":
+            return data
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img
+
+
+class PooledImageClient(ImageClient):
+    """
+    ImageClient that sends each generation to a host picked by a
+    backends.BackendPool. Cache lookups never take a host slot; each host
+    keeps its own ImageClient (and server session).
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _render_file(self, params: Dict, outfile: str, timeout: float) -> None:
+        with self.pool.use(params.get("model"), timeout) as backend:
+            get_client(backend.url)._render_file(params, outfile, timeout)
+
+    def _render_bytes(self, params: Dict, timeout: float) -> bytes:
+        with self.pool.use(params.get("model"), timeout) as backend:
+            return get_client(backend.url)._render_bytes(params, timeout)
+
+
+_clients: Dict[str, ImageClient] = {}
+_clients_lock = threading.Lock()
+_pooled_client: Optional[PooledImageClient] = None
+
+
+def set_backend_pool(pool) -> None:
+    """Spread generate_image() calls without an explicit base_url across a backends.BackendPool."""
+    global _pooled_client
+    _pooled_client = PooledImageClient(pool) if pool is not None else None
+
+
+def get_client(base_url: Optional[str] = None) -> ImageClient:
+    """
+    Return the shared ImageClient for base_url, creating it on first use.
+    Without base_url: the pooled client if a backend pool is set, else BASE_URL's client.
+    """
+    if base_url is None and _pooled_client is not None:
+        return _pooled_client
+    base_url = base_url or BASE_URL
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = _clients[base_url] = ImageClient(base_url)
+        return client
+
 
 def generate_image(
-    outfile: str,
-    base_url: str = "http://localhost:7801",
+    outfile: Optional[str] = None,
+    base_url: Optional[str] = None,
+    cache: Optional[ImageCache] = None,
+    timeout: float = 300,
+    output: str = "path",
     **params
-) -> str:
+):
     """
     Generate an image from a local text-to-image server and save it.
 
+    Uses the shared ImageClient for base_url, so the server session and
+    HTTP connections are reused across calls and threads. Without base_url
+    the request goes to the backend pool's least-loaded host when one is
+    configured (see backends.py).
+
     Args:
-        outfile: Path to save the image.
-        base_url: Base URL of the API server.
+        outfile: Path to save the image (only used with output="path").
+        base_url: Base URL of the API server (default: backend pool or BASE_URL).
+        cache: Optional imgcache.ImageCache checked before calling the server;
+               hits are hard-linked (or copied) to outfile.
+        timeout: Requests timeout (seconds) for generation and download.
+        output: "path" (default) saves to outfile, "bytes" returns the raw
+                image bytes and "image" returns the decoded PIL image.
         **params: Any parameters supported by the API.
                   Example:
                   prompt="a cool cat",
@@ -28,40 +257,7 @@ def generate_image(
                   negativeprompt=""
 
     Returns:
-        The absolute path to the saved image file.
+        The absolute path to the saved image file, the image bytes or the
+        decoded image, depending on `output`.
     """
-
-    # Step 1: Get a new session ID
-    session_url = urljoin(base_url, "/API/GetNewSession")
-    sid_resp = requests.post(session_url, json={}, timeout=60)
-    sid_resp.raise_for_status()
-    session_id = sid_resp.json().get("session_id")
-    if not session_id:
-        raise RuntimeError(f"No session_id in response: {sid_resp.text}")
-
-    # Step 2: Generate the image
-    payload = {"session_id": session_id}
-    payload.update(params)  # add all user-specified API params
-
-    gen_url = urljoin(base_url, "/API/GenerateText2Image")
-    gen_resp = requests.post(gen_url, json=payload, timeout=300)
-    gen_resp.raise_for_status()
-    data = gen_resp.json()
-
-    image_paths = data.get("images")
-    if not image_paths:
-        raise RuntimeError(f"No images returned: {data}")
-
-    first_image_path = image_paths[0]
-    if not first_image_path.startswith("http"):
-        first_image_path = urljoin(base_url + "/", first_image_path.lstrip("/"))
-
-    # Step 3: Download the image
-    img_resp = requests.get(first_image_path, timeout=300)
-    img_resp.raise_for_status()
-
-    os.makedirs(os.path.dirname(os.path.abspath(outfile)) or ".", exist_ok=True)
-    with open(outfile, "wb") as f:
-        f.write(img_resp.content)
-
-    return os.path.abspath(outfile)
+    return get_client(base_url).generate_image(outfile, cache=cache, timeout=timeout, output=output, **params)
@@ -0,0 +1,226 @@
+"""
+Commit and push finished games without `git add -A` over the whole tree.
+
+    python gitpublish.py [--force] [--dry-run] [--add games/<name> ...]
+
+gamegen.py queues every game it finishes in .publish-queue.jsonl. Once
+config["git_publish"]["batch_games"] games are queued, or the oldest has
+waited batch_seconds, the queued game folders and the portal files
+(index.html, the game list shards, the files updateindex.build_index()
+reported writing, such as thumbnail variants outside the new games' folders,
+and, with "site": true, the site/ files publish.py wrote or removed) are
+staged by explicit pathspec, committed together, and pushed by a `git push`
+that runs in the background.
+"""
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+import checkpoint
+import metrics
+import updateindex
+
+QUEUE_FILE = ".publish-queue.jsonl"
+
+DEFAULT_BATCH_GAMES = 4
+DEFAULT_BATCH_SECONDS = 1800
+
+# Portal files rebuilt after every game, next to the game folders themselves
+PORTAL_PATHS = ("index.html", updateindex.SHARD_DIR)
+
+
+def dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+class GitPublisher:
+    """
+    Batches finished games into commits. Only the queued paths are handed
+    to git, so staging costs the same whether games/ holds ten games or
+    ten thousand. The queue lives on disk, so batches span the one-game
+    processes runloop.ps1 starts.
+    """
+
+    def __init__(self, repo: str = ".", queue_path: str = QUEUE_FILE, batch_games: int = DEFAULT_BATCH_GAMES,
+                 batch_seconds: float = DEFAULT_BATCH_SECONDS, push: bool = True, site: bool = False):
+        self.repo = repo
+        self.queue_path = os.path.join(repo, queue_path)
+        self.batch_games = batch_games
+        self.batch_seconds = batch_seconds
+        self.push = push
+        self.site = site
+        self._push_proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict, repo: str = ".") -> Optional["GitPublisher"]:
+        """The publisher described by config["git_publish"], or None when it is off."""
+        settings = config.get("git_publish")
+        if not settings:
+            return None
+        return cls(repo, settings.get("queue", QUEUE_FILE),
+                   settings.get("batch_games", DEFAULT_BATCH_GAMES),
+                   settings.get("batch_seconds", DEFAULT_BATCH_SECONDS),
+                   settings.get("push", True), settings.get("site", False))
+
+    def _git(self, *args: str, input: bytes = None, check: bool = True) -> subprocess.CompletedProcess:
+        return subprocess.run(["git", *args], cwd=self.repo, input=input, capture_output=True, check=check)
+
+    def add(self, game_dir: str) -> None:
+        """Queue a finished game. Games whose manifest is still in progress are refused."""
+        if checkpoint.is_in_progress(game_dir):
+            raise ValueError(f"{game_dir} is not finished")
+        line = json.dumps({"dir": os.path.relpath(game_dir, self.repo).replace(os.sep, "/"),
+                           "queued_at": time.time()}, ensure_ascii=False)
+        with self._lock, open(self.queue_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def add_paths(self, paths: List[str]) -> None:
+        """Queue other files for the next commit, e.g. the ones updateindex.build_index() wrote."""
+        now = time.time()
+        lines = "".join(json.dumps({"path": os.path.relpath(p, self.repo).replace(os.sep, "/"), "queued_at": now},
+                                   ensure_ascii=False) + "\n" for p in paths)
+        if lines:
+            with self._lock, open(self.queue_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def _entries(self) -> List[Dict]:
+        if not os.path.exists(self.queue_path):
+            return []
+        entries = {}
+        with open(self.queue_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a killed run
+                entries.setdefault(("dir", e["dir"]) if "dir" in e else ("path", e["path"]), e)
+        return sorted(entries.values(), key=lambda e: e["queued_at"])
+
+    def pending(self) -> List[Dict]:
+        """Queued games, oldest first, each once."""
+        return [e for e in self._entries() if "dir" in e]
+
+    def queued_paths(self) -> List[str]:
+        """Queued files that are not game folders."""
+        return [e["path"] for e in self._entries() if "path" in e]
+
+    def due(self, pending: List[Dict]) -> bool:
+        return bool(pending) and (len(pending) >= self.batch_games
+                                  or time.time() - pending[0]["queued_at"] >= self.batch_seconds)
+
+    def _dequeue(self, dirs: set, paths: set) -> None:
+        with self._lock:
+            rest = [e for e in self._entries() if e.get("dir") not in dirs and e.get("path") not in paths]
+            checkpoint.write_atomic(self.queue_path, "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in rest))
+
+    def paths(self, pending: List[Dict]) -> List[str]:
+        """
+        Everything a commit of these games touches, as pathspecs relative to
+        the repo. Paths that no longer exist stay in if git tracks them, so
+        their deletion is committed; untracked ones are dropped, since git
+        refuses a pathspec that matches nothing.
+        """
+        paths = [e["dir"] for e in pending] + list(PORTAL_PATHS) + self.queued_paths()
+        if self.site:
+            import publish  # needs Pillow; only loaded when the site is published
+
+            result = publish.build_site(self.repo, os.path.join(self.repo, publish.SITE_DIR))
+            paths += [f"{publish.SITE_DIR}/{p}" for p in result["written"] + result["removed"]]
+        paths = list(dict.fromkeys(paths))
+        missing = [p for p in paths if not os.path.lexists(os.path.join(self.repo, p))]
+        if missing:
+            tracked = self._git("--literal-pathspecs", "ls-files", "-z", "--", *missing).stdout.decode("utf-8").split("\0")
+            gone = {p for p in missing if not any(f == p or f.startswith(p + "/") for f in tracked)}
+            paths = [p for p in paths if p not in gone]
+        return paths
+
+    def report(self, pending: List[Dict]) -> int:
+        """Dry run: print the bytes each queued game would add. Returns the total."""
+        total = 0
+        for e in pending:
+            size = dir_bytes(os.path.join(self.repo, e["dir"]))
+            total += size
+            print(f"  {size / 1e6:8.2f} MB  {e['dir']}")
+        portal = sum(dir_bytes(p) if os.path.isdir(p) else os.path.getsize(p)
+                     for p in (os.path.join(self.repo, p) for p in PORTAL_PATHS) if os.path.exists(p))
+        print(f"  {portal / 1e6:8.2f} MB  portal ({', '.join(PORTAL_PATHS)}) and {len(self.queued_paths())} queued files")
+        print(f"{len(pending)} games, {(total + portal) / 1e6:.2f} MB; "
+              f"{'due' if self.due(pending) else 'not due'} (batch of {self.batch_games} or {self.batch_seconds:.0f}s)")
+        return total + portal
+
+    def publish(self, force: bool = False, dry_run: bool = False) -> Optional[str]:
+        """
+        Commit the queued games if a batch is due (or force) and start the
+        push. Returns the commit hash, or None when nothing was committed.
+        """
+        pending = self.pending()
+        if dry_run:
+            self.report(pending)
+            return None
+        if not pending or not (force or self.due(pending)):
+            return None
+        start = time.perf_counter()
+        queued = set(self.queued_paths())  # files queued while this commit runs wait for the next one
+        paths = self.paths(pending)
+        # -A limited to the pathspecs also stages deletions (stale shards, removed site files);
+        # literal, since game names may contain glob characters
+        self._git("--literal-pathspecs", "add", "-A", "--pathspec-from-file=-", "--pathspec-file-nul",
+                  input="\0".join(paths).encode("utf-8"))
+        names = [os.path.basename(e["dir"]) for e in pending]
+        commit = None
+        if self._git("diff", "--cached", "--quiet", check=False).returncode != 0:
+            self._git("commit", "-q", "-m", f"Add {len(names)} games: {', '.join(names)}")
+            commit = self._git("rev-parse", "HEAD").stdout.decode().strip()
+        self._dequeue({e["dir"] for e in pending}, queued)
+        metrics.record("publish", games=len(names), paths=len(paths), commit=commit,
+                       bytes=sum(dir_bytes(os.path.join(self.repo, e["dir"])) for e in pending),
+                       wall=round(time.perf_counter() - start, 3))
+        print(f"Committed {len(names)} games in {time.perf_counter() - start:.1f}s" if commit
+              else "Nothing new to commit")
+        if commit and self.push:
+            self.start_push()
+        return commit
+
+    def start_push(self) -> None:
+        """
+        Run `git push` without waiting for it. While an earlier push is still
+        running no second one is started; its commits go out with the next.
+        """
+        if self._push_proc is not None and self._push_proc.poll() is None:
+            return
+        self._push_proc = subprocess.Popen(["git", "push", "-q"], cwd=self.repo)
+
+    def wait(self) -> Optional[int]:
+        """Wait for a running push. Returns its exit code (None if there was none)."""
+        return self._push_proc.wait() if self._push_proc is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update-index", action="store_true", help="rebuild the index first and queue what it wrote")
+    parser.add_argument("--force", action="store_true", help="commit the queue even if the batch is not full")
+    parser.add_argument("--dry-run", action="store_true", help="report the queued games and their size")
+    parser.add_argument("--add", nargs="*", default=[], metavar="GAME_DIR",
+                        help="queue game folders by hand (e.g. games generated before the queue existed)")
+    parser.add_argument("--no-push", action="store_true", help="commit only")
+    args = parser.parse_args()
+    with open("config.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+    metrics.configure(config.get("metrics_log"))
+    publisher = GitPublisher.from_config(config) or GitPublisher()
+    if args.no_push:
+        publisher.push = False
+    for game_dir in args.add:
+        publisher.add(game_dir)
+    if args.update_index:
+        publisher.add_paths(updateindex.build_index())
+    publisher.publish(force=args.force, dry_run=args.dry_run)
+    # the push keeps running after this process exits, so the next game can start
@@ -0,0 +1,196 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import checkpoint
+import metrics
+import ollamagen
+
+BACKLOG_DIR = "idea_backlog"
+
+IDEA_MODEL = "qwen3:8b"
+
+BATCH_INSTRUCTIONS = """
+
+Write {count} separate ideas, one for each of these theme/genre pairs, in this order:
+{pairs}
+Each idea must be a different game. Start each idea with **Game Title:** followed by the title.
+Answer in JSON: {{"ideas": [{{"theme": ..., "genre": ..., "idea": ...}}, ...]}}"""
+
+
+def batch_schema(count: int) -> dict:
+    """JSON schema for exactly count ideas, passed as Ollama's "format"."""
+    return {
+        "type": "object",
+        "properties": {
+            "ideas": {
+                "type": "array",
+                "minItems": count,
+                "maxItems": count,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "theme": {"type": "string"},
+                        "genre": {"type": "string"},
+                        "idea": {"type": "string"},
+                    },
+                    "required": ["theme", "genre", "idea"],
+                },
+            },
+        },
+        "required": ["ideas"],
+    }
+
+
+def batch_prompt(config: dict, pairs: Sequence[Tuple[str, str]]) -> str:
+    prompt = config["prompt"].format(themes="the theme given for each idea below",
+                                     genres="the genre given for each idea below")
+    lines = "\n".join(f"{n}. theme: {theme}, genre: {genre}" for n, (theme, genre) in enumerate(pairs, 1))
+    return prompt + BATCH_INSTRUCTIONS.format(count=len(pairs), pairs=lines)
+
+
+def parse_batch(text: str, pairs: Sequence[Tuple[str, str]]) -> List[Dict]:
+    """
+    Validate a batch answer against the requested pairs. Entries without an
+    idea are dropped; an entry that renamed its theme or genre gets the
+    requested pair of its position back. Returns [{"theme", "genre", "idea"}].
+    """
+    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return []
+    ideas = data.get("ideas") if isinstance(data, dict) else data
+    entries = []
+    for n, item in enumerate(ideas if isinstance(ideas, list) else []):
+        if n >= len(pairs) or not isinstance(item, dict):
+            break
+        idea = item.get("idea")
+        if not isinstance(idea, str) or len(idea.strip()) < 40:
+            continue
+        theme, genre = pairs[n]
+        entries.append({"theme": theme, "genre": genre, "idea": idea.strip()})
+    return entries
+
+
+def generate_batch(config: dict, pairs: Sequence[Tuple[str, str]], timeout: float = 600) -> List[Dict]:
+    """One LLM call that writes an idea for each (theme, genre) pair."""
+    res = ollamagen.ollama_generate(
+        IDEA_MODEL,
+        batch_prompt(config, pairs),
+        timeout=timeout,
+        format=batch_schema(len(pairs)),
+        think=False,
+        keep_alive=config.get("ollama_keep_alive", ollamagen.KEEP_ALIVE),
+        options={
+            "temperature": 0.8,
+            "num_ctx": ollamagen.IDEA_NUM_CTX,  # same as gamegen's idea/spec calls, so the model stays loaded
+        },
+    )
+    entries = parse_batch(res["response"], pairs)
+    print(f"Idea batch: {len(entries)}/{len(pairs)} ideas usable")
+    return entries
+
+
+class IdeaBacklog:
+    """
+    Persistent queue of game ideas waiting for a worker, one JSON file per
+    idea in idea_backlog/. take() claims a file by deleting it, so several
+    processes and threads can pull from the same backlog without a lock.
+    """
+
+    def __init__(self, path: str = BACKLOG_DIR):
+        self.path = path
+        self._counter = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["IdeaBacklog"]:
+        """The backlog used when config["idea_batch"] is set, else None (one idea per call)."""
+        settings = config.get("idea_batch")
+        if not settings:
+            return None
+        return cls(settings.get("path", BACKLOG_DIR))
+
+    def _files(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.path) if n.endswith(".json"))
+
+    def __len__(self) -> int:
+        return len(self._files())
+
+    def put(self, entry: Dict) -> None:
+        with self._lock:
+            self._counter += 1
+            name = f"{time.time():.6f}-{os.getpid()}-{self._counter}.json"
+        checkpoint.write_atomic(os.path.join(self.path, name), json.dumps(entry, ensure_ascii=False))
+
+    def take(self) -> Optional[Dict]:
+        """Oldest idea in the backlog, or None when it is empty."""
+        for name in self._files():
+            path = os.path.join(self.path, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                os.remove(path)
+            except FileNotFoundError:
+                continue  # another worker got it first
+            except json.JSONDecodeError:
+                os.remove(path)
+                continue
+            return entry
+        return None
+
+
+def distinct_pairs(pick_pair: Callable[[], Tuple[str, str]], count: int, tries: int = 20) -> List[Tuple[str, str]]:
+    """
+    Up to count different pairs from pick_pair, drawn without replacement. Gives up
+    after tries draws per pair, so a small theme x genre space yields fewer pairs.
+    """
+    pairs: List[Tuple[str, str]] = []
+    for _ in range(count * tries):
+        if len(pairs) == count:
+            break
+        pair = pick_pair()
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+def fill(config: dict, backlog: IdeaBacklog, pick_pair: Callable[[], Tuple[str, str]],
+         find_similar: Callable[[str], Optional[tuple]] = None) -> int:
+    """
+    Request config["idea_batch"]["parallel"] batches of config["idea_batch"]["size"]
+    ideas at once (one per Ollama num_parallel slot) and queue the ideas that
+    pass find_similar. No theme/genre pair is requested twice in one fill.
+    Returns the number of ideas added.
+    """
+    settings = config.get("idea_batch") or {}
+    size, parallel = settings.get("size", 8), settings.get("parallel", 2)
+    timeout = settings.get("timeout", 600)
+    pairs = distinct_pairs(pick_pair, size * parallel)
+    batches = [b for b in (pairs[n * size:(n + 1) * size] for n in range(parallel)) if b]
+    added = 0
+    if not batches:
+        return 0
+    with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+        futures = [pool.submit(generate_batch, config, pairs, timeout) for pairs in batches]
+        for future in futures:
+            try:
+                entries = future.result()
+            except Exception as e:
+                print(f"Idea batch failed: {e}")
+                continue
+            for entry in entries:
+                match = find_similar(entry["idea"]) if find_similar else None
+                if match is not None:
+                    metrics.record("duplicate", theme=entry["theme"], genre=entry["genre"], match=match[0],
+                                   similarity=round(match[1], 3), kind=match[2], batch=True)
+                    continue
+                backlog.put(entry)
+                added += 1
+    return added
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+# seed value the image server treats as "pick a random seed"
+RANDOM_SEED = -1
+
+# Request parameters that do not change the generated pixels
+IGNORED_PARAMS = {"session_id", "images"}
+
+# Lookups only touch last-use times and counters; index.json is rewritten after this many
+SAVE_EVERY_LOOKUPS = 50
+
+
+def _canonical(value):
+    """Normalize values so equivalent requests hash the same (e.g. 2 vs 2.0)."""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return repr(float(value))
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return str(value)
+
+
+def cache_key(params: Dict) -> str:
+    """
+    Return a content hash of every generation parameter (prompt, negative
+    prompt, model, steps, cfgscale, size, sampler, seed, ...).
+    Random-seed requests all share the seed-less "random" variant key.
+    """
+    canon = {k: _canonical(v) for k, v in params.items() if k not in IGNORED_PARAMS}
+    if params.get("seed", RANDOM_SEED) in (RANDOM_SEED, None):
+        canon["seed"] = "random"
+    blob = json.dumps(canon, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hard-link src to dst, falling back to a copy across filesystems."""
+    os.makedirs(os.path.dirname(os.path.abspath(dst)) or ".", exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ImageCache:
+    """
+    On-disk, content-addressed cache of generated images with LRU eviction.
+
+    Layout:
+        <root>/index.json          entry sizes, last use times and hit/miss stats
+        <root>/<k[:2]>/<k>.png     cached images, named by cache_key()
+
+    Requests with an explicit seed are deterministic and always cacheable.
+    Requests with seed=-1 are only served from the cache when
+    reuse_random_seed is True (the caller accepts a reused variation).
+    That is off by default: it saves most sprite renders, but every game
+    asking for the same prompt then gets the very same image.
+
+    index.json is rewritten on every put and eviction, but only every
+    SAVE_EVERY_LOOKUPS lookups and on flush()/close() otherwise: losing a
+    few last-use times or counters to a killed run is harmless.
+    """
+
+    def __init__(self, root: str = ".imgcache", max_bytes: int = 2 * 1024**3,
+                 reuse_random_seed: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.reuse_random_seed = reuse_random_seed
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(root, "index.json")
+        self._entries: Dict[str, Dict] = {}
+        self._stats = {"hits": 0, "misses": 0}
+        self._unsaved_lookups = 0
+        self._load()
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["ImageCache"]:
+        """Build the cache from config["imgcache"], or None when it is disabled."""
+        conf = config.get("imgcache")
+        if not conf or not conf.get("enabled", True):
+            return None
+        return cls(root=conf.get("dir", ".imgcache"),
+                   max_bytes=int(conf.get("max_mb", 2048)) * 1024**2,
+                   reuse_random_seed=conf.get("reuse_random_seed", False))
+
+    def _load(self) -> None:
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self._entries = data.get("entries", {})
+        self._stats.update(data.get("stats", {}))
+
+    def _save(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries, "stats": self._stats}, f)
+        os.replace(tmp, self._index_path)
+        self._unsaved_lookups = 0
+
+    def _lookup_done(self) -> None:
+        """Count a lookup and save once enough have piled up. Call with the lock held."""
+        self._unsaved_lookups += 1
+        if self._unsaved_lookups >= SAVE_EVERY_LOOKUPS:
+            self._save()
+
+    def flush(self) -> None:
+        """Write last-use times and counters of lookups since the last save."""
+        with self._lock:
+            if self._unsaved_lookups:
+                self._save()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ImageCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".png")
+
+    def _cacheable(self, params: Dict) -> bool:
+        random_seed = params.get("seed", RANDOM_SEED) in (RANDOM_SEED, None)
+        return self.reuse_random_seed or not random_seed
+
+    def _hit(self, params: Dict) -> Optional[str]:
+        """Look params up and count the hit or miss. Call with the lock held."""
+        key = cache_key(params)
+        entry = self._entries.get(key)
+        path = self._path(key)
+        if entry is None or not os.path.exists(path):
+            self._entries.pop(key, None)
+            self._stats["misses"] += 1
+            self._lookup_done()
+            return None
+        entry["last_used"] = time.time()
+        self._stats["hits"] += 1
+        self._lookup_done()
+        return path
+
+    def get(self, params: Dict, outfile: str) -> bool:
+        """
+        Place the cached image for params at outfile.
+        Returns True on a hit, False on a miss (outfile is left untouched).
+        """
+        if not self._cacheable(params):
+            return False
+        with self._lock:
+            path = self._hit(params)
+            if path is None:
+                return False
+            link_or_copy(path, outfile)
+            return True
+
+    def get_bytes(self, params: Dict) -> Optional[bytes]:
+        """Return the cached image bytes for params, or None on a miss."""
+        if not self._cacheable(params):
+            return None
+        with self._lock:
+            path = self._hit(params)
+            if path is None:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+
+    def put(self, params: Dict, srcfile: str) -> None:
+        """Store a freshly generated image file and evict old entries over max_bytes."""
+        with open(srcfile, "rb") as f:
+            self.put_bytes(params, f.read())
+
+    def put_bytes(self, params: Dict, data: bytes) -> None:
+        """Store freshly generated image bytes and evict old entries over max_bytes."""
+        key = cache_key(params)
+        path = self._path(key)
+        with self._lock:
+            tmp = path + ".tmp"
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._entries[key] = {"size": len(data), "last_used": time.time()}
+            self._evict()
+            self._save()
+
+    def _evict(self) -> None:
+        total = sum(e["size"] for e in self._entries.values())
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._entries.pop(key)["size"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters, hit rate and current size."""
+        with self._lock:
+            hits, misses = self._stats["hits"], self._stats["misses"]
+            lookups = hits + misses
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": sum(e["size"] for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+if __name__ == "__main__":
+    with open("config.json", "r") as f:
+        config = json.load(f)
+    cache = ImageCache.from_config(config) or ImageCache()
+    s = cache.stats()
+    print(f"Entries:  {s['entries']} ({s['bytes'] / 1024**2:.1f} / {s['max_bytes'] / 1024**2:.0f} MB)")
+    print(f"Hits:     {s['hits']}")
+    print(f"Misses:   {s['misses']}")
+    print(f"Hit rate: {s['hit_rate']:.1%}")
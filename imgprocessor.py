@@ -1,7 +1,10 @@
+import os
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
 import numpy as np
 from PIL import Image, ImageFilter
+import metrics
 
 IMG_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
 
@@ -16,6 +19,69 @@ def rgb_to_hsv_sv(rgb_arr: np.ndarray):
     s = delta / (cmax + 1e-6)
     return s, v
 
+@lru_cache(maxsize=8)
+def _white_lut(rgb_min: int, v_min: float, s_max: float) -> np.ndarray:
+    """
+    Lookup table of the white/near-white rule indexed by (cmax << 8) | cmin.
+
+    The rule only depends on the largest and smallest channel of a pixel, so
+    evaluating the float formula once for all 65536 (cmax, cmin) pairs gives
+    bit-identical results to rgb_to_hsv_sv with integer-only work per pixel.
+    """
+    cmax, cmin = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing="ij")
+    s, v = rgb_to_hsv_sv(np.stack([cmax, cmin, cmin], axis=-1))
+    rule_rgb = cmin >= rgb_min  # every channel >= rgb_min
+    rule_hsv = (v >= v_min) & (s <= s_max)
+    return (rule_rgb | rule_hsv).ravel()
+
+@lru_cache(maxsize=1)
+def _alpha_tables():
+    """
+    Integer equivalents of the float alpha handling: the transparent and
+    opaque thresholds, and the uint8 -> float -> uint8 round trip (None when
+    it is the identity, which it is on common numpy builds).
+    """
+    a = np.arange(256, dtype=np.uint8)
+    alpha = a.astype(np.float32) / 255.0
+    transparent_below = int(np.argmin(alpha < 0.01))
+    opaque_from = int(np.argmax(alpha >= 0.99))
+    kept = (np.where(np.zeros(256, dtype=bool), 0.0, alpha) * 255.0).clip(0, 255).astype(np.uint8)
+    kept = None if np.array_equal(kept, a) else kept
+    return transparent_below, opaque_from, kept
+
+def _whiteish(rgba: np.ndarray, rgb_min: int, v_min: float, s_max: float) -> np.ndarray:
+    """White/near-white mask for a uint8 [..., 4] array (any leading shape)."""
+    r, g, b = rgba[..., 0], rgba[..., 1], rgba[..., 2]
+    cmax = np.maximum(r, g)
+    np.maximum(cmax, b, out=cmax)
+    cmin = np.minimum(r, g)
+    np.minimum(cmin, b, out=cmin)
+    idx = cmax.astype(np.uint16)
+    idx <<= 8
+    idx |= cmin
+    return _white_lut(rgb_min, float(v_min), float(s_max))[idx]
+
+def _apply_alpha(rgba: np.ndarray, whiteish: np.ndarray, feather: int) -> None:
+    """Write the new alpha channel of one uint8 [H, W, 4] array in place."""
+    transparent_below, opaque_from, kept = _alpha_tables()
+    alpha = rgba[..., 3]
+    whiteish &= alpha >= transparent_below  # keep already transparent pixels as they are
+
+    if alpha.min() >= opaque_from:
+        new_alpha = np.logical_not(whiteish).view(np.uint8)
+        new_alpha *= 255
+    else:
+        new_alpha = alpha.copy() if kept is None else kept[alpha]
+        new_alpha[whiteish] = 0
+
+    if feather > 0:
+        mask = Image.fromarray(new_alpha).filter(ImageFilter.GaussianBlur(radius=feather))
+        new_alpha = np.asarray(mask)
+        if kept is not None:
+            new_alpha = kept[new_alpha]
+
+    alpha[...] = new_alpha
+
 def remove_white_bg(img: Image.Image,
                     rgb_min: int = 240,
                     v_min: float = 0.95,
@@ -26,40 +92,45 @@ def remove_white_bg(img: Image.Image,
         img = img.convert("RGBA")
 
     arr = np.array(img)
-    rgb = arr[..., :3]
-    alpha = arr[..., 3].astype(np.float32) / 255.0
-
-    keep_transparent = alpha < 0.01
-    rule_rgb = (rgb[..., 0] >= rgb_min) & (rgb[..., 1] >= rgb_min) & (rgb[..., 2] >= rgb_min)
-    s, v = rgb_to_hsv_sv(rgb)
-    rule_hsv = (v >= v_min) & (s <= s_max)
-    whiteish = (rule_rgb | rule_hsv) & (~keep_transparent)
-
-    if np.all(alpha >= 0.99):
-        new_alpha = np.where(whiteish, 0.0, 1.0)
-    else:
-        new_alpha = np.where(whiteish, 0.0, alpha)
+    _apply_alpha(arr, _whiteish(arr, rgb_min, v_min, s_max), feather)
+    return Image.fromarray(arr)
 
-    if feather > 0:
-        mask = Image.fromarray((new_alpha * 255).astype(np.uint8), mode="L")
-        mask = mask.filter(ImageFilter.GaussianBlur(radius=feather))
-        new_alpha = np.array(mask).astype(np.float32) / 255.0
+def remove_white_bg_batch(imgs: Sequence[Image.Image],
+                          rgb_min: int = 240,
+                          v_min: float = 0.95,
+                          s_max: float = 0.20,
+                          feather: int = 1) -> List[Image.Image]:
+    """
+    remove_white_bg for many images at once.
+    Same-size images are stacked into one [N, H, W, 4] array so the colour
+    rule runs as a single vectorized pass. Results keep the input order.
+    """
+    out: List[Image.Image] = [None] * len(imgs)
+    groups: Dict[tuple, List[int]] = {}
+    for i, img in enumerate(imgs):
+        groups.setdefault(img.size, []).append(i)
 
-    out = arr.copy()
-    out[..., 3] = (new_alpha * 255.0).clip(0, 255).astype(np.uint8)
-    return Image.fromarray(out, mode="RGBA")
+    for indices in groups.values():
+        stack = np.stack([np.asarray(imgs[i] if imgs[i].mode == "RGBA" else imgs[i].convert("RGBA"))
+                          for i in indices])
+        whiteish = _whiteish(stack, rgb_min, v_min, s_max)
+        for n, i in enumerate(indices):
+            _apply_alpha(stack[n], whiteish[n], feather)
+            out[i] = Image.fromarray(stack[n])
+    return out
 
 def trim_to_content(img: Image.Image, pad: int = 1) -> Image.Image:
     """Trim transparent borders to fit content."""
     if img.mode != "RGBA":
         img = img.convert("RGBA")
-    alpha = np.array(img.split()[-1])
-    nz = np.where(alpha > 5)
-    if nz[0].size == 0:
+    alpha = np.asarray(img.getchannel("A"))
+    rows = alpha.max(axis=1) > 5
+    if not rows.any():
         return img
+    cols = alpha.max(axis=0) > 5
 
-    top, bottom = int(nz[0].min()), int(nz[0].max())
-    left, right = int(nz[1].min()), int(nz[1].max())
+    top, bottom = int(rows.argmax()), len(rows) - 1 - int(rows[::-1].argmax())
+    left, right = int(cols.argmax()), len(cols) - 1 - int(cols[::-1].argmax())
     left = max(left - pad, 0)
     top = max(top - pad, 0)
     right = min(right + pad, img.width - 1)
@@ -67,6 +138,124 @@ def trim_to_content(img: Image.Image, pad: int = 1) -> Image.Image:
 
     return img.crop((left, top, right + 1, bottom + 1))
 
+def process_in_memory(img: Image.Image,
+                      out_dir: Path,
+                      name: str,
+                      rgb_min: int = 240,
+                      v_min: float = 0.95,
+                      s_max: float = 0.20,
+                      feather: int = 1,
+                      pad: int = 1) -> Path:
+    """
+    Remove white background & crop an in-memory image.
+    Only the final file is written, as out_dir/WxH_<name>.
+    Returns the output file path.
+    """
+    with metrics.timed("imgprocess", file=name) as m:
+        no_bg = remove_white_bg(img, rgb_min=rgb_min, v_min=v_min, s_max=s_max, feather=feather)
+        out_path = save_sprite(trim_to_content(no_bg, pad=pad), out_dir, name)
+        m["bytes"] = out_path.stat().st_size
+    return out_path
+
+def save_sprite(img: Image.Image, out_dir: Path, name: str) -> Path:
+    """Write a processed sprite as out_dir/WxH_<name>. Returns its path."""
+    w, h = img.size
+    out_path = Path(out_dir) / f"{w}x{h}_{name}"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so a killed run never leaves a truncated sprite behind
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    img.save(tmp_path, "PNG")
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def find_components(mask: np.ndarray) -> List[Tuple[int, int, int, int, int]]:
+    """
+    8-connected components of a boolean [H, W] mask, as
+    (left, top, right, bottom, area) with right/bottom exclusive.
+
+    Works on horizontal runs: each run is joined (union-find) to the runs of
+    the previous row it touches, so the Python work is per run, not per pixel.
+    """
+    parent: List[int] = []
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    runs = []  # (row, start, end) with end exclusive
+    prev: List[int] = []
+    for y in range(mask.shape[0]):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask[y].view(np.int8), [0]))))
+        current = []
+        for start, end in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+            i = len(runs)
+            runs.append((y, start, end))
+            parent.append(i)
+            for j in prev:
+                _, pstart, pend = runs[j]
+                if pstart <= end and pend >= start:  # overlapping or diagonal neighbours
+                    a, b = find(i), find(j)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+            current.append(i)
+        prev = current
+
+    boxes: Dict[int, List[int]] = {}
+    for i, (y, start, end) in enumerate(runs):
+        box = boxes.setdefault(find(i), [start, y, end, y + 1, 0])
+        box[0], box[1] = min(box[0], start), min(box[1], y)
+        box[2], box[3] = max(box[2], end), max(box[3], y + 1)
+        box[4] += end - start
+    return [tuple(b) for b in boxes.values()]
+
+def split_sheet(img: Image.Image,
+                out_dir: Path,
+                names: Sequence[str],
+                rows: int,
+                cols: int,
+                gap: int = 6,
+                min_area: int = 64,
+                rgb_min: int = 240,
+                v_min: float = 0.95,
+                s_max: float = 0.20,
+                feather: int = 1,
+                pad: int = 1) -> List[Optional[Path]]:
+    """
+    Cut a sprite sheet (items on white, laid out on a rows x cols grid, in
+    reading order) into single sprites written as out_dir/WxH_<name>.
+
+    The background is removed once for the whole sheet, then the alpha
+    mask is split into connected components. The mask is dilated by gap
+    pixels first so that an item drawn in several pieces stays whole;
+    specks below min_area pixels are dropped. Each component belongs to
+    the grid cell its centre falls in, and all components of a cell make
+    up that cell's sprite. Returns one path per name, None for an empty cell.
+    """
+    with metrics.timed("imgprocess", file=f"sheet of {len(names)}") as m:
+        no_bg = remove_white_bg(img, rgb_min=rgb_min, v_min=v_min, s_max=s_max, feather=feather)
+        mask = Image.fromarray((np.asarray(no_bg.getchannel("A")) > 5).view(np.uint8) * 255)
+        if gap > 0:
+            mask = mask.filter(ImageFilter.MaxFilter(2 * gap + 1))
+        cells: Dict[int, List[int]] = {}
+        for left, top, right, bottom, area in find_components(np.asarray(mask) > 0):
+            if area < min_area:
+                continue
+            col = min(cols - 1, (left + right) // 2 * cols // img.width)
+            row = min(rows - 1, (top + bottom) // 2 * rows // img.height)
+            box = cells.setdefault(row * cols + col, [left, top, right, bottom])
+            box[0], box[1] = min(box[0], left), min(box[1], top)
+            box[2], box[3] = max(box[2], right), max(box[3], bottom)
+
+        paths: List[Optional[Path]] = []
+        for n, name in enumerate(names):
+            box = cells.get(n)
+            paths.append(None if box is None else
+                         save_sprite(trim_to_content(no_bg.crop(tuple(box)), pad=pad), out_dir, name))
+        m["sprites"] = sum(p is not None for p in paths)
+    return paths
+
 def process_images(src_folder: Path,
                    rgb_min: int = 240,
                    v_min: float = 0.95,
@@ -82,13 +271,16 @@ def process_images(src_folder: Path,
     img_paths = [p for p in src_folder.iterdir() if p.suffix.lower() in IMG_EXTS and p.is_file()]
     out_paths = []
 
+    imgs = []
     for path in img_paths:
-        img = Image.open(path)
-        no_bg = remove_white_bg(img, rgb_min=rgb_min, v_min=v_min, s_max=s_max, feather=feather)
+        with Image.open(path) as img:
+            imgs.append(img.convert("RGBA"))
+    no_bgs = remove_white_bg_batch(imgs, rgb_min=rgb_min, v_min=v_min, s_max=s_max, feather=feather)
+
+    for path, no_bg in zip(img_paths, no_bgs):
         trimmed = trim_to_content(no_bg, pad=pad)
         w, h = trimmed.size
-        new_name = f"{w}x{h}_{path.name}"
-        out_path = path.with_name(new_name)
+        out_path = path.with_name(f"{w}x{h}_{path.name}")
         trimmed.save(out_path, "PNG")
         ##delete original file
         path.unlink(missing_ok=True)
@@ -0,0 +1,188 @@
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+# Where events go once configure() is called; None disables recording
+_path: Optional[str] = None
+_lock = threading.Lock()
+
+DEFAULT_PATH = "metrics.jsonl"
+
+# Ollama's final-response counters (durations are in nanoseconds)
+LLM_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+              "eval_count", "eval_duration")
+
+
+def configure(path: Optional[str] = DEFAULT_PATH) -> None:
+    """Start appending events to path (None stops recording)."""
+    global _path
+    _path = path
+
+
+def enabled() -> bool:
+    return _path is not None
+
+
+def record(event: str, **fields) -> None:
+    """
+    Append one JSON line {"ts", "event", "pid", "thread", **fields} to the log.
+    Does nothing until configure() is called.
+    """
+    if _path is None:
+        return
+    line = {"ts": round(time.time(), 3), "event": event, "pid": os.getpid(),
+            "thread": threading.current_thread().name}
+    line.update({k: v for k, v in fields.items() if v is not None})
+    data = json.dumps(line, ensure_ascii=False) + "\n"
+    with _lock:
+        with open(_path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+
+@contextmanager
+def timed(event: str, **fields):
+    """
+    Record an event with its wall time ("wall", seconds) when the block exits.
+    The yielded dict can be filled with extra fields (bytes, sizes, ...);
+    a block that raises is recorded with ok=False and the error.
+    """
+    extra: Dict = {}
+    start = time.perf_counter()
+    try:
+        yield extra
+    except BaseException as e:
+        extra.update(ok=False, error=f"{type(e).__name__}: {e}"[:200])
+        raise
+    finally:
+        extra.setdefault("ok", True)
+        record(event, wall=round(time.perf_counter() - start, 4), **fields, **extra)
+
+
+def llm_fields(res: Dict) -> Dict:
+    """Ollama's timing and token counters from a final response."""
+    return {k: res[k] for k in LLM_FIELDS if k in res}
+
+
+def load(path: str = DEFAULT_PATH) -> List[Dict]:
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # a line cut short by a crash
+    return events
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (p in 0..100) of a non-empty list."""
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, math.ceil(p / 100.0 * len(values)) - 1))
+    return values[k]
+
+
+def _spread(values: List[float]) -> str:
+    if not values:
+        return "-"
+    return (f"p50 {percentile(values, 50):7.2f}s  p90 {percentile(values, 90):7.2f}s  "
+            f"p99 {percentile(values, 99):7.2f}s  max {max(values):7.2f}s")
+
+
+def _rate(tokens: int, ns: int) -> str:
+    return f"{tokens / (ns / 1e9):8.1f} tok/s" if ns else "       - tok/s"
+
+
+def _per_hour(count: int, events: List[Dict]) -> float:
+    span = max(e["ts"] for e in events) - min(e["ts"] for e in events)
+    return count * 3600.0 / span if span > 0 else 0.0
+
+
+def report(events: Iterable[Dict]) -> str:
+    """Aggregate a metrics log into a text report."""
+    events = list(events)
+    if not events:
+        return "No events."
+    by_event = defaultdict(list)
+    for e in events:
+        by_event[e["event"]].append(e)
+    out = []
+
+    stages = defaultdict(list)
+    failures = defaultdict(int)
+    stage_bytes = defaultdict(int)
+    for e in by_event["stage"]:
+        name = re.sub(r"^image .*", "image", e.get("stage", "?"))  # one row for all sprites
+        stages[name].append(e["wall"])
+        failures[name] += not e.get("ok", True)
+        stage_bytes[name] += e.get("bytes", 0)
+    if stages:
+        out.append("Stages (wall time)")
+        for name, walls in sorted(stages.items(), key=lambda kv: -sum(kv[1])):
+            moved = f"  {stage_bytes[name] / 1024**2:.1f} MB" if stage_bytes[name] else ""
+            out.append(f"  {name:<10} n={len(walls):<5} {_spread(walls)}  failed={failures[name]}{moved}")
+
+    models = defaultdict(list)
+    for e in by_event["llm"]:
+        models[e.get("model", "?")].append(e)
+    if models:
+        out.append("LLM calls by model")
+        for model, calls in sorted(models.items()):
+            ev_tokens = sum(c.get("eval_count", 0) for c in calls)
+            ev_ns = sum(c.get("eval_duration", 0) for c in calls)
+            pr_tokens = sum(c.get("prompt_eval_count", 0) for c in calls)
+            pr_ns = sum(c.get("prompt_eval_duration", 0) for c in calls)
+            load_ns = [c["load_duration"] for c in calls if "load_duration" in c]
+            estimated = sum(1 for c in calls if c.get("estimated"))
+            out.append(f"  {model}: {len(calls)} calls, {_spread([c['wall'] for c in calls])}")
+            # Streams closed early (e.g. at </html>) count one token per chunk instead
+            out.append(f"    generation {_rate(ev_tokens, ev_ns)} ({ev_tokens} tokens"
+                       f"{f', {estimated} calls estimated' if estimated else ''}), "
+                       f"prompt {_rate(pr_tokens, pr_ns)} ({pr_tokens} tokens, {pr_tokens / len(calls):.0f}/call), "
+                       f"load p50 {percentile(load_ns, 50) / 1e9 if load_ns else 0:.2f}s, "
+                       f"{sum(c.get('bytes', 0) for c in calls) / 1024:.0f} KB")
+
+    image_models = defaultdict(list)
+    for e in by_event["image"]:
+        image_models[e.get("model", "?")].append(e)
+    if image_models:
+        out.append(f"Images by model ({_per_hour(len(by_event['image']), by_event['image']) / 60:.1f} images/min)")
+    for model, images in sorted(image_models.items()):
+        fresh = [e for e in images if not e.get("cache_hit")]
+        out.append(f"  {model}: {len(images)} images ({len(images) - len(fresh)} cache hits)")
+        out.append(f"    server   {_spread([e['server'] for e in fresh if 'server' in e])}")
+        out.append(f"    download {_spread([e['download'] for e in fresh if 'download' in e])}")
+        sizes = [e["bytes"] for e in images if "bytes" in e]
+        if sizes:
+            out.append(f"    size     avg {sum(sizes) / len(sizes) / 1024:.0f} KB, "
+                       f"total {sum(sizes) / 1024**2:.1f} MB")
+    processed = by_event["imgprocess"]
+    if processed:
+        out.append(f"Post-processing: {len(processed)} images, {_spread([e['wall'] for e in processed])}")
+
+    games = by_event["game"]
+    if games:
+        out.append(f"Games: {len(games)}, {_per_hour(len(games), events):.1f} games/hour "
+                   f"over {(max(e['ts'] for e in events) - min(e['ts'] for e in events)) / 60:.1f} min")
+    return "\n".join(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a gamegen metrics log.")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    parser.add_argument("--since", type=float, default=None, help="only events from the last N hours")
+    args = parser.parse_args()
+    events = load(args.path)
+    if args.since is not None:
+        cutoff = time.time() - args.since * 3600
+        events = [e for e in events if e["ts"] >= cutoff]
+    print(report(events))
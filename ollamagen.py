@@ -1,6 +1,23 @@
 import requests
 import json
-from typing import Dict, Generator, Iterable, Optional, Union
+import threading
+import time
+from typing import Dict, Generator, Iterable, List, Optional, Union
+
+import metrics
+
+# Default generate endpoint; bench.py points it at a local stand-in server
+GENERATE_URL = "http://localhost:11434/api/generate"
+
+# How long Ollama keeps a model loaded after a conversation's last call
+KEEP_ALIVE = "30m"
+
+# Context size of every call to the idea/spec model: a call with another
+# num_ctx makes Ollama reload the model
+IDEA_NUM_CTX = 8192
+
+# Token counters Ollama reports on the final response object
+USAGE_FIELDS = ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration")
 
 class OllamaStreamError(RuntimeError):
     pass
@@ -16,10 +33,32 @@ def _iter_ollama_lines(resp: requests.Response):
             raise OllamaStreamError(f"Invalid JSON line from stream: {raw}") from e
 
 
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return a process-wide requests.Session so connections stay warm between calls."""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = requests.Session()
+        return _shared_session
+
+
+_backend_pool = None  # backends.BackendPool set by backends.configure()
+
+
+def set_backend_pool(pool) -> None:
+    """Spread calls without an explicit base_url across a backends.BackendPool."""
+    global _backend_pool
+    _backend_pool = pool
+
+
 def ollama_generate(
     model: str,
     prompt: str,
-    base_url: str = "http://localhost:11434/api/generate",
+    base_url: Optional[str] = None,
     stream: bool = False,
     timeout: int = 300,
     session: Optional[requests.Session] = None,
@@ -38,10 +77,11 @@ def ollama_generate(
     Args:
         model: e.g. "llama3.2".
         prompt: The text prompt for generation.
-        base_url: Ollama API generate endpoint (default localhost).
+        base_url: Ollama API generate endpoint. Defaults to the least-loaded host
+                  of the backend pool (see backends.py), or GENERATE_URL.
         stream: Whether to stream partial outputs.
         timeout: Requests timeout (seconds).
-        session: Optional requests.Session for connection reuse.
+        session: Optional requests.Session (defaults to the shared get_session()).
         on_chunk: Optional callback called with each text chunk (string).
         **extra_params: Any extra parameters Ollama accepts (e.g., 'options').
 
@@ -60,21 +100,43 @@ def ollama_generate(
     }
     payload.update(extra_params)
 
-    sess = session or requests.Session()
-    resp = sess.post(base_url, json=payload, timeout=timeout, stream=stream)
-    resp.raise_for_status()
+    sess = session or get_session()
+    pool = _backend_pool if base_url is None else None
+    backend = pool.acquire(model, timeout) if pool is not None else None
+    url = backend.url + "/api/generate" if backend is not None else base_url or GENERATE_URL
+
+    def release(error: Optional[BaseException] = None) -> None:
+        if backend is not None:
+            pool.release(backend, error, model)
+
+    started = time.perf_counter()
+    try:
+        resp = sess.post(url, json=payload, timeout=timeout, stream=stream)
+        resp.raise_for_status()
+    except Exception as e:
+        release(e)
+        raise
 
     if not stream:
         # Non-streaming mode: server returns a single JSON object.
         try:
-            return resp.json()
+            res = resp.json()
         except json.JSONDecodeError:
+            release()
             raise RuntimeError(f"Invalid JSON response: {resp.text}")
+        release()
+        metrics.record("llm", model=model, stream=False, wall=round(time.perf_counter() - started, 4),
+                       bytes=len(resp.content), host=backend.url if backend else None, **metrics.llm_fields(res))
+        return res
 
     # Streaming mode: newline-delimited JSON objects.
     def gen() -> Generator[str, None, Dict]:
         final_payload: Dict = {}
         accumulated_text_parts = []
+        received = 0
+        chunks = 0
+        first_chunk_at = last_chunk_at = None
+        error = None
 
         try:
             for obj in _iter_ollama_lines(resp):
@@ -82,6 +144,11 @@ def ollama_generate(
                 #   "response": "partial text", "done": false, ...}
                 if "response" in obj:
                     chunk = obj["response"]
+                    received += len(chunk)
+                    chunks += 1
+                    last_chunk_at = time.perf_counter()
+                    if first_chunk_at is None:
+                        first_chunk_at = last_chunk_at
                     accumulated_text_parts.append(chunk)
                     if on_chunk:
                         try:
@@ -99,10 +166,93 @@ def ollama_generate(
                     # Some clients prefer top-level model/prompt back for convenience:
                     final_payload.setdefault("model", payload.get("model"))
                     break
+        except Exception as e:
+            error = e
+            raise
         finally:
             # Ensure the connection is closed even if the consumer stops early.
             resp.close()
+            release(error)
+            # done=False marks a stream the consumer closed before the end (e.g. at </html>). Its final
+            # counters never arrive, so one token per chunk since the first chunk stands in for them
+            counters = metrics.llm_fields(final_payload)
+            if "eval_count" not in counters and chunks:
+                counters.update(eval_count=chunks, eval_duration=int((last_chunk_at - first_chunk_at) * 1e9),
+                                estimated=True)
+            metrics.record("llm", model=model, stream=True, done=bool(final_payload),
+                           wall=round(time.perf_counter() - started, 4), bytes=received,
+                           host=backend.url if backend else None, **counters)
 
         return final_payload  # becomes StopIteration.value
 
     return gen()
+
+
+def usage(res: Dict) -> Dict:
+    """Token counts and durations (ns) from a final Ollama response."""
+    return {k: res.get(k) for k in USAGE_FIELDS if k in res}
+
+
+class OllamaConversation:
+    """
+    Follow-up calls to one model that reuse the previous calls' tokens.
+
+    Each call sends the `context` returned by the previous one, so Ollama
+    only evaluates the new prompt instead of re-reading everything that was
+    already said. keep_alive keeps the model loaded between calls.
+    prompt_eval_count in self.calls shows whether the prefix was reused.
+
+    A call only extends the conversation if nothing else extended it while
+    it ran, so an abandoned call that finishes late (see stages.run_with_deadline)
+    does not clobber the context of its retry.
+    """
+
+    def __init__(self, model: str, base_url: Optional[str] = None,
+                 keep_alive: str = KEEP_ALIVE, session: Optional[requests.Session] = None,
+                 **defaults):
+        self.model = model
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self.session = session
+        self.defaults = defaults
+        self.context: Optional[List[int]] = None
+        self.calls: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Forget the conversation so the next call starts from scratch."""
+        with self._lock:
+            self.context = None
+
+    def _finish(self, started_from: Optional[List[int]], res: Dict) -> None:
+        stats = usage(res)
+        with self._lock:
+            self.calls.append(stats)
+            if self.context is started_from and res.get("context"):
+                self.context = res["context"]
+        print(f"Ollama {self.model}: prompt_eval_count={stats.get('prompt_eval_count')} "
+              f"eval_count={stats.get('eval_count')}")
+
+    def generate(self, prompt: str, stream: bool = False, timeout: int = 300,
+                 on_chunk: Optional[callable] = None, **extra_params
+                 ) -> Union[Dict, Generator[str, None, Dict]]:
+        """
+        ollama_generate() continuing this conversation. Same return shapes.
+        """
+        with self._lock:
+            started_from = self.context
+        params = dict(self.defaults, keep_alive=self.keep_alive, **extra_params)
+        if started_from:
+            params["context"] = started_from
+        res = ollama_generate(self.model, prompt, base_url=self.base_url, stream=stream,
+                              timeout=timeout, session=self.session, on_chunk=on_chunk, **params)
+        if not stream:
+            self._finish(started_from, res)
+            return res
+
+        def gen() -> Generator[str, None, Dict]:
+            final = yield from res
+            self._finish(started_from, final)
+            return final
+
+        return gen()
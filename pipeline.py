@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import gamegen
+from dedup import DedupIndex
+from ideabacklog import IdeaBacklog
+from imgcache import ImageCache
+
+# Marks the end of the work stream between pipeline stages
+_DONE = object()
+
+
+class GamePipeline:
+    """
+    Generate several games at once so the LLM and the image server never sit idle.
+
+    Games flow through four stage threads connected by bounded queues:
+
+        ideas:  theme/genre -> idea -> spec            (Ollama, qwen3)
+                (sprite jobs start as the spec streams)
+        images: rest of the sprites + atlas            (image server)
+        code:   game.html stream -> validation -> files (Ollama, coder)
+        finish: thumbnail -> catalog                   (image server)
+
+    While game N's sprites render, game N+1's idea and spec are generated
+    and game N-1's game.html streams. The thumbnail is rendered only for
+    games whose game.html passed validation. A stage blocks when the queue
+    in front of the next stage is full, which bounds the number of games
+    in flight (and therefore memory and disk use) to about 4 + 3 * queue_size.
+    """
+
+    def __init__(self, config: dict, cache: Optional[ImageCache] = None,
+                 queue_size: Optional[int] = None,
+                 on_game_done: Optional[Callable[[str], None]] = None):
+        self.config = config
+        self.cache = cache
+        self.dedup = DedupIndex.from_config(config)
+        self.backlog = IdeaBacklog.from_config(config)
+        self.on_game_done = on_game_done
+        size = queue_size or config.get("pipeline", {}).get("queue_size", 1)
+        self.spec_queue: queue.Queue = queue.Queue(maxsize=size)
+        self.code_queue: queue.Queue = queue.Queue(maxsize=size)
+        self.finish_queue: queue.Queue = queue.Queue(maxsize=size)
+        self.stop = threading.Event()
+        # One image pool for all games so the image hosts see image_concurrency() requests
+        self.image_pool = ThreadPoolExecutor(max_workers=gamegen.image_concurrency(config))
+        self.completed = 0
+        self.failed = 0
+        self.started_at = 0.0
+
+    def _ideas(self, count: Optional[int]) -> None:
+        produced = 0
+        while not self.stop.is_set() and (count is None or produced < count):
+            produced += 1
+            jobs = None
+            try:
+                start = time.perf_counter()
+                entry = gamegen.backlog_idea(self.config, self.backlog, self.dedup) if self.backlog is not None else None
+                conversation = gamegen.new_conversation(self.config)
+                if entry is not None:
+                    theme, genre, idea = entry["theme"], entry["genre"], entry["idea"]
+                else:
+                    theme, genre = gamegen.pick_theme_genre(self.config, self.dedup)
+                    idea = gamegen.idea_stage(self.config, theme, genre, conversation, self.dedup)
+                jobs = gamegen.AssetJobs(self.config, self.cache, pool=self.image_pool)
+                game = {"theme": theme, "genre": genre, "idea": idea, "jobs": jobs,
+                        "timings": {"idea": time.perf_counter() - start}}
+                start = time.perf_counter()
+                game["spec"] = gamegen.spec_stage(self.config, idea, conversation, jobs)
+                game["timings"]["spec"] = time.perf_counter() - start
+                game["manifest"] = gamegen.start_manifest(idea, game["spec"], theme, genre)
+            except Exception as e:
+                if jobs is not None:
+                    jobs.abort()  # sprites already queued from the partial spec
+                self._fail("ideas", e)
+                continue
+            self.spec_queue.put(game)
+        self.spec_queue.put(_DONE)
+
+    def _images(self) -> None:
+        while True:
+            item = self.spec_queue.get()
+            if item is _DONE:
+                break
+            game = item
+            try:
+                start = time.perf_counter()
+                game["assets"] = gamegen.generate_assets(self.config, game["spec"], self.cache, game["jobs"])
+                game["timings"]["assets"] = time.perf_counter() - start
+                game["manifest"].mark("assets")
+                start = time.perf_counter()
+                game["atlas"] = gamegen.atlas_stage(self.config, game["spec"], game["assets"])
+                game["timings"]["atlas"] = time.perf_counter() - start
+                game["manifest"].mark("atlas")
+            except Exception as e:
+                game["jobs"].abort()
+                self._fail("images", e)
+                continue
+            self.code_queue.put(game)
+        self.code_queue.put(_DONE)
+
+    def _code(self) -> None:
+        while True:
+            item = self.code_queue.get()
+            if item is _DONE:
+                break
+            game = item
+            try:
+                start = time.perf_counter()
+                code = gamegen.code_stage(self.config, game["idea"], game["spec"], game["assets"],
+                                          game["atlas"])
+                game["timings"]["code"] = time.perf_counter() - start
+                start = time.perf_counter()
+                code = gamegen.validate_stage(self.config, game["spec"], code)
+                game["timings"]["validation"] = time.perf_counter() - start
+                gamegen.files_stage(game["idea"], game["spec"], code)
+                game["manifest"].mark("files")
+            except Exception as e:
+                self._fail("code", e)
+                continue
+            self.finish_queue.put(game)
+        self.finish_queue.put(_DONE)
+
+    def _finish(self) -> None:
+        while True:
+            item = self.finish_queue.get()
+            if item is _DONE:
+                break
+            game = item
+            try:
+                start = time.perf_counter()
+                gamegen.thumbnail_stage(self.config, game["spec"], self.cache)
+                game["timings"]["thumbnail"] = time.perf_counter() - start
+                game["manifest"].mark("thumbnail")
+                game_dir = gamegen.finish_game(game["manifest"], game["timings"], self.dedup)
+            except Exception as e:
+                self._fail("finish", e)
+                continue
+            self.completed += 1
+            print(f"Game generated in: {game_dir} ({self.games_per_hour():.1f} games/hour)")
+            if self.on_game_done is not None:
+                self.on_game_done(game_dir)
+
+    def _fail(self, stage: str, error: Exception) -> None:
+        self.failed += 1
+        print(f"Pipeline stage '{stage}' dropped a game: {error}")
+
+    def games_per_hour(self) -> float:
+        elapsed = time.time() - self.started_at
+        return self.completed * 3600.0 / elapsed if elapsed > 0 else 0.0
+
+    def run(self, count: Optional[int] = None) -> dict:
+        """
+        Generate `count` games (forever when None) and return throughput stats.
+        Ctrl+C stops feeding new ideas and lets games already in flight finish.
+        """
+        self.started_at = time.time()
+        threads = [
+            threading.Thread(target=self._ideas, args=(count,), name="pipeline-ideas", daemon=True),
+            threading.Thread(target=self._images, name="pipeline-images", daemon=True),
+            threading.Thread(target=self._code, name="pipeline-code", daemon=True),
+            threading.Thread(target=self._finish, name="pipeline-finish", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            print("Stopping after games in flight...")
+            self.stop.set()
+            for t in threads:
+                t.join()
+        self.image_pool.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.time() - self.started_at
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed": elapsed,
+            "games_per_hour": self.games_per_hour(),
+        }
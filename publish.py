@@ -0,0 +1,320 @@
+"""
+Build the deployable copy of the portal in site/.
+
+    python publish.py [--out site]
+
+Images get content-hashed names (images/124x212_bat.3f2a9c01d4.png) so they
+can be cached forever, PNGs are re-encoded losslessly with optimize=True,
+and every reference in game.html files and the game list shards is rewritten
+to the fingerprinted name. Text files get .gz (and .br when the brotli
+module is installed) siblings for servers that serve precompressed files.
+
+Builds are incremental: a source whose size and mtime are unchanged is not
+read again, an asset whose content hash is unchanged is not re-encoded, and
+an output whose bytes are unchanged is not rewritten.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote
+
+from PIL import Image
+
+import checkpoint
+import updateindex
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz siblings are written
+    brotli = None
+
+SITE_DIR = "site"
+STATE_FILE = ".publish-state.json"
+MANIFEST_FILE = "asset-manifest.json"
+HEADERS_FILE = "_headers"
+
+HASH_LEN = 10
+FINGERPRINT_EXTS = {".png", ".webp", ".avif", ".jpg", ".jpeg", ".gif"}
+COMPRESS_EXTS = {".html", ".json", ".js", ".css", ".svg", ".txt"}
+
+# Files of a game folder that are served; the rest (game_info.txt, prompt.txt, manifest.json) stay private
+GAME_ASSET_RE = re.compile(r"^thumbnail(-\d+w)?\.(png|webp|avif)$")
+IMAGE_REF_RE = re.compile(r"(?<![\w./-])images/([\w.%-]+\.(?:png|webp|avif|jpe?g|gif))")
+# Any reference to the images folder, including paths built at runtime (`images/${name}`, 'images/' + name)
+IMAGE_DIR_RE = re.compile(r"(?<![\w./-])images/")
+
+HEADERS = """/*.html
+  Cache-Control: public, max-age=300
+/gamelist/*
+  Cache-Control: public, max-age=31536000, immutable
+/games/*/images/*
+  Cache-Control: public, max-age=31536000, immutable
+/games/*/images.*/*
+  Cache-Control: public, max-age=31536000, immutable
+"""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LEN]
+
+
+def fingerprinted(rel: str, digest: str) -> str:
+    """games/a/images/bat.png -> games/a/images/bat.<digest>.png"""
+    path = Path(rel)
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+
+def optimize_png(data: bytes) -> bytes:
+    """Losslessly re-encode a PNG with optimize=True; keeps the original if that is not smaller."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        params = {"optimize": True}
+        if "transparency" in img.info:
+            params["transparency"] = img.info["transparency"]
+        buf = io.BytesIO()
+        img.save(buf, "PNG", **params)
+    return buf.getvalue() if buf.tell() < len(data) else data
+
+
+def url_path(rel: str) -> str:
+    """Percent-encode a relative path for use in HTML and srcset (game folders contain spaces)."""
+    return quote(rel, safe="/")
+
+
+class SiteBuilder:
+    """One incremental build of src_root into out_dir."""
+
+    def __init__(self, src_root: str = ".", out_dir: str = SITE_DIR, base_dir: str = updateindex.BASE_DIR):
+        self.src = Path(src_root)
+        self.out = Path(out_dir)
+        self.base_dir = base_dir
+        state_path = self.out / STATE_FILE
+        self.state: Dict[str, Dict] = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+        self.manifest: Dict[str, str] = {}
+        self.used_state = set()
+        self.produced = set()
+        self.written: List[str] = []
+        # zlib releases the GIL, so PNG re-encoding scales with threads
+        self.pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
+    def write(self, rel: str, data: Optional[bytes]) -> None:
+        """
+        Write out_dir/rel (plus compressed siblings) unless it already holds
+        exactly data. data=None keeps an up-to-date output without reading it.
+        """
+        self.produced.add(rel)
+        suffix = Path(rel).suffix.lower()
+        if suffix in COMPRESS_EXTS:
+            self.produced.add(rel + ".gz")
+            if brotli is not None:
+                self.produced.add(rel + ".br")
+        path = self.out / rel
+        if data is None:
+            return
+        if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        checkpoint.write_atomic(path, data, "wb")
+        self.written.append(rel)
+        if suffix in COMPRESS_EXTS:
+            checkpoint.write_atomic(str(path) + ".gz", gzip.compress(data, 9, mtime=0), "wb")
+            self.written.append(rel + ".gz")
+            if brotli is not None:
+                checkpoint.write_atomic(str(path) + ".br", brotli.compress(data, quality=11), "wb")
+                self.written.append(rel + ".br")
+
+    def file_hash(self, rel: str) -> str:
+        """Content hash of a source file; not read again while its size and mtime are unchanged."""
+        stat = (self.src / rel).stat()
+        prev = self.state.get(rel)
+        if prev and prev["size"] == stat.st_size and prev["mtime"] == stat.st_mtime:
+            return prev["hash"]
+        return content_hash((self.src / rel).read_bytes())
+
+    def asset(self, rel: str, out_rel: Optional[str] = None) -> str:
+        """
+        Publish a binary asset under out_rel, by default its fingerprinted
+        name. Returns the published name.
+        """
+        src = self.src / rel
+        stat = src.stat()
+        digest = self.file_hash(rel)
+        if out_rel is None:
+            out_rel = fingerprinted(rel, digest) if src.suffix.lower() in FINGERPRINT_EXTS else rel
+        prev = self.state.get(rel)
+        if not (prev and prev["hash"] == digest and prev["out"] == out_rel and (self.out / out_rel).exists()):
+            data = src.read_bytes()
+            self.write(out_rel, optimize_png(data) if src.suffix.lower() == ".png" else data)
+        self.state[rel] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": digest, "out": out_rel}
+        self.used_state.add(rel)
+        self.produced.add(out_rel)
+        self.manifest[rel] = out_rel
+        return out_rel
+
+    def game(self, game_dir: Path) -> None:
+        """
+        Publish a game's images, thumbnails and game.html with rewritten image references.
+
+        Each image gets its own fingerprinted name when game.html names all
+        of them literally. A game that builds image paths at runtime
+        (`images/${name}`) keeps the file names, in a folder fingerprinted
+        with the hashes of all its images (images.<digest>/), and every
+        "images/" in its game.html points there.
+        """
+        rel_dir = game_dir.relative_to(self.src).as_posix()
+        img_dir = game_dir / "images"
+        images = [f"{rel_dir}/images/{p.name}" for p in (sorted(img_dir.iterdir()) if img_dir.is_dir() else [])
+                  if p.is_file() and not p.name.endswith(".tmp")]
+        thumbnails = [f"{rel_dir}/{p.name}" for p in sorted(game_dir.iterdir()) if GAME_ASSET_RE.match(p.name)]
+
+        # game.html is only read again when it or one of its assets changed
+        rel = f"{rel_dir}/game.html"
+        stat = (game_dir / "game.html").stat()
+        prev = self.state.get(rel)
+        unchanged = (prev and prev["size"] == stat.st_size and prev["mtime"] == stat.st_mtime
+                     and "dynamic" in prev)
+        html = None if unchanged else (game_dir / "game.html").read_text(encoding="utf-8")
+        dynamic = prev["dynamic"] if unchanged else len(IMAGE_DIR_RE.findall(html)) > len(IMAGE_REF_RE.findall(html))
+
+        if dynamic:
+            hashes = list(self.pool.map(self.file_hash, images))
+            folder = "images." + content_hash(json.dumps(sorted(zip(images, hashes))).encode("utf-8"))
+            list(self.pool.map(lambda r: self.asset(r, f"{rel_dir}/{folder}/{Path(r).name}"), images))
+        else:
+            list(self.pool.map(self.asset, images))
+        list(self.pool.map(self.asset, thumbnails))
+
+        refs = content_hash(json.dumps({k: v for k, v in self.manifest.items()
+                                        if k.startswith(rel_dir + "/")}, sort_keys=True).encode("utf-8"))
+        self.used_state.add(rel)
+        if unchanged and prev["refs"] == refs and (self.out / rel).exists():
+            self.write(rel, None)
+            return
+        if html is None:
+            html = (game_dir / "game.html").read_text(encoding="utf-8")
+
+        def rewrite(m: re.Match) -> str:
+            out_rel = self.manifest.get(f"{rel_dir}/images/{m.group(1)}")
+            return url_path(out_rel[len(rel_dir) + 1:]) if out_rel else m.group(0)
+
+        if dynamic:
+            html = IMAGE_DIR_RE.sub(folder + "/", html)
+        else:
+            html = IMAGE_REF_RE.sub(rewrite, html)
+        self.write(rel, html.encode("utf-8"))
+        self.state[rel] = {"size": stat.st_size, "mtime": stat.st_mtime, "refs": refs, "dynamic": dynamic}
+
+    def _rewrite_entry(self, entry: Dict) -> Dict:
+        entry = dict(entry)
+        if entry.get("thumbnail"):
+            entry["thumbnail"] = url_path(self.manifest.get(entry["thumbnail"], entry["thumbnail"]))
+        entry["game_html"] = url_path(entry["game_html"])
+        sources = []
+        for src in entry.get("thumbnail_sources", []):
+            items = []
+            for item in src["srcset"].split(", "):
+                path, _, width = item.rpartition(" ")
+                path = unquote(path)  # srcset URLs are percent-encoded, manifest keys are paths
+                items.append(f"{url_path(self.manifest.get(path, path))} {width}")
+            sources.append(dict(src, srcset=", ".join(items)))
+        if sources:
+            entry["thumbnail_sources"] = sources
+        return entry
+
+    def gamelist(self) -> Optional[Dict]:
+        """
+        Publish the shards under gamelist/<version>/ with fingerprinted thumbnails.
+        A new build of the list gets a new directory, so shards can be cached forever.
+        """
+        src_dir = self.src / updateindex.SHARD_DIR
+        if not src_dir.is_dir():
+            return None
+        texts = {}
+        for path in sorted(src_dir.glob("*.json")):
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if path.name != updateindex.SEARCH_FILE:
+                data = [self._rewrite_entry(e) for e in data]
+            texts[path.name] = updateindex._dumps(data).encode("utf-8")
+        digest = hashlib.sha256()
+        for name in sorted(texts):
+            digest.update(name.encode("utf-8") + b"\0" + texts[name])
+        version = digest.hexdigest()[:HASH_LEN]
+        for name, data in texts.items():
+            self.write(f"{updateindex.SHARD_DIR}/{version}/{name}", data)
+        return {"dir": f"{updateindex.SHARD_DIR}/{version}", "version": version}
+
+    def index(self, shards: Optional[Dict]) -> None:
+        html = (self.src / "index.html").read_text(encoding="utf-8")
+        if shards is not None:
+            def point_at_shards(m: re.Match) -> str:
+                info = json.loads(m.group(2))
+                info.update(shards)
+                return m.group(1) + json.dumps(info) + ";"
+            html = re.sub(r"(const gameIndex = )(\{.*?\});", point_at_shards, html, count=1)
+        self.write("index.html", html.encode("utf-8"))
+
+    def remove_stale(self) -> List[str]:
+        """Delete outputs of earlier builds that this build did not produce."""
+        removed = []
+        keep = self.produced | {STATE_FILE, MANIFEST_FILE, MANIFEST_FILE + ".gz", MANIFEST_FILE + ".br", HEADERS_FILE}
+        for path in sorted(self.out.rglob("*")):
+            rel = path.relative_to(self.out).as_posix()
+            if path.is_file() and rel not in keep:
+                path.unlink()
+                removed.append(rel)
+        for path in sorted(self.out.rglob("*"), reverse=True):
+            if path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+        return removed
+
+    def build(self) -> Dict:
+        try:
+            return self._build()
+        finally:
+            self.pool.shutdown()
+
+    def _build(self) -> Dict:
+        base = self.src / self.base_dir
+        for game_dir in sorted(base.iterdir()) if base.is_dir() else []:
+            if (game_dir.is_dir() and (game_dir / "game.html").exists()
+                    and not checkpoint.is_in_progress(str(game_dir))):
+                self.game(game_dir)
+        # the default thumbnail and its variants, used by games without a thumbnail of their own
+        list(self.pool.map(self.asset, [p.name for p in sorted(self.src.iterdir()) if GAME_ASSET_RE.match(p.name)]))
+        if (self.src / updateindex.DEFAULT_THUMBNAIL).exists():
+            # the default thumbnail keeps its name too: index.html falls back to it by name
+            self.write(updateindex.DEFAULT_THUMBNAIL, (self.src / updateindex.DEFAULT_THUMBNAIL).read_bytes())
+        self.index(self.gamelist())
+        self.state = {k: v for k, v in self.state.items() if k in self.used_state}
+        self.write(MANIFEST_FILE, json.dumps(self.manifest, indent=1, ensure_ascii=False).encode("utf-8"))
+        self.write(HEADERS_FILE, HEADERS.encode("utf-8"))
+        removed = self.remove_stale()
+        checkpoint.write_atomic(self.out / STATE_FILE, json.dumps(self.state, ensure_ascii=False))
+        return {"written": self.written, "removed": removed, "assets": len(self.manifest)}
+
+
+def build_site(src_root: str = ".", out_dir: str = SITE_DIR) -> Dict:
+    """
+    Incrementally build the published site. Run after updateindex.build_index().
+    Returns {"written": [paths], "removed": [paths], "assets": count}, paths relative to out_dir.
+    """
+    return SiteBuilder(src_root, out_dir).build()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=SITE_DIR, help="output directory")
+    parser.add_argument("--no-index", action="store_true", help="do not rebuild index.html and the shards first")
+    args = parser.parse_args()
+    if not args.no_index:
+        updateindex.build_index()
+    result = build_site(out_dir=args.out)
+    print(f"Published {result['assets']} assets to {args.out}: {len(result['written'])} files written, "
+          f"{len(result['removed'])} removed" + ("" if brotli else " (install brotli for .br files)"))
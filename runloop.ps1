@@ -2,22 +2,37 @@
 
 $pythonExe      = "python"              # or full path to python.exe
 $pythonScript   = ".\gamegen.py"        # adjust if needed
-$timeoutSeconds = 600                   # 10 minutes
+$pythonArgs     = @("--resume")         # finish a game a previous timeout left behind first
+$marginSeconds  = 120                   # index rebuild, commit and process start-up
 $restartDelay   = 2                     # seconds
 
+# The watchdog must outlast one attempt of every stage on the critical path
+# (config.json "deadlines", 300 s when unset), with the code stage counted once
+# more per validation regeneration. Stuck stages are retried by gamegen itself;
+# a game killed after its retries is picked up again by --resume.
+function Get-TimeoutSeconds {
+    $config = Get-Content -Raw -Encoding UTF8 "config.json" | ConvertFrom-Json
+    $deadline = @{}
+    foreach ($name in "idea", "spec", "image", "code", "thumbnail") {
+        $deadline[$name] = if ($null -ne $config.deadlines.$name) { [int]$config.deadlines.$name } else { 300 }
+    }
+    $regenerate = if ($config.validation.enabled) { [int]$config.validation.regenerate } else { 0 }
+    return $deadline.idea + $deadline.spec + $deadline.image + $deadline.code * (1 + $regenerate) +
+        $deadline.thumbnail + $marginSeconds
+}
+
 while ($true) {
-    Write-Host "Starting $pythonScript..."
-    $proc = Start-Process -FilePath $pythonExe -ArgumentList @($pythonScript) -NoNewWindow -PassThru
+    $timeoutSeconds = Get-TimeoutSeconds  # re-read each round, so config edits apply to the next game
+    Write-Host "Starting $pythonScript (timeout $timeoutSeconds s)..."
+    $proc = Start-Process -FilePath $pythonExe -ArgumentList (@($pythonScript) + $pythonArgs) -NoNewWindow -PassThru
     $timedOut = $false
 
     try {
         # Wait up to $timeoutSeconds; throws if timeout hit
         Wait-Process -Id $proc.Id -Timeout $timeoutSeconds -ErrorAction Stop
-        python .\updateindex.py
-        $stamp = Get-Date -Format "yyyy-MM-dd HH:mm:ss"
-        git add -A
-        git commit -m $stamp
-        git push
+        # rebuilds the index, queues the files it wrote and commits the queued games
+        # once a batch is due; the push runs in the background
+        python .\gitpublish.py --update-index
     } catch {
         if (-not $proc.HasExited) {
             $timedOut = $true
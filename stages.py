@@ -0,0 +1,143 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class StageError(RuntimeError):
+    """Raised when a stage of a StageGraph fails."""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageGraph:
+    """
+    A small DAG of named stages executed on a thread pool.
+
+    Each stage is a callable receiving the results of its dependencies as
+    keyword arguments (one per dependency name). A stage starts as soon as
+    all of its dependencies have finished, so independent branches overlap.
+
+    Example:
+        graph = StageGraph(max_workers=3)
+        graph.add("idea", make_idea)
+        graph.add("spec", make_spec, deps=["idea"])
+        graph.add("thumbnail", make_thumbnail, deps=["spec"])
+        graph.add("code", make_code, deps=["idea", "spec"])
+        results = graph.run()
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._stages: Dict[str, Callable[..., Any]] = {}
+        self._deps: Dict[str, List[str]] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = ()) -> "StageGraph":
+        """Register a stage. Dependencies must be added before their dependents."""
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' already exists")
+        deps = list(deps)
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = fn
+        self._deps[name] = deps
+        return self
+
+    def _timed(self, name: str, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return self._stages[name](**kwargs)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def run(self, initial: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run every stage and return a dict of stage name -> result.
+        Wall-clock seconds per stage are kept in self.timings.
+
+        Args:
+            initial: Results of stages that are already done (they are skipped).
+
+        Raises:
+            StageError wrapping the first stage exception. Stages that have not
+            started yet are cancelled; running ones are allowed to finish.
+        """
+        results: Dict[str, Any] = dict(initial or {})
+        pending = [name for name in self._stages if name not in results]
+        running: Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    if all(dep in results for dep in self._deps[name]):
+                        kwargs = {dep: results[dep] for dep in self._deps[name]}
+                        running[pool.submit(self._timed, name, **kwargs)] = name
+                        pending.remove(name)
+
+                if not running:
+                    raise RuntimeError(f"Unresolvable stages: {pending}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        results[name] = fut.result()
+                    except Exception as e:
+                        for other in running:
+                            other.cancel()
+                        raise StageError(name, e) from e
+
+        return results
+
+
+class StageTimeout(TimeoutError):
+    """Raised when a stage misses its deadline on every attempt."""
+
+
+def run_with_deadline(name: str, fn: Callable[[threading.Event], Any],
+                      deadline: Optional[float] = None, retries: int = 0) -> Any:
+    """
+    Run fn(cancel) with a wall-clock deadline, where cancel is a threading.Event.
+
+    The call runs on a daemon thread. If it is still running after
+    `deadline` seconds its cancel event is set (cooperative stages such as
+    streaming loops stop on it; blocking HTTP calls are bounded by their own
+    request timeout) and the stage is retried on its own, up to `retries`
+    more times. Exceptions raised by fn are retried the same way.
+
+    Raises:
+        StageTimeout if the last attempt timed out, otherwise the last
+        exception raised by fn.
+    """
+    last_error: BaseException = None
+    for attempt in range(retries + 1):
+        cancel = threading.Event()
+        outcome: Dict[str, Any] = {}
+
+        def target():
+            try:
+                outcome["result"] = fn(cancel)
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=target, name=f"stage-{name}", daemon=True)
+        thread.start()
+        thread.join(deadline)
+
+        if thread.is_alive():
+            cancel.set()
+            last_error = StageTimeout(f"Stage '{name}' exceeded its {deadline}s deadline")
+        elif "error" in outcome:
+            last_error = outcome["error"]
+        else:
+            return outcome["result"]
+
+        if attempt < retries:
+            print(f"Stage '{name}' attempt {attempt + 1} failed: {last_error}; retrying")
+
+    raise last_error
@@ -0,0 +1,36 @@
+"""
+imgprocessor's integer LUT path against the float32 reference kept in benchimg.py.
+
+    python -m pytest test_imgprocessor.py
+"""
+import numpy as np
+import pytest
+
+import benchimg
+import imgprocessor
+
+# Every third synthetic image carries a partial alpha channel
+IMAGES = benchimg.synthetic_images(6, size=128)
+
+
+@pytest.mark.parametrize("feather", [0, 1, 2])
+@pytest.mark.parametrize("n", range(len(IMAGES)))
+def test_remove_white_bg_matches_reference(n, feather):
+    expected = np.asarray(benchimg.reference_remove_white_bg(IMAGES[n], feather=feather))
+    got = np.asarray(imgprocessor.remove_white_bg(IMAGES[n], feather=feather))
+    np.testing.assert_array_equal(got[..., 3], expected[..., 3])  # the mask
+    np.testing.assert_array_equal(got, expected)
+
+
+def test_batch_matches_reference():
+    for img, got in zip(IMAGES, imgprocessor.remove_white_bg_batch(IMAGES)):
+        np.testing.assert_array_equal(np.asarray(got), np.asarray(benchimg.reference_remove_white_bg(img)))
+
+
+@pytest.mark.parametrize("n", range(len(IMAGES)))
+def test_trim_to_content_matches_reference(n):
+    no_bg = benchimg.reference_remove_white_bg(IMAGES[n])
+    expected = benchimg.reference_trim_to_content(no_bg)
+    got = imgprocessor.trim_to_content(no_bg)
+    assert got.size == expected.size
+    np.testing.assert_array_equal(np.asarray(got), np.asarray(expected))
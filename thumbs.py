@@ -0,0 +1,83 @@
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from PIL import Image, features
+
+# Widths of the resized variants written next to each thumbnail.png
+THUMB_WIDTHS = (160, 320, 512)
+
+# Encoder settings per output format
+FORMAT_OPTIONS = {
+    "avif": {"quality": 50},
+    "webp": {"quality": 80, "method": 6},
+}
+
+
+def available_formats() -> List[str]:
+    """Modern formats this Pillow build can write, preferred first."""
+    return [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+
+
+def variant_path(thumb_path: Path, width: int, fmt: str) -> Path:
+    """thumbnail.png -> thumbnail-320w.webp"""
+    return thumb_path.with_name(f"{thumb_path.stem}-{width}w.{fmt}")
+
+
+def make_variants(thumb_path, widths=THUMB_WIDTHS, formats=None,
+                  written: Optional[List[Path]] = None) -> Dict[str, List[Tuple[int, Path]]]:
+    """
+    Write resized AVIF/WebP copies of a thumbnail.
+
+    Variants newer than the source are left alone, so repeated calls only
+    pay for new or changed thumbnails. Widths larger than the source are
+    skipped. Paths of the variants actually written are appended to written.
+
+    Returns:
+        {format: [(width, path), ...]} for every variant that exists.
+    """
+    thumb_path = Path(thumb_path)
+    formats = available_formats() if formats is None else formats
+    src_mtime = thumb_path.stat().st_mtime
+    variants: Dict[str, List[Tuple[int, Path]]] = {fmt: [] for fmt in formats}
+    img = None
+    try:
+        for fmt in formats:
+            for width in widths:
+                out = variant_path(thumb_path, width, fmt)
+                if not (out.exists() and out.stat().st_mtime >= src_mtime):
+                    if img is None:
+                        img = Image.open(thumb_path)
+                        img.load()
+                    if width > img.width:
+                        continue
+                    height = round(img.height * width / img.width)
+                    resized = img.convert("RGBA").resize((width, height), Image.LANCZOS)
+                    tmp = out.with_name(out.name + ".tmp")
+                    resized.save(tmp, fmt.upper(), **FORMAT_OPTIONS.get(fmt, {}))
+                    os.replace(tmp, out)
+                    if written is not None:
+                        written.append(out)
+                variants[fmt].append((width, out))
+    finally:
+        if img is not None:
+            img.close()
+    return variants
+
+
+def srcset(variants: List[Tuple[int, Path]], root: Path = Path(".")) -> str:
+    """
+    HTML srcset string with URLs relative to root. URLs are percent-encoded:
+    a raw space would split a candidate, and game folders contain spaces.
+    """
+    return ", ".join(f"{quote(Path(os.path.relpath(p, root)).as_posix(), safe='/')} {w}w" for w, p in variants)
+
+
+if __name__ == "__main__":
+    # python thumbs.py [games_dir]: write variants for every game thumbnail
+    base = Path(sys.argv[1] if len(sys.argv) > 1 else "games")
+    for thumb in sorted(base.glob("*/thumbnail.png")):
+        made = make_variants(thumb)
+        print(f"{thumb}: " + ", ".join(f"{len(v)} {fmt}" for fmt, v in made.items()))
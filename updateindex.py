@@ -1,6 +1,13 @@
+import hashlib
 import os
 from pathlib import Path
 import json
+import sys
+import time
+from PIL import Image
+from catalog import Catalog
+import checkpoint
+import thumbs
 
 def inject_gamelist_into_html(json_data, html_path, output_path=None):
 
@@ -24,43 +31,179 @@ def inject_gamelist_into_html(json_data, html_path, output_path=None):
 
 
 BASE_DIR = "games"  # folder containing all game subfolders
-games_data = []
-
-for game_name in os.listdir(BASE_DIR):
-    game_dir = os.path.join(BASE_DIR, game_name)
-
-    if os.path.isdir(game_dir):
-        game_html_path = os.path.join(game_dir, "game.html")
-        thumbnail_path = os.path.join(game_dir, "thumbnail.png")
-
-        if os.path.exists(game_html_path):
-            game_html_url = BASE_DIR+'/'+game_name+'/'+"game.html"
-
-
-            thumbnail_url = None
-            if os.path.exists(thumbnail_path):
-                thumbnail_url = BASE_DIR+'/'+game_name+'/'+"thumbnail.png"
-               
-
-            games_data.append({
-                "name": game_name,
-                "game_html": game_html_url,
-                "thumbnail": thumbnail_url
-            })
-
-
-
-
-template_file = Path("index.template.html")
-index_file = Path("index.html")
-
-# Read the template HTML
-html_template_content = template_file.read_text(encoding="utf-8")
-
-# Replace placeholder with JSON data
-json_str = json.dumps(games_data, ensure_ascii=False)
-updated_html = html_template_content.replace("{gamelist}", json_str)
-
-# Write back the updated HTML
-index_file.write_text(updated_html, encoding="utf-8")
-
+DEFAULT_THUMBNAIL = "thumbnail.png"  # shown for games without their own thumbnail
+
+# Bump when the shape of index entries changes so cached entries are rebuilt
+INDEX_VERSION = "4"
+
+# The game list is served as SHARD_DIR/<n>.json with SHARD_SIZE games each, plus
+# SHARD_DIR/search.json; index.html only carries the counts, so it stays the same size
+SHARD_DIR = "gamelist"
+SHARD_SIZE = 48
+SEARCH_FILE = "search.json"
+
+
+def thumbnail_fields(thumbnail_path, written=None):
+    """
+    Thumbnail URL, intrinsic size and AVIF/WebP srcsets for an index entry.
+    Missing or outdated variants are written on the way (and appended to written).
+    """
+    variants = thumbs.make_variants(thumbnail_path, written=written)
+    with Image.open(thumbnail_path) as img:
+        width, height = img.size
+    return {
+        "thumbnail": Path(thumbnail_path).as_posix(),
+        "thumbnail_width": width,
+        "thumbnail_height": height,
+        "thumbnail_sources": [
+            {"type": f"image/{fmt}", "srcset": thumbs.srcset(items)}
+            for fmt, items in variants.items() if items
+        ],
+    }
+
+
+def index_entry(row, written=None):
+    """Index entry for a catalog row, in the shape index.template.html expects."""
+    entry = {
+        "name": row["name"],
+        "game_html": row["dir"] + "/game.html",
+        "theme": row["theme"],
+        "genre": row["genre"],
+    }
+    thumbnail_path = row["dir"] + "/thumbnail.png" if row["thumbnail_size"] else DEFAULT_THUMBNAIL
+    if os.path.exists(thumbnail_path):
+        entry.update(thumbnail_fields(thumbnail_path, written))
+    else:
+        entry["thumbnail"] = None
+    return entry
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_if_changed(path, text):
+    """Write text to path unless it already holds exactly that. Returns True when written."""
+    path = Path(path)
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint.write_atomic(path, text)
+    return True
+
+
+def search_index(games_data):
+    """
+    Compact search data for every game, in list order:
+    {"themes": [...], "genres": [...], "games": [[name, theme no, genre no], ...]}
+    with -1 for an unknown theme or genre.
+    """
+    themes = sorted({g["theme"] for g in games_data if g.get("theme")})
+    genres = sorted({g["genre"] for g in games_data if g.get("genre")})
+    theme_no = {t: n for n, t in enumerate(themes)}
+    genre_no = {g: n for n, g in enumerate(genres)}
+    return {
+        "themes": themes,
+        "genres": genres,
+        "games": [[g["name"], theme_no.get(g.get("theme"), -1), genre_no.get(g.get("genre"), -1)]
+                  for g in games_data],
+    }
+
+
+def write_shards(games_data, out_dir=SHARD_DIR, shard_size=SHARD_SIZE, written=None):
+    """
+    Write the game list as out_dir/0.json, 1.json, ... (shard_size games each)
+    and out_dir/search.json, rewriting only files whose content changed and
+    removing shards past the end (both are appended to written). Returns the small descriptor embedded in
+    index.html: {"total", "shard_size", "shards", "search", "version"}; version changes
+    whenever any file does, so browsers never mix shards of two builds.
+    """
+    out_dir = Path(out_dir)
+    texts = {f"{n}.json": _dumps(games_data[start:start + shard_size])
+             for n, start in enumerate(range(0, len(games_data), shard_size))}
+    texts[SEARCH_FILE] = _dumps(search_index(games_data))
+    digest = hashlib.sha1()
+    for name in sorted(texts):
+        if write_if_changed(out_dir / name, texts[name]) and written is not None:
+            written.append(out_dir / name)
+        digest.update(name.encode("utf-8") + b"\0" + texts[name].encode("utf-8"))
+    if out_dir.exists():
+        for stale in out_dir.glob("*.json"):
+            if stale.name not in texts:
+                stale.unlink()
+                if written is not None:
+                    written.append(stale)
+    return {
+        "total": len(games_data),
+        "shard_size": shard_size,
+        "shards": len(texts) - 1,
+        "search": SEARCH_FILE,
+        "version": digest.hexdigest()[:12],
+    }
+
+
+def build_index(template_path="index.template.html", index_path="index.html", catalog=None,
+                shard_dir=SHARD_DIR, shard_size=SHARD_SIZE):
+    """
+    Rebuild index.html and the game list shards from the template and the
+    game catalog.
+
+    Only catalog rows changed since the previous build are read; the game
+    list of that build is kept in the catalog's meta table. Files are only
+    rewritten when their content actually changes. Returns the paths
+    written or removed (index.html, shards, thumbnail variants, also the
+    ones outside the new game's folder) as POSIX strings, so gitpublish.py
+    can stage exactly those.
+    """
+    written = []
+    own_catalog = catalog is None
+    if own_catalog:
+        catalog = Catalog()
+    try:
+        if catalog.get_meta("imported_at") is None:
+            # first run: bring the existing games/ tree into the catalog
+            catalog.import_tree(BASE_DIR)
+            catalog.set_meta("imported_at", str(time.time()))
+
+        started_at = time.time()
+        if catalog.get_meta("index_version") == INDEX_VERSION:
+            last_build = float(catalog.get_meta("index_built_at", "0"))
+            entries = {e["game_html"]: e for e in json.loads(catalog.get_meta("index_gamelist", "[]"))}
+        else:
+            last_build, entries = 0.0, {}
+        for row in catalog.changed_since(last_build):
+            if row["deleted"]:
+                entries.pop(row["dir"] + "/game.html", None)
+            else:
+                entry = index_entry(row, written)
+                entries[entry["game_html"]] = entry
+        games_data = sorted(entries.values(), key=lambda e: e["name"].lower())
+
+        template_file = Path(template_path)
+        index_file = Path(index_path)
+
+        # Read the template HTML
+        html_template_content = template_file.read_text(encoding="utf-8")
+
+        # Shards go next to index.html; the page itself only gets their descriptor
+        shard_info = write_shards(games_data, index_file.parent / shard_dir, shard_size, written)
+        shard_info["dir"] = shard_dir
+        updated_html = html_template_content.replace("{gameindex}", json.dumps(shard_info))
+
+        catalog.set_meta("index_gamelist", json.dumps(games_data, ensure_ascii=False))
+        catalog.set_meta("index_built_at", str(started_at))
+        catalog.set_meta("index_version", INDEX_VERSION)
+
+        if write_if_changed(index_file, updated_html):
+            written.append(index_file)
+        return [Path(p).as_posix() for p in written]
+    finally:
+        if own_catalog:
+            catalog.close()
+
+
+if __name__ == "__main__":
+    if "--rescan" in sys.argv:
+        with Catalog() as catalog:
+            catalog.import_tree(BASE_DIR)
+    build_index()
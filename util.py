@@ -1,5 +1,7 @@
+import os
 import re
 import json
+import time
 
 def extract_json_from_llm_answer(answer: str):
     """
@@ -35,4 +37,180 @@ def extract_html_block(text):
     Returns the HTML block including the tags, or None if not found.
     """
     match = re.search(r"<html.*?</html>", text, flags=re.DOTALL | re.IGNORECASE)
-    return match.group(0) if match else None
\ No newline at end of file
+    return match.group(0) if match else None
+
+class JsonArrayStream:
+    """
+    Incremental parser that returns the items of one array of a streamed JSON
+    object as soon as each item closes.
+
+    Feed it text chunks as they arrive from the LLM; anything before the
+    first '{' (prose, ```json fences) is ignored.
+
+    Example:
+        stream = JsonArrayStream("images")
+        for chunk in chunks:
+            for item in stream.feed(chunk):
+                start_job(stream.head(), item)
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._stack = []  # open containers, '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._array_depth = None  # stack depth inside the target array
+        self._key_start = None  # where the target key begins in self.text
+        self._item_start = None
+        self.count = 0
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk and return the array items completed by it."""
+        self.text += chunk
+        items = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if not self._stack:
+                if c == "{":
+                    self._stack.append(c)
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c in "{[":
+                if c == "[" and self._array_depth is None and len(self._stack) == 1:
+                    m = re.search(r'"' + re.escape(self.key) + r'"\s*:\s*$', text[:i])
+                    if m:
+                        self._array_depth = 2
+                        self._key_start = m.start()
+                self._stack.append(c)
+                if len(self._stack) == 3 and self._array_depth == 2 and c == "{":
+                    self._item_start = i
+            elif c in "}]":
+                self._stack.pop()
+                if c == "}" and self._item_start is not None and len(self._stack) == 2:
+                    items.append(json.loads(text[self._item_start:i + 1]))
+                    self._item_start = None
+                    self.count += 1
+                elif c == "]" and len(self._stack) == 1 and self._array_depth == 2:
+                    self._array_depth = -1  # array finished
+        self._pos = len(text)
+        return items
+
+    def head(self) -> dict:
+        """Top-level fields written before the array (e.g. name, description)."""
+        if self._key_start is None:
+            return {}
+        start = self.text.index("{")
+        prefix = self.text[start:self._key_start].rstrip().rstrip(",")
+        try:
+            return json.loads(prefix + "}")
+        except json.JSONDecodeError:
+            return {}
+
+
+class HtmlStreamCollector:
+    """
+    Collect the <html>...</html> document out of a streamed LLM answer.
+
+    Chunks are scanned once each, and only a few characters are carried
+    over so tags split across chunks are still found. Text before <html is
+    dropped; once </html> arrives `done` is set and the caller can close
+    the stream instead of paying for trailing chatter.
+
+    With a path, the document is appended to that file as it arrives so a
+    stage that times out still leaves the partial game behind. The file is
+    removed once the document is complete.
+
+    Progress (the new text since the last report) is printed at most every
+    progress_bytes bytes or progress_seconds seconds.
+    """
+
+    OPEN = re.compile(r"<html", re.IGNORECASE)
+    CLOSE = re.compile(r"</html>", re.IGNORECASE)
+    CARRY = len("</html>") - 1  # longest tag prefix that can end a chunk
+
+    def __init__(self, path: str = None, progress_bytes: int = 4096, progress_seconds: float = 10.0):
+        self.path = path
+        self.progress_bytes = progress_bytes
+        self.progress_seconds = progress_seconds
+        self.parts = []
+        self.size = 0
+        self.started = False
+        self.done = False
+        self._tail = ""  # end of the previous chunk, for tags split across chunks
+        self._file = None
+        self._reported = 0  # number of parts already printed
+        self._reported_size = 0
+        self._reported_at = time.monotonic()
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk. Returns True once the document is complete."""
+        if self.done or not chunk:
+            return self.done
+        window = self._tail + chunk
+        if not self.started:
+            m = self.OPEN.search(window)
+            if m is None:
+                self._tail = window[-self.CARRY:]
+                return False
+            self.started = True
+            if self.path:
+                self._file = open(self.path, "w", encoding="utf-8")
+            # Nothing was kept before <html, so restart from the tag itself
+            window, chunk, self._tail = window[m.start():], window[m.start():], ""
+
+        m = self.CLOSE.search(window)
+        if m is not None:
+            chunk = chunk[:m.end() - len(self._tail)]
+            self.done = True
+        else:
+            self._tail = window[-self.CARRY:]
+        self._append(chunk)
+        if self.done:
+            self._finish()
+        else:
+            self._progress()
+        return self.done
+
+    def _append(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text)
+        if self._file is not None:
+            self._file.write(text)
+            self._file.flush()
+
+    def _progress(self) -> None:
+        now = time.monotonic()
+        if (self.size - self._reported_size < self.progress_bytes
+                and now - self._reported_at < self.progress_seconds):
+            return
+        print("".join(self.parts[self._reported:]), end="", flush=True)
+        print(f"\n--- {self.size} characters of HTML so far ---", flush=True)
+        self._reported, self._reported_size, self._reported_at = len(self.parts), self.size, now
+
+    def _finish(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+
+    def close(self) -> None:
+        """Stop writing; keeps the partial file if the document never closed."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def html(self):
+        """The complete document, or None if the answer had no <html>...</html>."""
+        return "".join(self.parts) if self.done else None
@@ -0,0 +1,368 @@
+"""
+Fast static checks for a generated game.html.
+
+StreamValidator checks the document while it streams, so a candidate that
+is already broken (a closing bracket that matches nothing, a string cut by
+a newline, an image that does not exist) can be dropped before the model
+writes the rest of it. check_html() runs the same checks on a finished
+document, plus the ones that need all of it (unclosed brackets, canvas size).
+Everything is plain Python: no browser and no JavaScript engine.
+"""
+import re
+from typing import Iterable, List, Optional
+
+CANVAS_WIDTH = 1024
+CANVAS_HEIGHT = 720
+
+# Literal references only: names built at runtime ("images/${type}.png") cannot be checked
+IMAGE_REF_RE = re.compile(r"""["'`](?:\./)?images/([\w.%-]+\.(?:png|webp|avif|jpe?g|gif))["'`]""", re.IGNORECASE)
+SCRIPT_OPEN_RE = re.compile(r"<script\b([^>]*)>", re.IGNORECASE)
+SCRIPT_CLOSE_RE = re.compile(r"</script", re.IGNORECASE)
+CANVAS_TAG_RE = re.compile(r"<canvas\b([^>]*)>", re.IGNORECASE)
+CANVAS_CREATE_RE = re.compile(r"""createElement\(\s*["'`]canvas["'`]\s*\)""", re.IGNORECASE)
+CANVAS_ATTR_RE = re.compile(r"""\b(width|height)\s*=\s*["']?\s*(\d+)""", re.IGNORECASE)
+# A size set from script: canvas.width = 1024, CANVAS_WIDTH = 1024, {width: 1024}
+CANVAS_WIDTH_RE = re.compile(r"""\b\w*width\s*[=:]\s*["']?\s*%d\b""" % CANVAS_WIDTH, re.IGNORECASE)
+CANVAS_HEIGHT_RE = re.compile(r"""\b\w*height\s*[=:]\s*["']?\s*%d\b""" % CANVAS_HEIGHT, re.IGNORECASE)
+
+# Tokens after which a "/" starts a regular expression rather than a division
+REGEX_PREFIX_WORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void",
+                      "throw", "instanceof", "yield", "await"}
+REGEX_PREFIX_CHARS = set("(,=:[!&|?{};+-*%<>~^")
+CLOSERS = {")": "(", "]": "[", "}": "{"}
+WORD_RE = re.compile(r"[A-Za-z_$][\w$]*")
+
+
+class ScriptError(ValueError):
+    """A syntax error found by JsScanner."""
+
+
+class JsScanner:
+    """
+    Incremental bracket/string/comment scanner for JavaScript.
+
+    Not a parser: it only finds the errors that make a script fail to load
+    as a whole, which are also the typical ways a generated game is cut
+    short or garbled. feed() can be called with any prefix of the script;
+    a token that may continue past the end of the text is left for the
+    next call. A "/" the scanner cannot tell apart from a division is
+    treated as one, so valid code is never rejected on a guess.
+    """
+
+    def __init__(self):
+        self.text = ""  # unconsumed rest of the script; consumed text is dropped on the next feed()
+        self.pos = 0
+        self.offset = 0  # script offset of text[0], for error messages
+        self.stack: List[str] = []  # "(", "[", "{", "`" (template text) and "${" (template expression)
+        self.prev = ""  # last significant token, for the regex-or-division guess
+
+    def feed(self, text: str, final: bool = False) -> None:
+        """Scan more of the script. Raises ScriptError; with final=True the script must be complete."""
+        self.offset += self.pos
+        self.text = self.text[self.pos:] + text
+        self.pos = 0
+        while self.pos < len(self.text):
+            if not self._step(final):
+                break
+        if final:
+            if self.pos < len(self.text):
+                raise ScriptError("script ends inside a string, comment or regex")
+            if self.stack:
+                raise ScriptError(f"script ends with {len(self.stack)} unclosed '{self.stack[-1]}'")
+
+    def _step(self, final: bool) -> bool:
+        """Consume one token. Returns False when more text is needed."""
+        text, i = self.text, self.pos
+        if self.stack and self.stack[-1] == "`":
+            return self._template(final)
+        c = text[i]
+        if c.isspace():
+            self.pos += 1
+        elif c == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            if end < 0:
+                return self._need_more(final, len(text))
+            self.pos = end + 1
+        elif c == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                return self._need_more(final, len(text))
+            self.pos = end + 2
+        elif c in "'\"":
+            return self._string(c, final)
+        elif c == "`":
+            self.stack.append("`")
+            self.pos += 1
+        elif c in "+-" and i + 1 == len(text) and not final:
+            return False  # may be the first half of "++" or "--"
+        elif c in "+-" and text.startswith(c, i + 1):
+            if self._regex_may_follow():
+                self.prev = c  # prefix: an operand follows
+            # postfix: prev stays the operand, so a "/" after "i++" is a division
+            self.pos += 2
+        elif c == "/" and self._regex_may_follow():
+            return self._regex(final)
+        elif c in "([{":
+            self.stack.append(c)
+            self.prev = c
+            self.pos += 1
+        elif c in ")]}":
+            if self.stack and self.stack[-1] == "${" and c == "}":
+                self.stack.pop()  # back into the template text
+            elif not self.stack or self.stack[-1] != CLOSERS[c]:
+                raise ScriptError(f"unexpected '{c}' at offset {self.offset + i}"
+                                  + (f" (open '{self.stack[-1]}')" if self.stack else ""))
+            else:
+                self.stack.pop()
+            self.prev = c
+            self.pos += 1
+        else:
+            m = WORD_RE.match(text, i)
+            if m:
+                if m.end() == len(text) and not final:
+                    return False  # the word may continue
+                self.prev = m.group(0)
+                self.pos = m.end()
+            else:
+                self.prev = c
+                self.pos += 1
+        return True
+
+    def _regex_may_follow(self) -> bool:
+        return not self.prev or self.prev in REGEX_PREFIX_CHARS or self.prev in REGEX_PREFIX_WORDS
+
+    def _need_more(self, final: bool, end: int) -> bool:
+        if final:
+            self.pos = end  # a comment running to the end is fine
+            return True
+        return False
+
+    def _string(self, quote: str, final: bool) -> bool:
+        text, i = self.text, self.pos + 1
+        while i < len(text):
+            c = text[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == quote:
+                self.pos = i + 1
+                self.prev = "string"
+                return True
+            if c == "\n":
+                raise ScriptError(f"unterminated string at offset {self.offset + self.pos}")
+            i += 1
+        if final:
+            raise ScriptError(f"unterminated string at offset {self.offset + self.pos}")
+        return False
+
+    def _template(self, final: bool) -> bool:
+        text, i = self.text, self.pos
+        while i < len(text):
+            c = text[i]
+            if c == "\\" or (c == "$" and i + 1 == len(text)):
+                if i + 1 == len(text) and not final:
+                    break  # an escape or "${" split across chunks
+                i += 2
+            elif c == "`":
+                self.stack.pop()
+                self.pos = i + 1
+                self.prev = "string"
+                return True
+            elif text.startswith("${", i):
+                self.stack.append("${")
+                self.pos = i + 2
+                self.prev = "{"
+                return True
+            else:
+                i += 1
+        self.pos = min(i, len(text))
+        return final
+
+    def _regex(self, final: bool) -> bool:
+        text, i, in_class = self.text, self.pos + 1, False
+        while i < len(text):
+            c = text[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == "\n":
+                break
+            if c == "[":
+                in_class = True
+            elif c == "]":
+                in_class = False
+            elif c == "/" and not in_class:
+                m = WORD_RE.match(text, i + 1)  # flags
+                if m and m.end() == len(text) and not final:
+                    return False
+                self.pos = m.end() if m else i + 1
+                self.prev = "regex"
+                return True
+            i += 1
+        else:
+            if not final:
+                return False
+        # no closing "/" on this line: it was a division after all
+        self.prev = "/"
+        self.pos += 1
+        return True
+
+
+class StreamValidator:
+    """
+    Checks game.html as it streams. feed() returns the first problem found
+    in the text so far (None while it looks fine); finish() returns every
+    problem of the complete document.
+    """
+
+    def __init__(self, image_names: Optional[Iterable[str]] = None, max_lines: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.image_names = set(image_names) if image_names is not None else None
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.lines = 1
+        self.bytes = 0
+        self.chunks: List[str] = []  # the whole document, joined once by finish()
+        self.text = ""  # the part still being looked at; text before pos and ref_pos is dropped
+        self.pos = 0  # start of the text not assigned to an HTML part yet
+        self.seen_script = False
+        self.scanner: Optional[JsScanner] = None  # scanner of the inline script being streamed
+        self.ref_pos = 0
+        self.problems: List[str] = []
+
+    def feed(self, chunk: str) -> Optional[str]:
+        self.chunks.append(chunk)
+        done = min(self.pos, self.ref_pos)
+        self.text = self.text[done:] + chunk
+        self.pos -= done
+        self.ref_pos -= done
+        self.lines += chunk.count("\n")
+        self.bytes += len(chunk.encode("utf-8"))
+        if self.max_lines is not None and self.lines > self.max_lines:
+            self._problem(f"longer than {self.max_lines} lines")
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            self._problem(f"larger than {self.max_bytes} bytes")
+        try:
+            self._scripts(final=False)
+        except ScriptError as e:
+            self._problem(f"JavaScript: {e}")
+        self._image_refs(final=False)
+        return self.problems[0] if self.problems else None
+
+    def finish(self) -> List[str]:
+        html = "".join(self.chunks)
+        if not html.strip():
+            self._problem("no <html>...</html> document")
+            return self.problems
+        try:
+            self._scripts(final=True)
+        except ScriptError as e:
+            self._problem(f"JavaScript: {e}")
+        self._image_refs(final=True)
+        problem = canvas_problem(html)
+        if problem:
+            self._problem(problem)
+        return self.problems
+
+    def _problem(self, message: str) -> None:
+        if message not in self.problems:
+            self.problems.append(message)
+
+    def _scripts(self, final: bool) -> None:
+        while True:
+            if self.scanner is None:
+                m = SCRIPT_OPEN_RE.search(self.text, self.pos)
+                if m is None:
+                    if final and not self.seen_script:
+                        raise ScriptError("no <script>")
+                    # only an unfinished tag can still turn into a <script>
+                    tag = self.text.rfind("<", self.pos)
+                    self.pos = tag if tag >= 0 and not final else len(self.text)
+                    return
+                self.seen_script = True
+                self.pos = m.end()
+                if re.search(r"\bsrc\s*=", m.group(1), re.IGNORECASE):
+                    continue  # external scripts are not ours to check
+                self.scanner = JsScanner()
+            end = SCRIPT_CLOSE_RE.search(self.text, self.pos)
+            if end is None:
+                # hold back what could be the start of "</script"
+                safe = max(self.pos, len(self.text) - len("</script"))
+                self.scanner.feed(self.text[self.pos:len(self.text) if final else safe], final=final)
+                self.pos = len(self.text) if final else safe
+                return
+            scanner, self.scanner = self.scanner, None
+            scanner.feed(self.text[self.pos:end.start()], final=True)
+            self.pos = end.end()
+
+    def _image_refs(self, final: bool) -> None:
+        if self.image_names is None:
+            self.ref_pos = len(self.text)
+            return
+        end = self.ref_pos
+        for m in IMAGE_REF_RE.finditer(self.text, self.ref_pos):
+            if m.group(1) not in self.image_names:
+                self._problem(f"missing image images/{m.group(1)}")
+            end = m.end()
+        # keep a tail so a reference split across chunks is seen whole next time
+        self.ref_pos = len(self.text) if final else max(end, len(self.text) - 200, self.ref_pos)
+
+
+def canvas_problem(html: str) -> Optional[str]:
+    """
+    None if the document has a canvas of CANVAS_WIDTH x CANVAS_HEIGHT: a <canvas>
+    tag with that size, or a canvas (tag without size, or createElement) whose
+    size the script sets.
+    """
+    tags = CANVAS_TAG_RE.findall(html)
+    if not tags and not CANVAS_CREATE_RE.search(html):
+        return "no <canvas>"
+    expected = {"width": CANVAS_WIDTH, "height": CANVAS_HEIGHT}
+    for attrs in tags:
+        size = {k.lower(): int(v) for k, v in CANVAS_ATTR_RE.findall(attrs)}
+        if size == expected:
+            return None
+        if size and len(tags) == 1:
+            return f"canvas is {size.get('width', '?')}x{size.get('height', '?')}, not {CANVAS_WIDTH}x{CANVAS_HEIGHT}"
+    if CANVAS_WIDTH_RE.search(html) and CANVAS_HEIGHT_RE.search(html):
+        return None
+    return f"no {CANVAS_WIDTH}x{CANVAS_HEIGHT} canvas"
+
+
+def check_html(html: Optional[str], image_names: Optional[Iterable[str]] = None, max_lines: Optional[int] = None,
+               max_bytes: Optional[int] = None) -> List[str]:
+    """Problems of a complete game.html (an empty list if it passes)."""
+    validator = StreamValidator(image_names, max_lines, max_bytes)
+    validator.feed(html or "")
+    return validator.finish()
+
+
+if __name__ == "__main__":
+    # python validate.py [--quarantine] [game folders]: check games already on disk (default: all of games/)
+    import argparse
+    import os
+
+    import checkpoint
+
+    parser = argparse.ArgumentParser(description="Check generated games without a browser.")
+    parser.add_argument("games", nargs="*", help="game folders (default: every folder in games/)")
+    parser.add_argument("--max-lines", type=int, default=None)
+    parser.add_argument("--max-bytes", type=int, default=None)
+    parser.add_argument("--quarantine", action="store_true", help="move failing games out of games/")
+    args = parser.parse_args()
+    game_dirs = args.games or sorted(os.path.join("games", n) for n in os.listdir("games")
+                                     if os.path.isdir(os.path.join("games", n)))
+    failed = 0
+    for game_dir in game_dirs:
+        if checkpoint.is_in_progress(game_dir):
+            continue
+        path, img_dir = os.path.join(game_dir, "game.html"), os.path.join(game_dir, "images")
+        html = open(path, "r", encoding="utf-8").read() if os.path.exists(path) else None
+        problems = check_html(html, os.listdir(img_dir) if os.path.isdir(img_dir) else [],
+                              args.max_lines, args.max_bytes)
+        if problems:
+            failed += 1
+            print(f"{game_dir}: {'; '.join(problems)}")
+            if args.quarantine:
+                checkpoint.quarantine(game_dir, f"game.html failed validation: {'; '.join(problems[:3])}")
+    print(f"{failed} of {len(game_dirs)} games failed")